@@ -0,0 +1,62 @@
+# peak RSS of parsing a big source into node objects vs into a NodeArena
+# usage: python bench/bench_ast.py [copies]
+# each mode runs in its own process so peak RSS is just that mode
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from bench_tokens import TEMPLATE
+
+def run_mode(mode, path):
+    from tokenbuf import TokenBuffer
+    import parser as parse
+    from ast_arena import NodeArena
+
+    with open(path) as file:
+        source = file.read()
+    # compact tokens so the token list doesn't drown out the tree
+    tokens = TokenBuffer.from_source(source)
+    tokens.append(('EOF', 'EOF', len(source)))
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def build():
+        if mode == 'nodes':
+            return parse.Parser(tokens).parse_program()
+        return NodeArena.from_decls(parse.Parser(tokens).iter_program())
+
+    t = time.perf_counter()
+    tree = build()
+    elapsed = time.perf_counter() - t
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    del tree
+    # and what the finished tree itself holds on to
+    tracemalloc.start()
+    tree = build()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{mode:<6} {elapsed:7.2f} s   peak RSS {peak / 1024:7.1f} MB "
+          f"(+{(peak - before) / 1024:.1f} MB while parsing)   tree {retained / 2**20:.1f} MiB")
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2], sys.argv[3])
+        return
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'_ast_corpus_{copies}.ctri')
+    with open(path, 'w') as file:
+        file.write(''.join(TEMPLATE.format(n=n) for n in range(copies)))
+    print(f"source: {os.path.getsize(path) / 2**20:.1f} MiB")
+    try:
+        for mode in ('nodes', 'arena'):
+            subprocess.run([sys.executable, __file__, '--mode', mode, path], check=True)
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# text codegen vs the python ast backend, from a parsed Program to a code object
+# usage: python bench/bench_backend.py [copies]
+import ast
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+from codegen import PythonCodeGen
+from pybackend import PythonAstGen, compile_program, write_pyc, load_pyc
+from driver import paused_gc
+from bench_parser import best_of
+from bench_tokens import TEMPLATE
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    src = ''.join(TEMPLATE.format(n=n) for n in range(copies))
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    program = parse.Parser(tokens).parse_program()
+    print(f"{len(src) / 1024:.0f} KiB, {copies} functions")
+
+    # PythonCodeGen's text doesn't compile (i++), so the re-parse is timed on the
+    # text a working text backend would print for the same program
+    text = ast.unparse(PythonAstGen(src).lower(program))
+
+    with paused_gc():
+        t_gen, _ = best_of(lambda: PythonCodeGen().generate(program), 5)
+        t_text, _ = best_of(lambda: compile(text, "<text>", "exec"), 5)
+        t_ast, code = best_of(lambda: compile_program(program, src), 5)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pyc")
+        write_pyc(code, path)
+        t_load, _ = best_of(lambda: load_pyc(path), 5)
+        size = os.path.getsize(path)
+
+    print(f"text: generate               {t_gen:.3f} s")
+    print(f"text: compile(source)        {t_text:.3f} s")
+    print(f"text: total                  {t_gen + t_text:.3f} s")
+    print(f"ast:  lower + compile(tree)  {t_ast:.3f} s")
+    print(f"pyc:  load                   {t_load:.3f} s   ({size / 1024:.0f} KiB)")
+
+if __name__ == "__main__":
+    main()
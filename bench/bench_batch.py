@@ -0,0 +1,32 @@
+# batch mode: one worker vs one per cpu on a directory of generated files
+# usage: python bench/bench_batch.py [files]
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from batch import run_batch
+from bench_tokens import TEMPLATE
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cpus = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src")
+        os.makedirs(src)
+        for n in range(files):
+            with open(os.path.join(src, f"f{n}.ctri"), "w") as f:
+                f.write(''.join(TEMPLATE.format(n=n * 10 + k) for k in range(10)))
+        print(f"{files} files, {cpus} cpus")
+        for jobs in sorted({1, 2, cpus}):
+            summary = io.StringIO()
+            t = time.perf_counter()
+            run_batch([src], jobs, os.path.join(tmp, f"out{jobs}"), out=summary)
+            elapsed = time.perf_counter() - t
+            print(f"-j {jobs:<3} {elapsed:7.2f} s   {files / elapsed:6.0f} files/s")
+
+if __name__ == "__main__":
+    main()
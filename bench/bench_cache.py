@@ -0,0 +1,47 @@
+# compile cache: cold vs warm rebuild of a tree of small files, against just hashing them
+# usage: python bench/bench_cache.py [files]
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from cache import CompileCache
+from driver import compile_source, compile_cached, decode_source
+from bench_tokens import TEMPLATE
+
+def timed(label, paths, fn):
+    t = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            fn(f.read())
+    elapsed = time.perf_counter() - t
+    print(f"{label:<24} {elapsed:7.3f} s   {elapsed / len(paths) * 1e6:7.0f} us/file")
+
+def plain(source):
+    compile_source(decode_source(source))
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for n in range(files):
+            path = os.path.join(tmp, f"f{n}.ctri")
+            with open(path, "w") as f:
+                f.write(''.join(TEMPLATE.format(n=n * 10 + k) for k in range(10)))
+            paths.append(path)
+        cache = CompileCache(os.path.join(tmp, "cache"))
+        print(f"{files} files")
+        timed("no cache", paths, plain)
+        timed("cold cache", paths, lambda source: compile_cached(source, cache))
+        cache.close()
+        print(cache.report())
+        cache = CompileCache(cache.root)
+        timed("warm cache", paths, lambda source: compile_cached(source, cache))
+        print(cache.report())
+        timed("read + sha256 only", paths, lambda source: hashlib.sha256(source).hexdigest())
+
+if __name__ == "__main__":
+    main()
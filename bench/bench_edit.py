@@ -0,0 +1,61 @@
+# editing a big file a keystroke at a time: incremental.Document.apply_edit
+# against lexing + parsing the whole text again
+# usage: python bench/bench_edit.py [copies]
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+from incremental import Document
+from bench_parser import best_of
+from bench_tokens import TEMPLATE
+
+def full_parse(text):
+    tokens = get_tokens(text)
+    tokens.append(('EOF', 'EOF', len(text)))
+    return parse.Parser(tokens).parse_program()
+
+def typing(doc, at, text):
+    # one apply_edit per character, -> sorted latencies, what each one redid
+    times = []
+    levels = Counter()
+    for ch in text:
+        t = time.perf_counter()
+        levels[doc.apply_edit(at, at, ch)] += 1
+        times.append(time.perf_counter() - t)
+        at += 1
+    times.sort()
+    return times, levels
+
+def report(label, times, levels):
+    n = len(times)
+    print(f"{label:<30} median {times[n // 2] * 1e3:6.2f} ms   max {times[-1] * 1e3:6.2f} ms   "
+          + ", ".join(f"{k} {v}" for k, v in levels.most_common()))
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    src = ''.join(TEMPLATE.format(n=n) for n in range(copies))
+    print(f"{len(src) / 2**20:.2f} MiB, {copies} functions")
+    t_full, _ = best_of(lambda: full_parse(src), 3)
+    t_doc, doc = best_of(lambda: Document(src), 3)
+    print(f"{'full lex + parse':<30} {t_full * 1e3:6.1f} ms per keystroke")
+    print(f"{'Document() first build':<30} {t_doc * 1e3:6.1f} ms")
+
+    # a new statement typed into a function in the middle, the piece doesn't
+    # parse until the ; is there
+    at = doc.text.index("    return t;", len(src) // 2)
+    report("typing a statement", *typing(doc, at, "t = t * 3 + a;\n    "))
+    # an expression changed inside an existing statement, parses after every key
+    at = doc.text.index("a * ", len(src) // 2) + len("a * ")
+    report("typing inside an expression", *typing(doc, at, "7 + b * 11 - "))
+    # a comment
+    at = doc.text.index("    int t", len(src) // 2)
+    report("typing a comment", *typing(doc, at, "// running total of the steps\n"))
+    assert doc.program() == full_parse(doc.text), "ast differs from a full parse"
+
+if __name__ == "__main__":
+    main()
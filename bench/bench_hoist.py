@@ -0,0 +1,90 @@
+# run time of -O's hoisting (hoist.py) on loops that leave work in them: -O with
+# and without it, through both backends. the kernels take python lists, so they
+# are called from here rather than through --run
+# usage: python bench/bench_hoist.py [n]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+import runtime
+from codegen import PythonCodeGen
+from optimizer import Optimizer
+from pybackend import compile_program
+from bench_parser import best_of
+
+KERNELS = {
+    # i * m and the scale in the inner loop
+    'row sums': """
+int main(int a, int n, int m, int w) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        for (int j = 0; j < m; j++) {
+            total = total + a[i * m + j] * (w * w + 1);
+        }
+    }
+    return total;
+}""",
+    # a while loop whose condition and body both redo a constant lookup
+    'while bound': """
+int main(int a, int n, int m, int w) {
+    int total = 0;
+    int i = 0;
+    while (i < n * m - a[0]) {
+        total = total + a[w] * a[w + 1] + i;
+        i = i + 1;
+    }
+    return total;
+}""",
+    # the same differences worked out over and over in one block
+    'distances': """
+int main(int a, int n, int m, int w) {
+    int total = 0;
+    for (int i = 1; i < n * m; i++) {
+        int d = (a[i] - a[i - 1]) * (a[i] - a[i - 1]);
+        int e = (a[i] - a[i - 1]) * w + d;
+        total = total + d + e + (a[i] - a[i - 1]);
+    }
+    return total;
+}""",
+}
+
+def parse_program(src):
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    return parse.Parser(tokens).parse_program()
+
+def ast_backend(program, src):
+    namespace = dict(runtime.BUILTINS)
+    exec(compile_program(program, src), namespace)
+    return namespace['main']
+
+def text_backend(program, src):
+    namespace = dict(runtime.BUILTINS)
+    exec(PythonCodeGen().generate(program), namespace)
+    return namespace['main']
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rows = max(1, n // 1000)
+    a = [(i * 7) % 13 for i in range(rows * 1000)]
+    print(f"n = {rows * 1000}")
+    print(f"{'kernel':<12} {'backend':<8} {'-O':>9} {'+hoist':>9}")
+    for name, src in KERNELS.items():
+        for label, build in (("ast", ast_backend), ("text", text_backend)):
+            times = {}
+            results = set()
+            for flag in (False, True):
+                Optimizer.hoist = flag
+                fn = build(Optimizer().optimize(parse_program(src)), src)
+                times[flag], result = best_of(lambda: fn(a, rows, 1000, 3), 3)
+                results.add(result)
+            assert len(results) == 1, f"{name}: hoisting changed the result"
+            print(f"{name:<12} {label:<8} {times[False] * 1e3:7.1f}ms {times[True] * 1e3:7.1f}ms"
+                  f"   {times[False] / times[True]:.2f}x")
+    Optimizer.hoist = True
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# run time of code calling small helpers in a hot loop, -O with and without the
+# inliner (--inline-size 0), through both backends
+# usage: python bench/bench_inline.py [n]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+import runtime
+from codegen import PythonCodeGen
+from optimizer import Optimizer
+from pybackend import PythonAstGen, compile_program
+from purity import DEFAULT_MEMO_SIZE
+from bench_parser import best_of
+
+HELPERS = """
+int sq(int x) { return x * x; }
+int mix(int a, int b) { return a * 3 + b; }
+int clamp(int v, int hi) {
+    int r = v;
+    if (r > hi) r = hi;
+    if (r < 0) r = 0;
+    return r;
+}
+"""
+
+KERNELS = {
+    # one-line helpers in an expression
+    'expression': """
+int main(int n) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        total = total + sq(i) - mix(i, total);
+    }
+    return total;
+}""",
+    # a helper with locals and branches, called as a statement
+    'statement': """
+int main(int n) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        int c = clamp(i - 50, 1000);
+        total = total + c;
+    }
+    return total;
+}""",
+}
+
+def parse_program(src):
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    return parse.Parser(tokens).parse_program()
+
+def ast_backend(program, src):
+    namespace = dict(runtime.BUILTINS)
+    exec(compile_program(program, src), namespace)
+    return namespace['main']
+
+def text_backend(program, src):
+    namespace = dict(runtime.BUILTINS)
+    exec(PythonCodeGen().generate(program), namespace)
+    return namespace['main']
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    # the kernels are pure, memoized the best of 3 would be a cache hit
+    PythonAstGen.memo_size = PythonCodeGen.memo_size = 0
+    print(f"n = {n}")
+    print(f"{'kernel':<12} {'backend':<8} {'-O':>9} {'+inline':>9}")
+    for name, src in KERNELS.items():
+        src = HELPERS + src
+        for label, build in (("ast", ast_backend), ("text", text_backend)):
+            times = {}
+            results = set()
+            for size in (0, 40):
+                opt = Optimizer(size)
+                fn = build(opt.optimize(parse_program(src)), src)
+                times[size], result = best_of(lambda: fn(n), 3)
+                results.add(result)
+            assert len(results) == 1, f"{name}: inlining changed the result"
+            assert opt.inliner.sites, f"{name}: nothing inlined"
+            print(f"{name:<12} {label:<8} {times[0] * 1e3:7.1f}ms {times[40] * 1e3:7.1f}ms"
+                  f"   {times[0] / times[40]:.2f}x")
+    PythonAstGen.memo_size = PythonCodeGen.memo_size = DEFAULT_MEMO_SIZE
+
+if __name__ == "__main__":
+    main()
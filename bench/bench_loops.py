@@ -0,0 +1,93 @@
+# run time of the code generated for c for loops: the range() form against the
+# init / while / post form, through both backends (--run's ast backend, and
+# PythonCodeGen's text exec'd with the runtime's builtins)
+# usage: python bench/bench_loops.py [n]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+import runtime
+from codegen import PythonCodeGen
+from pybackend import PythonAstGen, compile_program
+from purity import DEFAULT_MEMO_SIZE
+from bench_parser import best_of
+
+KERNELS = {
+    'sum': """
+int main(int n) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        total = total + i;
+    }
+    return total;
+}""",
+    'nested': """
+int main(int n) {
+    int total = 0;
+    for (int i = 0; i < n / 100; i++) {
+        for (int j = 0; j < 100; j++) {
+            total = total + j;
+        }
+    }
+    return total;
+}""",
+    'countdown by 3': """
+int main(int n) {
+    int total = 0;
+    for (int i = n; i >= 0; i = i - 3) {
+        total = total + i;
+    }
+    return total;
+}""",
+    'empty body': """
+int main(int n) {
+    for (int i = 0; i < n; ++i) {
+    }
+    return 0;
+}""",
+}
+
+def parse_program(src):
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    return parse.Parser(tokens).parse_program()
+
+def ast_backend(src, n):
+    code = compile_program(parse_program(src), src)
+    namespace = dict(runtime.BUILTINS)
+    exec(code, namespace)
+    return lambda: namespace['main'](n)
+
+def text_backend(src, n):
+    namespace = dict(runtime.BUILTINS)
+    exec(PythonCodeGen().generate(parse_program(src)), namespace)
+    return lambda: namespace['main'](n)
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    # the kernels are pure, memoized the best of 3 would be a cache hit
+    PythonAstGen.memo_size = PythonCodeGen.memo_size = 0
+    print(f"n = {n}")
+    print(f"{'kernel':<16} {'backend':<8} {'while':>9} {'range':>9}")
+    for name, src in KERNELS.items():
+        # the nested kernel divides, keep n / 100 an int for both forms
+        src = src.replace("n / 100", str(n // 100))
+        for label, build in (("ast", ast_backend), ("text", text_backend)):
+            times = {}
+            results = set()
+            for flag in (False, True):
+                PythonAstGen.range_loops = PythonCodeGen.range_loops = flag
+                fn = build(src, n)
+                times[flag], result = best_of(fn, 3)
+                results.add(result)
+            assert len(results) == 1, f"{name}: loop forms disagree"
+            print(f"{name:<16} {label:<8} {times[False] * 1e3:7.1f}ms {times[True] * 1e3:7.1f}ms"
+                  f"   {times[False] / times[True]:.2f}x")
+    PythonAstGen.range_loops = PythonCodeGen.range_loops = True
+    PythonAstGen.memo_size = PythonCodeGen.memo_size = DEFAULT_MEMO_SIZE
+
+if __name__ == "__main__":
+    main()
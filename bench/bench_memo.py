@@ -0,0 +1,101 @@
+# run time of pure functions (purity.py) with and without their lru_cache,
+# through both backends: the exponential recursions memoization is for, and
+# helpers called with a new argument every time, where it can only cost
+# usage: python bench/bench_memo.py [n]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+import runtime
+from codegen import PythonCodeGen
+from pybackend import PythonAstGen, compile_program
+from bench_parser import best_of
+
+KERNELS = {
+    'fib': """
+int fib(int n) {
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}
+int main(int n) { return fib(n); }""",
+    # paths through an n x n grid, two pure functions
+    'grid paths': """
+int paths(int r, int c) {
+    if (r < 1) return 1;
+    if (c < 1) return 1;
+    return paths(r - 1, c) + paths(r, c - 1);
+}
+int main(int n) { return paths(n - 14, n - 14); }""",
+    # all misses: the cache's bookkeeping on top of every call
+    'loop, distinct': """
+int tri(int k) {
+    int s = 0;
+    for (int j = 0; j < k; j++) s = s + j;
+    return s;
+}
+int main(int n) {
+    int total = 0;
+    for (int i = 0; i < n * 40; i++) {
+        total = total + tri(i);
+    }
+    return total;
+}""",
+    # no loop or call, marked @_pure and not cached
+    'leaf, distinct': """
+int cube(int x) { return x * x * x; }
+int main(int n) {
+    int total = 0;
+    for (int i = 0; i < n * 20000; i++) {
+        total = total + cube(i);
+    }
+    return total;
+}""",
+}
+
+def parse_program(src):
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    return parse.Parser(tokens).parse_program()
+
+def ast_backend(src):
+    namespace = dict(runtime.BUILTINS)
+    exec(compile_program(parse_program(src), src), namespace)
+    return namespace
+
+def text_backend(src):
+    namespace = dict(runtime.BUILTINS)
+    exec(PythonCodeGen().generate(parse_program(src)), namespace)
+    return namespace
+
+def cold_call(namespace, n):
+    # main(n) with every cache emptied first, or later runs would just hit
+    cached = [f for f in namespace.values() if hasattr(f, 'cache_clear')]
+    def run():
+        for f in cached:
+            f.cache_clear()
+        return namespace['main'](n)
+    return run
+
+def main():
+    # small enough for the plain recursions to finish
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    print(f"n = {n}")
+    print(f"{'kernel':<14} {'backend':<8} {'plain':>10} {'memoized':>10}")
+    for name, src in KERNELS.items():
+        for label, build in (("ast", ast_backend), ("text", text_backend)):
+            times = {}
+            results = set()
+            for size in (0, 1024):
+                PythonAstGen.memo_size = PythonCodeGen.memo_size = size
+                times[size], result = best_of(cold_call(build(src), n), 3)
+                results.add(result)
+            assert len(results) == 1, f"{name}: memoizing changed the result"
+            print(f"{name:<14} {label:<8} {times[0] * 1e3:8.2f}ms {times[1024] * 1e3:8.2f}ms"
+                  f"   {times[0] / times[1024]:.1f}x")
+    PythonAstGen.memo_size = PythonCodeGen.memo_size = 1024
+
+if __name__ == "__main__":
+    main()
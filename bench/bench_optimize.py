@@ -0,0 +1,72 @@
+# -O: what the optimizer costs next to parsing, how much of a generated program it
+# removes, and what that does to the run time of a constant heavy loop
+# usage: python bench/bench_optimize.py [size]
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+from optimizer import Optimizer
+from pybackend import compile_program, run_code
+from bench_parser import best_of
+from gen_corpus import generate, parse_size
+
+# the kind of thing -O is for: constants written out as expressions, debug
+# branches switched off with if (0), a no-op added to keep a macro happy
+HOT_LOOP = """
+int main() {
+    int total = 0;
+    for (int i = 0; i < 300000; i++) {
+        total = total + i * (60 * 60 * 24) / (1000 * 1000) + 0;
+        if (0) { printf("i %d\\n", i); }
+        total = total * 1 - (2 * 3 - 6);
+    }
+    printf("%d\\n", total);
+    return 0;
+}
+"""
+
+def parse_program(src):
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    return parse.Parser(tokens).parse_program()
+
+def main():
+    size = parse_size(sys.argv[1]) if len(sys.argv) > 1 else 2**20
+    for shape in ("mixed", "deep"):
+        src = generate(size, 1, shape)
+        t_parse, _ = best_of(lambda: parse_program(src), 3)
+
+        # optimize() rewrites the tree in place, so each run gets its own copy
+        programs = [parse_program(src) for _ in range(3)]
+        best = None
+        for program in programs:
+            t = time.perf_counter()
+            opt = Optimizer()
+            opt.optimize(program)
+            t = time.perf_counter() - t
+            best = t if best is None else min(best, t)
+        print(f"{shape:<6} {len(src) / 2**20:.1f} MiB: parse {t_parse:.3f} s, -O {best:.3f} s"
+              f" ({best / t_parse * 100:.0f}% of parse)")
+        print(f"       {opt.report()}")
+
+    def run(optimize):
+        program = parse_program(HOT_LOOP)
+        if optimize:
+            program = Optimizer().optimize(program)
+        code = compile_program(program, HOT_LOOP)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            run_code(code)
+        return out.getvalue()
+    t_plain, plain = best_of(lambda: run(False), 3)
+    t_opt, opt_out = best_of(lambda: run(True), 3)
+    assert plain == opt_out, "-O changed the output"
+    print(f"hot loop --run: {t_plain:.3f} s, with -O {t_opt:.3f} s ({t_plain / t_opt:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# precedence climbing vs the old cascade on expression heavy input
+# usage: python bench/bench_parser.py [functions]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+
+BINOPS = ['+', '-', '*', '/', '<', '>', '<=', '>=', '&&', '||']
+
+def expr(rng, depth):
+    if depth == 0 or rng.random() < 0.2:
+        return rng.choice(['a', 'b', 'c', 'xs[i]', 'f(a, 2)', str(rng.randint(0, 99))])
+    if rng.random() < 0.15:
+        return '-' + expr(rng, depth - 1)
+    if rng.random() < 0.15:
+        return '(' + expr(rng, depth - 1) + ')'
+    return expr(rng, depth - 1) + ' ' + rng.choice(BINOPS) + ' ' + expr(rng, depth - 1)
+
+def source(functions, seed=1):
+    rng = random.Random(seed)
+    out = []
+    for n in range(functions):
+        out.append(f"int f{n}(int a, int b, int c) {{\n")
+        for _ in range(10):
+            out.append(f"    a = {expr(rng, 5)};\n")
+        out.append("    return a;\n}\n")
+    return ''.join(out)
+
+def best_of(fn, runs=3):
+    best = None
+    for _ in range(runs):
+        t = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    src = source(functions)
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    print(f"{len(src) / 1024:.0f} KiB, {len(tokens)} tokens")
+
+    t_cascade, ast_cascade = best_of(lambda: parse.Parser(tokens, cascade=True).parse_program())
+    t_pratt, ast_pratt = best_of(lambda: parse.Parser(tokens).parse_program())
+    assert ast_cascade == ast_pratt, "parsers disagree"
+    print(f"cascade            {t_cascade:.3f} s")
+    print(f"precedence climbing {t_pratt:.3f} s   ({t_cascade / t_pratt:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# --profile: what the instrumentation costs, off / timings / + tracemalloc / + cProfile
+# usage: python bench/bench_profile.py [copies]
+import io
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout, redirect_stderr
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import main as compiler
+from bench_parser import best_of
+from bench_tokens import TEMPLATE
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "f.ctri")
+        with open(path, "w") as f:
+            f.write(''.join(TEMPLATE.format(n=n) for n in range(copies)))
+        report = os.path.join(tmp, "profile.json")
+        print(f"{os.path.getsize(path) / 2**20:.2f} MiB, {copies} functions")
+
+        def run(*extra):
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                return compiler.main([path, *extra])
+
+        t_off, _ = best_of(run, 5)
+        print(f"{'off':<26} {t_off * 1e3:8.1f} ms")
+        for label, extra in (("--profile", ["--profile", report]),
+                             ("  + --profile-memory", ["--profile", report, "--profile-memory"]),
+                             ("  + --profile-functions 20", ["--profile", report, "--profile-functions", "20"])):
+            t, _ = best_of(lambda: run(*extra), 3)
+            print(f"{label:<26} {t * 1e3:8.1f} ms   ({t / t_off:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# structure.resolve() over a generated corpus per shape, the one Resolution -O
+# and both backends share, and loops.bound_names from it against walking each
+# function for its declarations and assignments the way bound_names still does
+# without one. then both backends end to end
+# usage: python bench/bench_resolve.py [size]
+import gc
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+from codegen import PythonCodeGen
+from pybackend import PythonAstGen
+from loops import bound_names
+from structure import resolve
+from bench_parser import best_of
+from gen_corpus import SHAPES, generate, parse_size
+
+def from_resolution(functions, resolution):
+    for fn in functions:
+        bound_names(fn, resolution)
+
+def walking(functions):
+    for fn in functions:
+        bound_names(fn)
+
+def main():
+    size = parse_size(sys.argv[1]) if len(sys.argv) > 1 else 2**20
+    # like the compile phases in main.py, the collector doesn't run while lowering
+    gc.disable()
+    print(f"{'shape':<9} {'functions':>9} {'resolve':>9} {'bound':>9} {'walk':>9} {'text':>9} {'ast':>9}")
+    for shape in SHAPES:
+        src = generate(size, 1, shape)
+        tokens = get_tokens(src)
+        tokens.append(('EOF', 'EOF', len(src)))
+        program = parse.Parser(tokens).parse_program()
+        functions = [d for d in program.declarations if isinstance(d, parse.Function)]
+        t_whole, _ = best_of(lambda: resolve(program), 5)
+        resolution = resolve(program)
+        t_each, _ = best_of(lambda: from_resolution(functions, resolution), 5)
+        t_walk, _ = best_of(lambda: walking(functions), 5)
+        t_text, _ = best_of(lambda: PythonCodeGen().generate(program), 5)
+        t_ast, _ = best_of(lambda: PythonAstGen(src).lower(program), 5)
+        print(f"{shape:<9} {len(functions):>9} {t_whole * 1e3:7.1f}ms {t_each * 1e3:7.1f}ms"
+              f" {t_walk * 1e3:7.1f}ms {t_text * 1e3:7.1f}ms {t_ast * 1e3:7.1f}ms")
+    gc.enable()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# compile server: per request latency of a cold `python main.py` against client.py
+# talking to a running server.py, for one small file
+# usage: python bench/bench_server.py [runs]
+import io
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from client import connect, request
+from driver import compile_source
+from bench_tokens import TEMPLATE
+
+def latency(label, runs, fn):
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    times.sort()
+    print(f"{label:<28} median {times[len(times) // 2] * 1e3:7.2f} ms"
+          f"   p90 {times[len(times) * 9 // 10] * 1e3:7.2f} ms")
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "f.ctri")
+        src = ''.join(TEMPLATE.format(n=n) for n in range(10))
+        with open(path, "w") as f:
+            f.write(src)
+        sock_path = os.path.join(tmp, "server.sock")
+        env = dict(os.environ, HYPOTENUSE_SOCKET=sock_path)
+        server = subprocess.Popen([sys.executable, os.path.join(SRC, "server.py"), "--socket", sock_path],
+                                  stderr=subprocess.PIPE)
+        server.stderr.readline()  # "listening on", it's warm from here
+        try:
+            def cli(script):
+                subprocess.run([sys.executable, os.path.join(SRC, script), path],
+                               env=env, stdout=subprocess.DEVNULL, check=True)
+
+            def round_trip():
+                with connect(sock_path) as sock:
+                    request(sock, [path], out=io.BytesIO(), err=io.BytesIO())
+
+            print(f"{len(src)} bytes, {runs} runs each")
+            latency("python -c pass", runs, lambda: subprocess.run([sys.executable, "-c", "pass"], check=True))
+            latency("python main.py (cold)", runs, lambda: cli("main.py"))
+            latency("python client.py -> server", runs, lambda: cli("client.py"))
+            latency("round trip, no startup", runs, round_trip)
+            latency("compile in process", runs, lambda: compile_source(src))
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
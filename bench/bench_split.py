@@ -0,0 +1,29 @@
+# one big file: serial compile vs split between top level declarations over workers
+# usage: python bench/bench_split.py [copies]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from driver import compile_source
+from split import compile_parallel, split_points, CHUNKS_PER_JOB
+from bench_parser import best_of
+from bench_tokens import TEMPLATE
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    src = ''.join(TEMPLATE.format(n=n) for n in range(copies))
+    cpus = os.cpu_count() or 1
+    print(f"{len(src) / 2**20:.1f} MiB, {copies} functions, {cpus} cpus")
+
+    t_serial, expected = best_of(lambda: compile_source(src), 1)
+    t_scan, _ = best_of(lambda: split_points(src, cpus * CHUNKS_PER_JOB), 3)
+    print(f"serial              {t_serial:7.2f} s")
+    print(f"pre-scan only       {t_scan:7.2f} s")
+    for jobs in sorted({2, 4, cpus}):
+        t, out = best_of(lambda: compile_parallel(src, jobs, min_size=0), 1)
+        assert out == expected, "output differs from the serial path"
+        print(f"--parallel-parse {jobs:<2} {t:7.2f} s   ({t_serial / t:.2f}x)")
+
+if __name__ == "__main__":
+    main()
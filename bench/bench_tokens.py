@@ -0,0 +1,54 @@
+# memory / time of the token list vs TokenBuffer on a big generated source
+# usage: python bench/bench_tokens.py [copies]
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+from tokenbuf import TokenBuffer
+import parser as parse
+
+TEMPLATE = '''
+// helper number {n}
+int value_{n} = {n};
+
+int step_{n}(int a, int b) {{
+    int t = a * {n} + b;
+    for (int i = 0; i < 8; i++) {{
+        t = t + value_{n} * (i - b) / 3;
+    }}
+    return t;
+}}
+'''
+
+def measure(label, fn):
+    # timed without tracemalloc (it slows everything down a lot), then run again for the peak
+    t = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.3f} s   peak {peak / 2**20:8.1f} MiB")
+    return result
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    source = ''.join(TEMPLATE.format(n=n) for n in range(copies))
+    print(f"source: {len(source) / 2**20:.1f} MiB")
+
+    tokens = measure("lex -> list of tuples", lambda: get_tokens(source))
+    buf = measure("lex -> TokenBuffer", lambda: TokenBuffer.from_source(source))
+    print(f"tokens: {len(tokens)}  ({buf.nbytes() / len(buf):.0f} bytes/token in the buffer)")
+
+    tokens.append(('EOF', 'EOF', len(source)))
+    buf.append(('EOF', 'EOF', len(source)))
+    measure("parse from list", lambda: parse.Parser(tokens).parse_program())
+    measure("parse from TokenBuffer", lambda: parse.Parser(buf).parse_program())
+
+if __name__ == "__main__":
+    main()
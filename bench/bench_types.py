@@ -0,0 +1,139 @@
+# run time of each typed.py lowering on and off, through both backends: c int
+# division, typed (array module) arrays and globals bound to locals. each one
+# is switched on its own with the other two at their defaults. peak is the most
+# memory a run allocates (tracemalloc, a run of its own so timings don't pay for it)
+# usage: python bench/bench_types.py [n]
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+import loops
+import runtime
+from codegen import PythonCodeGen
+from pybackend import PythonAstGen, compile_program
+from purity import DEFAULT_MEMO_SIZE
+from bench_parser import best_of
+
+# a kernel's n is main's argument, N the array length baked into the source
+KERNELS = {
+    'int division': {
+        # the bound is an int again, so the loop can be a range() loop
+        'range bound n / 2': """
+int main(int n) {
+    int s = 0;
+    for (int i = 0; i < n / 2; i++) s = s + i;
+    return s;
+}""",
+        # off gives floats here, a different (wrong for c) result: what the
+        # truncating division costs against python's /
+        'i / 3 + i / k': """
+int main(int n) {
+    int s = 0;
+    int k = 7;
+    for (int i = 0; i < n; i++) s = s + i / 3 + (i - n) / k;
+    return s;
+}""",
+    },
+    'typed arrays': {
+        'sieve, int[N]': """
+int main(int n) {
+    int flags[N];
+    int count = 0;
+    for (int i = 2; i < N; i++) {
+        if (flags[i] < 1) {
+            count++;
+            for (int j = i * i; j < N; j = j + i) flags[j] = 1;
+        }
+    }
+    return count;
+}""",
+        'prefix sums, double[N]': """
+int main(int n) {
+    double a[N];
+    for (int i = 1; i < N; i++) a[i] = a[i - 1] + i * 0.5;
+    return a[N - 1] > 0;
+}""",
+    },
+    'bind globals': {
+        # reading a global variable every time round
+        'global in a loop': """
+int scale = 3;
+int main(int n) {
+    int s = 0;
+    for (int i = 0; i < n; i++) s = s + scale * i;
+    return s;
+}""",
+        # calling a function defined further up every time round
+        'call in a loop': """
+int twice(int x) { return x + x; }
+int main(int n) {
+    int s = 0;
+    for (int i = 0; i < n; i++) s = s + twice(i);
+    return s;
+}""",
+    },
+}
+
+def switch(name, on):
+    if name == 'int division':
+        loops.INT_DIVISION = on
+    elif name == 'typed arrays':
+        PythonCodeGen.typed_arrays = PythonAstGen.typed_arrays = on
+    else:
+        PythonCodeGen.bind_globals = PythonAstGen.bind_globals = on
+
+def parse_program(src):
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    return parse.Parser(tokens).parse_program()
+
+def ast_backend(src):
+    namespace = dict(runtime.BUILTINS)
+    exec(compile_program(parse_program(src), src), namespace)
+    return namespace['main']
+
+def text_backend(src):
+    namespace = dict(runtime.BUILTINS)
+    exec(PythonCodeGen().generate(parse_program(src)), namespace)
+    return namespace['main']
+
+def peak(fn, n):
+    tracemalloc.start()
+    try:
+        fn(n)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    # the kernels are pure, memoized the best of 3 would be a cache hit
+    PythonAstGen.memo_size = PythonCodeGen.memo_size = 0
+    print(f"n = N = {n}")
+    print(f"{'lowering':<14} {'kernel':<24} {'backend':<8} {'off':>10} {'on':>10} {'':>8}"
+          f" {'peak off':>9} {'peak on':>9}")
+    for lowering, kernels in KERNELS.items():
+        for name, src in kernels.items():
+            src = src.replace("N", str(n))
+            for label, build in (("ast", ast_backend), ("text", text_backend)):
+                times = {}
+                results = {}
+                peaks = {}
+                for on in (False, True):
+                    switch(lowering, on)
+                    fn = build(src)
+                    times[on], results[on] = best_of(lambda: fn(n), 3)
+                    peaks[on] = peak(fn, n)
+                switch(lowering, lowering == 'int division')
+                same = "" if results[False] == results[True] else "   (results differ)"
+                print(f"{lowering:<14} {name:<24} {label:<8} {times[False] * 1e3:8.2f}ms"
+                      f" {times[True] * 1e3:8.2f}ms {times[False] / times[True]:7.2f}x"
+                      f" {peaks[False] / 2**20:7.1f}MB {peaks[True] / 2**20:7.1f}MB{same}")
+    PythonAstGen.memo_size = PythonCodeGen.memo_size = DEFAULT_MEMO_SIZE
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# run time of element-wise loops (vectorize.py) as numpy operations against the
+# plain range() loop, through both backends, from 1e3 to 1e7 elements, on numpy
+# arrays and on python lists (which always take the loop). the kernels take
+# arrays, so they are called from here rather than through --run. last, a
+# whole program declaring its own arrays, run like --run does, with and
+# without --vectorize
+# usage: python bench/bench_vector.py [max n]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from lexer import get_tokens
+import parser as parse
+import runtime
+from codegen import PythonCodeGen
+from pybackend import PythonAstGen, compile_program, run_code
+from bench_parser import best_of
+
+if runtime.numpy is None:
+    sys.exit("numpy isn't installed, vectorized loops always fall back to the loop")
+import numpy
+
+KERNELS = {
+    'c = a * b + k': """
+int main(int a, int b, int c, int n, int k) {
+    for (int i = 0; i < n; i++) {
+        c[i] = a[i] * b[i] + k;
+    }
+    return 0;
+}""",
+    # two statements, the second reading what the first wrote
+    'two statements': """
+int main(int a, int b, int c, int n, int k) {
+    for (int i = 0; i < n; i++) {
+        c[i] = a[i] - b[i];
+        b[i] = c[i] * c[i] + a[i] * k;
+    }
+    return 0;
+}""",
+}
+
+# arrays main declares: lists without --vectorize, numpy arrays with it (a
+# function's own arrays that its element-wise loops use, globals stay lists)
+PROGRAM = """
+int main() {{
+    double a[{n}];
+    double b[{n}];
+    double c[{n}];
+    for (int i = 0; i < {n}; i++) {{ a[i] = i; b[i] = 7 * i; }}
+    for (int r = 0; r < 10; r++) {{
+        for (int i = 0; i < {n}; i++) {{ c[i] = a[i] * b[i] + r; }}
+    }}
+    return 0;
+}}"""
+
+def parse_program(src):
+    tokens = get_tokens(src)
+    tokens.append(('EOF', 'EOF', len(src)))
+    return parse.Parser(tokens).parse_program()
+
+def ast_backend(program, src):
+    namespace = dict(runtime.BUILTINS)
+    exec(compile_program(program, src), namespace)
+    return namespace['main']
+
+def text_backend(program, src):
+    namespace = dict(runtime.BUILTINS)
+    exec(PythonCodeGen().generate(program), namespace)
+    return namespace['main']
+
+def inputs(n, kind):
+    # small ints, python shares those, so 1e7 of them fit in memory as lists too
+    a = numpy.arange(n, dtype=numpy.int64) & 255
+    b = (numpy.arange(n, dtype=numpy.int64) * 7) & 255
+    c = numpy.zeros(n, dtype=numpy.int64)
+    if kind == "list":
+        return a.tolist(), b.tolist(), c.tolist()
+    return a, b, c
+
+def main():
+    top = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    sizes = [n for n in (1_000, 10_000, 100_000, 1_000_000, 10_000_000) if n <= top]
+    print(f"{'kernel':<16} {'backend':<8} {'input':<6} {'n':>9} {'loop':>11} {'vectorized':>11}")
+    for name, src in KERNELS.items():
+        for label, build in (("ast", ast_backend), ("text", text_backend)):
+            fns = {}
+            for flag in (False, True):
+                PythonAstGen.vector_loops = PythonCodeGen.vector_loops = flag
+                fns[flag] = build(parse_program(src), src)
+            for kind in ("array", "list"):
+                for n in sizes:
+                    times = {}
+                    results = []
+                    for flag in (False, True):
+                        a, b, c = inputs(n, kind)
+                        times[flag], _ = best_of(lambda: fns[flag](a, b, c, n, 3), 3 if n < 10_000_000 else 1)
+                        results.append((list(b[-5:]), list(c[-5:])))
+                        del a, b, c
+                    assert results[0] == results[1], f"{name}: vectorizing changed the result"
+                    print(f"{name:<16} {label:<8} {kind:<6} {n:>9} {times[False] * 1e3:9.2f}ms"
+                          f" {times[True] * 1e3:9.2f}ms   {times[False] / times[True]:.1f}x")
+    print()
+    print(f"{'program, 10 passes':<20} {'n':>9} {'plain':>11} {'--vectorize':>12}")
+    for n in sizes:
+        src = PROGRAM.format(n=n)
+        times = {}
+        for flag in (False, True):
+            PythonAstGen.vector_loops = flag
+            code = compile_program(parse_program(src), src)
+            times[flag], _ = best_of(lambda: run_code(code), 3 if n < 10_000_000 else 1)
+        print(f"{'c = a * b + r':<20} {n:>9} {times[False] * 1e3:9.2f}ms {times[True] * 1e3:10.2f}ms"
+              f"   {times[False] / times[True]:.1f}x")
+    PythonAstGen.vector_loops = PythonCodeGen.vector_loops = False
+
+if __name__ == "__main__":
+    main()
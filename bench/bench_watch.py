@@ -0,0 +1,40 @@
+# watch mode: recompiling a big file after a one function edit, whole file vs
+# incremental.IncrementalCompiler
+# usage: python bench/bench_watch.py [copies]
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from driver import compile_source
+from incremental import IncrementalCompiler
+from bench_parser import best_of
+from bench_tokens import TEMPLATE
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    src = ''.join(TEMPLATE.format(n=n) for n in range(copies))
+    # two versions differing inside one function in the middle, saved alternately
+    mid = src.index("return", len(src) // 2)
+    edited = src[:mid] + "return 1 + " + src[mid + len("return "):]
+    print(f"{len(src) / 2**20:.2f} MiB, {copies} functions")
+
+    t_full, expected = best_of(lambda: compile_source(edited), 3)
+    ic = IncrementalCompiler()
+    t_first, _ = best_of(lambda: IncrementalCompiler().update(src), 3)
+    ic.update(src)
+    versions = [edited, src]
+    def save():
+        versions.reverse()
+        return ic.update(versions[1])
+    t_edit, _ = best_of(save, 20)
+    assert ic.update(edited) == expected, "output differs from a whole file compile"
+    appended = edited + "int extra(int z) { return z * 2; }\n"
+    t_append, _ = best_of(lambda: (ic.update(edited), ic.update(appended))[1], 20)
+    print(f"whole file compile        {t_full * 1e3:8.1f} ms")
+    print(f"first build (pieces)      {t_first * 1e3:8.1f} ms")
+    print(f"one function edited       {t_edit * 1e3:8.1f} ms   ({t_full / t_edit:.0f}x)")
+    print(f"function appended (x2)    {t_append * 1e3:8.1f} ms")
+
+if __name__ == "__main__":
+    main()
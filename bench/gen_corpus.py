@@ -0,0 +1,195 @@
+# seeded generator of .ctri programs for benchmarks, only using what the lexer and
+# parser take (int variables, functions, if / while / for, + - * / < > <= >= && ||,
+# calls, ++ / --, comments, printf with a string). every name is declared before it's
+# used, calls go to functions defined earlier with the right number of arguments,
+# loops are bounded, * and / only take a small positive literal on the right and only
+# leaf functions (ones that call nothing) get called, from outside loops, so the
+# programs also run (main.py --run) in reasonable time
+#
+# shapes weight the parts differently:
+#   mixed     a bit of everything
+#   globals   mostly global declarations
+#   deep      few statements, deeply nested expressions
+#   long      few, very long functions
+#   comments  about two thirds of the bytes are comments
+#
+# usage: python bench/gen_corpus.py SIZE [--shape S] [--seed N] [-o FILE]
+#        (SIZE like 4096, 64KB, 10MB)
+import argparse
+import random
+import sys
+
+SHAPES = {
+    # globals per function, statements per function, expression depth, comment rate
+    'mixed':    dict(globals=2, statements=(4, 20), depth=4, comments=0.1),
+    'globals':  dict(globals=40, statements=(2, 4), depth=2, comments=0.05),
+    'deep':     dict(globals=1, statements=(2, 5), depth=10, comments=0.05),
+    'long':     dict(globals=1, statements=(300, 600), depth=3, comments=0.1),
+    'comments': dict(globals=2, statements=(4, 12), depth=3, comments=0.9),
+}
+
+BINOPS = ['+', '-', '<', '>', '<=', '>=', '&&', '||']
+WORDS = ("the value of this counter is kept between calls and checked against the limit "
+         "before anything else happens so callers can rely on it staying small").split()
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for suffix, scale in (("GB", 2**30), ("MB", 2**20), ("KB", 2**10), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * scale)
+    return int(text)
+
+class Generator:
+    def __init__(self, seed: int = 1, shape: str = 'mixed'):
+        self.rng = random.Random(seed)
+        self.shape = SHAPES[shape]
+        self.globals = []
+        # (name, number of params) of the functions written so far, and of the leaves
+        self.functions = []
+        self.leaves = []
+        self.calls = True
+        # > 0 inside a loop body, where nothing gets called
+        self.loops = 0
+        self.count = 0
+        self.out = []
+        self.size = 0
+
+    def emit(self, text: str):
+        self.out.append(text)
+        self.size += len(text)
+
+    def comment(self, indent: str):
+        rng = self.rng
+        words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+        if rng.random() < 0.6:
+            return f"{indent}// {words}\n"
+        lines = ''.join(f"{indent}   {' '.join(rng.choice(WORDS) for _ in range(8))}\n"
+                        for _ in range(rng.randint(1, 4)))
+        return f"{indent}/* {words}\n{lines}{indent}*/\n"
+
+    def expr(self, names, depth: int) -> str:
+        rng = self.rng
+        if depth <= 0 or rng.random() < 0.15:
+            if rng.random() < 0.35:
+                return str(rng.randint(0, 99))
+            return rng.choice(names)
+        roll = rng.random()
+        if roll < 0.08:
+            operand = self.expr(names, depth - 1)
+            # "--x" would lex as a decrement
+            return '-' + (f"({operand})" if operand.startswith('-') else operand)
+        if roll < 0.12:
+            return '!' + self.expr(names, depth - 1)
+        if roll < 0.2:
+            return '(' + self.expr(names, depth - 1) + ')'
+        if roll < 0.26:
+            return f"{self.expr(names, depth - 1)} {rng.choice('*/')} {rng.randint(1, 9)}"
+        if roll < 0.34 and self.calls and not self.loops and self.leaves:
+            name, arity = rng.choice(self.leaves)
+            args = ', '.join(self.expr(names, depth - 2) for _ in range(arity))
+            return f"{name}({args})"
+        return f"{self.expr(names, depth - 1)} {rng.choice(BINOPS)} {self.expr(names, depth - 1)}"
+
+    def statements(self, names, locals_, indent: str, count: int, nesting: int):
+        rng = self.rng
+        shape = self.shape
+        lines = []
+        for _ in range(count):
+            if rng.random() < shape['comments']:
+                lines.append(self.comment(indent))
+            roll = rng.random()
+            target = rng.choice(locals_)
+            if roll < 0.15:
+                name = f"v{len(locals_)}"
+                lines.append(f"{indent}int {name} = {self.expr(names, shape['depth'])};\n")
+                locals_.append(name)
+                names = names + [name]
+            elif roll < 0.25 and nesting < 3:
+                body = self.statements(names, list(locals_), indent + "    ", rng.randint(1, 4), nesting + 1)
+                line = f"{indent}if ({self.expr(names, 2)}) {{\n{body}{indent}}}"
+                if rng.random() < 0.4:
+                    other = self.statements(names, list(locals_), indent + "    ", rng.randint(1, 3), nesting + 1)
+                    line += f" else {{\n{other}{indent}}}"
+                lines.append(line + "\n")
+            elif roll < 0.33 and nesting < 3:
+                # the loop variable is only read in the body, k stays below the bound
+                k = f"k{nesting}"
+                self.loops += 1
+                body = self.statements(names + [k], list(locals_), indent + "    ", rng.randint(1, 4), nesting + 1)
+                self.loops -= 1
+                lines.append(f"{indent}for (int {k} = 0; {k} < {rng.randint(2, 6)}; {k}++) {{\n{body}{indent}}}\n")
+            elif roll < 0.38 and nesting < 3:
+                w = f"w{nesting}"
+                self.loops += 1
+                # w may already be a local from an earlier loop, the body mustn't assign it
+                body = self.statements(names + [w], [x for x in locals_ if x != w], indent + "    ",
+                                       rng.randint(1, 3), nesting + 1)
+                self.loops -= 1
+                lines.append(f"{indent}int {w} = {rng.randint(1, 5)};\n"
+                             f"{indent}while ({w} > 0) {{\n{body}{indent}    {w} = {w} - 1;\n{indent}}}\n")
+                locals_.append(w)
+            elif roll < 0.45:
+                lines.append(f"{indent}{target}{rng.choice(['++', '--'])};\n")
+            elif roll < 0.48:
+                lines.append(f"{indent}printf(\"{target} %d\\n\", {target});\n")
+            else:
+                lines.append(f"{indent}{target} = {self.expr(names, self.shape['depth'])};\n")
+        return ''.join(lines)
+
+    def function(self):
+        rng = self.rng
+        n = self.count
+        self.count += 1
+        # every third function is a leaf
+        self.calls = n % 3 != 0
+        params = [f"p{i}" for i in range(rng.randint(0, 3))]
+        if rng.random() < self.shape['comments']:
+            self.emit(self.comment(""))
+        locals_ = ["t"]
+        names = self.globals[-20:] + params + locals_
+        body = self.statements(names, locals_, "    ", rng.randint(*self.shape['statements']), 0)
+        self.emit(f"int fn{n}({', '.join('int ' + p for p in params)}) {{\n"
+                  f"    int t = {self.expr(names[:-1] or ['1'], 2)};\n"
+                  f"{body}    return t;\n}}\n\n")
+        self.functions.append((f"fn{n}", len(params)))
+        if not self.calls:
+            self.leaves.append((f"fn{n}", len(params)))
+
+    def global_decl(self):
+        name = f"g{len(self.globals)}"
+        if self.rng.random() < self.shape['comments']:
+            self.emit(self.comment(""))
+        self.emit(f"int {name} = {self.rng.randint(0, 999)};\n")
+        self.globals.append(name)
+
+    def program(self, size: int) -> str:
+        while self.size < size:
+            for _ in range(self.rng.randint(0, 2 * self.shape['globals'])):
+                self.global_decl()
+            self.function()
+        # main calls the last few functions, so --run does something
+        calls = ''.join(f"    total = total + {name}({', '.join(['1'] * arity)});\n"
+                        for name, arity in self.functions[-5:])
+        self.emit(f"int main() {{\n    int total = 0;\n{calls}    printf(\"total %d\\n\", total);\n    return 0;\n}}\n")
+        return ''.join(self.out)
+
+def generate(size: int, seed: int = 1, shape: str = 'mixed') -> str:
+    # a program of at least size bytes (a little over: it ends on a whole function)
+    return Generator(seed, shape).program(size)
+
+def main():
+    ap = argparse.ArgumentParser(description="generate a .ctri benchmark program")
+    ap.add_argument("size", help="roughly how big, e.g. 4096, 64KB, 10MB")
+    ap.add_argument("--shape", choices=sorted(SHAPES), default="mixed")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("-o", "--output", metavar="FILE", help="write here instead of stdout")
+    args = ap.parse_args()
+    text = generate(parse_size(args.size), args.seed, args.shape)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+if __name__ == "__main__":
+    main()
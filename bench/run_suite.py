@@ -0,0 +1,145 @@
+# scaling suite: get_tokens, Parser.parse_program, PythonCodeGen.generate and the
+# whole CLI (python src/main.py file) on generated programs (gen_corpus.py) from
+# 1 KB up. reports throughput per size, flags any stage whose time grows faster than
+# the input and compares against a stored baseline (bench/baseline.json).
+# exits 1 if anything was flagged
+# usage: python bench/run_suite.py [--max-size 10MB] [--shape mixed] [--seed 1]
+#                                  [--baseline FILE] [--save-baseline] [--tolerance 0.25]
+# 100MB works but needs ~4 GB for the token list and the ast
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'src')
+sys.path.insert(0, SRC)
+
+from lexer import get_tokens
+import parser as parse
+from codegen import PythonCodeGen
+from driver import paused_gc
+from bench_parser import best_of
+from gen_corpus import generate, parse_size
+
+SIZES = ["1KB", "10KB", "100KB", "1MB", "10MB", "100MB"]
+STAGES = ["lex", "parse", "codegen", "cli"]
+# time(size * k) up to k ** STEP counts as linear between neighbouring sizes, and up
+# to k ** SPAN over the whole ladder (at least 100x). timings here move by +-30% from
+# run to run, one 10x step can't tell n log n or a slow gc creep from noise, two
+# decades and more can
+STEP = 1.3
+SPAN = 1.15
+# times below this are too small to say anything, they're left out
+MIN_TIME = 0.02
+
+def runs_for(size: int) -> int:
+    return 5 if size <= 2**20 else 3 if size <= 10 * 2**20 else 1
+
+def measure(path: str, text: str):
+    # seconds per stage for one program
+    runs = runs_for(len(text))
+    times = {}
+    times['lex'], tokens = best_of(lambda: get_tokens(text), runs)
+    tokens.append(('EOF', 'EOF', len(text)))
+    # the gc is paused the way main.py pauses it around these phases
+    with paused_gc():
+        times['parse'], ast = best_of(lambda: parse.Parser(tokens).parse_program(), runs)
+        del tokens
+        times['codegen'], _ = best_of(lambda: PythonCodeGen().generate(ast), runs)
+        del ast
+    cli = [sys.executable, os.path.join(SRC, "main.py"), path]
+    times['cli'], _ = best_of(lambda: subprocess.run(cli, stdout=subprocess.DEVNULL, check=True), runs)
+    return times
+
+def superlinear(results):
+    # (stage, small, big, exponent) for each stretch of the ladder that grew faster
+    # than linear. results are (nominal size, real size, times)
+    flagged = []
+    for stage in STAGES:
+        timed = [(s, n, t[stage]) for s, n, t in results if t[stage] >= MIN_TIME]
+        for (s1, n1, t1), (s2, n2, t2) in zip(timed, timed[1:]):
+            exponent = math.log(t2 / t1) / math.log(n2 / n1)
+            if exponent > STEP:
+                flagged.append((stage, s1, s2, exponent))
+        if len(timed) >= 3:
+            (s1, n1, t1), (s2, n2, t2) = timed[0], timed[-1]
+            exponent = math.log(t2 / t1) / math.log(n2 / n1)
+            if exponent > SPAN:
+                flagged.append((stage, s1, s2, exponent))
+    return flagged
+
+def label(size: int) -> str:
+    for suffix, scale in (("MB", 2**20), ("KB", 2**10)):
+        if size >= scale:
+            return f"{size / scale:g}{suffix}"
+    return f"{size}B"
+
+def main():
+    ap = argparse.ArgumentParser(description="compiler scaling benchmarks")
+    ap.add_argument("--max-size", default="10MB", help="largest program (default 10MB, up to 100MB)")
+    ap.add_argument("--shape", default="mixed", help="gen_corpus.py shape")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--baseline", default=os.path.join(HERE, "baseline.json"))
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.25,
+                    help="flag a stage that lost more than this much throughput (default 0.25)")
+    args = ap.parse_args()
+
+    sizes = [parse_size(s) for s in SIZES if parse_size(s) <= parse_size(args.max_size)]
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if (stored['shape'], stored['seed']) == (args.shape, args.seed):
+            baseline = stored['mb_per_s']
+        else:
+            print(f"baseline is for --shape {stored['shape']} --seed {stored['seed']}, not comparing")
+
+    print(f"{'stage':<8} {'size':>7} {'time':>10} {'MB/s':>8} {'baseline':>9}")
+    results = []
+    rates = {}
+    slower = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            text = generate(size, args.seed, args.shape)
+            path = os.path.join(tmp, f"{label(size)}.ctri")
+            with open(path, "w") as f:
+                f.write(text)
+            times = measure(path, text)
+            # programs come out a little over size, rates use what was really there
+            n = len(text)
+            del text
+            os.remove(path)
+            results.append((size, n, times))
+            for stage in STAGES:
+                rate = n / 2**20 / times[stage]
+                rates.setdefault(stage, {})[label(size)] = round(rate, 3)
+                old = baseline.get(stage, {}).get(label(size))
+                vs = ""
+                if old:
+                    vs = f"{(rate / old - 1) * 100:+8.0f}%"
+                    # the cli's fixed startup swamps the small sizes, only compare from 1MB
+                    if rate < old * (1 - args.tolerance) and (stage != 'cli' or size >= 2**20):
+                        slower.append((stage, size, rate, old))
+                print(f"{stage:<8} {label(size):>7} {times[stage] * 1e3:8.1f}ms {rate:8.2f} {vs:>9}", flush=True)
+
+    flagged = superlinear(results)
+    for stage, s1, s2, exponent in flagged:
+        print(f"superlinear: {stage} {label(s1)} -> {label(s2)} grew as size^{exponent:.2f}")
+    for stage, size, rate, old in slower:
+        print(f"slower than baseline: {stage} at {label(size)}, {rate:.2f} MB/s vs {old:.2f} MB/s")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({'python': sys.version.split()[0], 'shape': args.shape, 'seed': args.seed,
+                       'mb_per_s': rates}, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+    return 1 if flagged or slower else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import marshal
+from array import array
+from dataclasses import fields
+from typing import List, Optional
+import parser as parse
+from parser import Node, Program
+
+# every ast class, a node's kind is its index in here
+NODE_CLASSES = [
+    parse.Program, parse.Function, parse.Declaration, parse.Compound, parse.If,
+    parse.While, parse.For, parse.Return, parse.ExprStmt, parse.Binary, parse.Unary,
+    parse.Literal, parse.Var, parse.Assignment, parse.Call, parse.ArrayAccess,
+]
+KIND = {cls: i for i, cls in enumerate(NODE_CLASSES)}
+
+# how each field is stored
+NODE, NODE_LIST, VALUE, VALUE_LIST = range(4)
+
+def _field_kind(f) -> int:
+    if f.type is Node or f.type == Optional[Node]:
+        return NODE
+    if f.type == List[Node]:
+        return NODE_LIST
+    if getattr(f.type, '__origin__', None) is list:
+        return VALUE_LIST
+    return VALUE
+
+# per kind: [(field name, how it's stored), ...]. pos isn't in here, every node
+# has one so it gets its own array
+LAYOUT = [[(f.name, _field_kind(f)) for f in fields(cls) if f.name != 'pos'] for cls in NODE_CLASSES]
+
+class NodeArena:
+    # the whole tree in a few flat arrays instead of one object per node.
+    #   kinds[i]   which class node i is
+    #   first[i]   where node i's fields start in slots (one slot per field)
+    #   slots      child node index (-1 for None), start of a run in lists,
+    #              or an index into values, depending on the field
+    #   lists      runs of [count, node, node, ...] for List[Node] fields
+    #   values     names / ops / literals / types, each distinct one stored once
+    #   positions  node i's source offset (Node.pos)
+    def __init__(self):
+        self.kinds = array('B')
+        self.first = array('q')
+        self.positions = array('q')
+        self.slots = array('q')
+        self.lists = array('q')
+        self.values = []
+        self._value_index = {}
+
+    @classmethod
+    def from_node(cls, node: Node) -> "NodeArena":
+        arena = cls()
+        arena.root_index = arena.add(node)
+        arena._value_index = None
+        return arena
+
+    @classmethod
+    def from_decls(cls, decls) -> "NodeArena":
+        # packs a Program one top level node at a time (e.g. Parser.iter_program()),
+        # so the full object tree never exists at once
+        arena = cls()
+        children = [arena.add(decl) for decl in decls]
+        arena.root_index = arena._add_packed(KIND[Program], [arena._add_list(children)], 0)
+        arena._value_index = None
+        return arena
+
+    def add(self, node: Node) -> int:
+        kind = KIND[type(node)]
+        packed = []
+        for name, how in LAYOUT[kind]:
+            value = getattr(node, name)
+            if how == NODE:
+                packed.append(-1 if value is None else self.add(value))
+            elif how == NODE_LIST:
+                packed.append(self._add_list([self.add(child) for child in value]))
+            elif how == VALUE_LIST:
+                packed.append(self._add_value(tuple(value)))
+            else:
+                packed.append(self._add_value(value))
+        return self._add_packed(kind, packed, node.pos)
+
+    def _add_packed(self, kind, packed, pos) -> int:
+        index = len(self.kinds)
+        self.kinds.append(kind)
+        self.first.append(len(self.slots))
+        self.positions.append(pos)
+        self.slots.extend(packed)
+        return index
+
+    def _add_list(self, children) -> int:
+        start = len(self.lists)
+        self.lists.append(len(children))
+        self.lists.extend(children)
+        return start
+
+    def _add_value(self, value) -> int:
+        # type is part of the key so 1, 1.0 and True don't collapse into one entry
+        key = (type(value), value)
+        if self._value_index is None:
+            # dropped once a from_* build is done, only needed again if more gets added
+            self._value_index = {(type(v), v): i for i, v in enumerate(self.values)}
+        index = self._value_index.get(key)
+        if index is None:
+            index = len(self.values)
+            self.values.append(value)
+            self._value_index[key] = index
+        return index
+
+    # flat enough for marshal, which is a lot faster than pickling the object tree
+    # (and doesn't recurse through it)
+    def to_bytes(self) -> bytes:
+        return marshal.dumps((self.root_index, self.kinds.tobytes(), self.first.tobytes(),
+                              self.slots.tobytes(), self.lists.tobytes(),
+                              self.positions.tobytes(), self.values))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "NodeArena":
+        arena = cls()
+        arena.root_index, kinds, first, slots, lists, positions, arena.values = marshal.loads(data)
+        arena.kinds.frombytes(kinds)
+        arena.first.frombytes(first)
+        arena.slots.frombytes(slots)
+        arena.lists.frombytes(lists)
+        arena.positions.frombytes(positions)
+        arena._value_index = None
+        return arena
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def nbytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.kinds, self.first, self.slots, self.lists, self.positions))
+
+    # views
+    def node(self, index: int) -> Node:
+        if index < 0:
+            return None
+        view = object.__new__(_VIEW_CLASSES[self.kinds[index]])
+        view._arena = self
+        view._index = index
+        return view
+
+    def root(self) -> Node:
+        return self.node(self.root_index)
+
+    def to_node(self, index: Optional[int] = None) -> Node:
+        # a real (mutable) node tree, for passes that want to change things
+        if index is None:
+            index = self.root_index
+        kind = self.kinds[index]
+        args = []
+        for slot, (_, how) in enumerate(LAYOUT[kind]):
+            args.append(self._read(index, slot, how, self.to_node))
+        return NODE_CLASSES[kind](*args, pos=self.positions[index])
+
+    def _read(self, index, slot, how, make):
+        raw = self.slots[self.first[index] + slot]
+        if how == NODE:
+            return None if raw < 0 else make(raw)
+        if how == NODE_LIST:
+            count = self.lists[raw]
+            return [make(child) for child in self.lists[raw + 1:raw + 1 + count]]
+        if how == VALUE_LIST:
+            return list(self.values[raw])
+        return self.values[raw]
+
+def _make_view_class(kind):
+    # subclass of the real node class with the same name, so isinstance checks and
+    # codegen's "gen_" + class name dispatch keep working. fields are read only
+    # properties that read out of the arena
+    cls = NODE_CLASSES[kind]
+    namespace = {'__slots__': ('_arena', '_index')}
+    for slot, (name, how) in enumerate(LAYOUT[kind]):
+        def getter(self, slot=slot, how=how):
+            return self._arena._read(self._index, slot, how, self._arena.node)
+        namespace[name] = property(getter)
+    namespace['pos'] = property(lambda self: self._arena.positions[self._index])
+    return type(cls.__name__, (cls,), namespace)
+
+_VIEW_CLASSES = [_make_view_class(kind) for kind in range(len(NODE_CLASSES))]
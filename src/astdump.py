@@ -0,0 +1,217 @@
+import json
+from parser import *
+from visitor import Visitor, child_fields
+
+# ast dumps. both write straight into out (anything with .write), nothing gets
+# built up as one big string, so the cost is linear in what gets written.
+
+class PrettyPrinter(Visitor):
+    # the indented text format parser.pretty() returns.
+    # visit methods write their own line(s) and yield (child, levels deeper) for
+    # each child, print() runs them off a stack and keeps self.depth / self.pad
+    # (the indent string for the current node) right.
+    # max_depth: subtrees deeper than this (counted from where printing started)
+    #            are cut down to a single "..." line
+    # max_nodes: stop after this many nodes and write one "... (truncated)" line
+    def __init__(self, out, indent: int = 0, max_depth=None, max_nodes=None):
+        self.write = out.write
+        self._pads = []
+        self.set_depth(indent)
+        self.start_depth = indent
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.truncated = False
+
+    def set_depth(self, depth: int):
+        self.depth = depth
+        pads = self._pads
+        while len(pads) <= depth:
+            pads.append('  ' * len(pads))
+        self.pad = pads[depth]
+
+    def print(self, node):
+        get = self.dispatch_table(self.prefix).get
+        limited = self.max_depth is not None or self.max_nodes is not None
+        gens = []    # generators of the nodes we're inside of
+        depths = []  # and their depths
+        pending, depth = node, self.depth
+        while True:
+            if pending is not None:
+                if self.depth != depth:
+                    self.set_depth(depth)
+                if not limited or self.enter(pending):
+                    method = get(type(pending)) or self.method_for(type(pending), self.prefix)
+                    result = method(self, pending)
+                    if result is not None:
+                        gens.append(result)
+                        depths.append(depth)
+                elif self.truncated:
+                    return
+            if not gens:
+                return
+            depth = depths[-1]
+            if self.depth != depth:
+                self.set_depth(depth)
+            for pending, extra in gens[-1]:
+                depth += extra
+                break
+            else:
+                gens.pop()
+                depths.pop()
+                pending = None
+
+    def enter(self, node) -> bool:
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            self.write(self.pad + "... (truncated)\n")
+            self.truncated = True
+            return False
+        if self.max_depth is not None and self.depth - self.start_depth > self.max_depth:
+            self.write(self.pad + "...\n")
+            return False
+        self.nodes += 1
+        return True
+
+    def visit_object(self, node):
+        # anything without its own method, nodes or not
+        self.write(self.pad + f"UnknownNode:{node}\n")
+
+    def visit_Program(self, node: Program):
+        self.write(self.pad + "Program:\n")
+        for d in node.declarations:
+            yield d, 1
+
+    def visit_Function(self, node: Function):
+        self.write(self.pad + f"Function: {node.ret_type} {node.name}({', '.join(t+' '+n for t,n in node.params)})\n")
+        yield node.body, 1
+
+    def visit_Declaration(self, node: Declaration):
+        if node.initializer:
+            self.write(self.pad + f"Declaration: {node.var_type} {node.name} =\n")
+            yield node.initializer, 1
+        else:
+            self.write(self.pad + f"Declaration: {node.var_type} {node.name}\n")
+
+    def visit_Compound(self, node: Compound):
+        self.write(self.pad + "Compound:\n")
+        for st in node.stmts:
+            yield st, 1
+
+    def visit_If(self, node: If):
+        pad = self.pad
+        self.write(pad + "If:\n" + pad + "  Cond:\n")
+        yield node.cond, 2
+        self.write(pad + "  Then:\n")
+        yield node.then_branch, 2
+        if node.else_branch:
+            self.write(pad + "  Else:\n")
+            yield node.else_branch, 2
+
+    def visit_While(self, node: While):
+        pad = self.pad
+        self.write(pad + "While:\n" + pad + "  Cond:\n")
+        yield node.cond, 2
+        self.write(pad + "  Body:\n")
+        yield node.body, 2
+
+    def visit_For(self, node: For):
+        pad = self.pad
+        self.write(pad + "For:\n")
+        for label, part in (("Init", node.init), ("Cond", node.cond), ("Post", node.post)):
+            self.write(pad + f"  {label}:\n")
+            if part:
+                yield part, 2
+            else:
+                self.write(pad + "    <none>\n")
+        self.write(pad + "  Body:\n")
+        yield node.body, 2
+
+    def visit_Return(self, node: Return):
+        pad = self.pad
+        if node.expr:
+            self.write(pad + "Return:\n")
+            yield node.expr, 1
+        else:
+            self.write(pad + "Return:\n" + pad + "  <none>\n")
+
+    def visit_ExprStmt(self, node: ExprStmt):
+        pad = self.pad
+        if node.expr:
+            self.write(pad + "ExprStmt:\n")
+            yield node.expr, 1
+        else:
+            self.write(pad + "ExprStmt:\n" + pad + "  <none>\n")
+
+    def visit_Binary(self, node: Binary):
+        self.write(self.pad + f"Binary({node.op}):\n")
+        yield node.left, 1
+        yield node.right, 1
+
+    def visit_Unary(self, node: Unary):
+        self.write(self.pad + f"Unary({'prefix' if node.prefix else 'postfix'} {node.op}):\n")
+        yield node.operand, 1
+
+    def visit_Literal(self, node: Literal):
+        self.write(self.pad + f"Literal({node.value})\n")
+
+    def visit_Var(self, node: Var):
+        self.write(self.pad + f"Var({node.name})\n")
+
+    def visit_Assignment(self, node: Assignment):
+        self.write(self.pad + "Assignment:\n")
+        yield node.target, 1
+        yield node.value, 1
+
+    def visit_Call(self, node: Call):
+        self.write(self.pad + "Call:\n")
+        yield node.callee, 1
+        for a in node.args:
+            yield a, 1
+
+    def visit_ArrayAccess(self, node: ArrayAccess):
+        self.write(self.pad + "ArrayAccess:\n")
+        yield node.array, 1
+        yield node.index, 1
+
+def pretty_to(node: Node, out, indent: int = 0, max_depth=None, max_nodes=None):
+    PrettyPrinter(out, indent, max_depth, max_nodes).print(node)
+
+class _Parts(list):
+    # cheapest thing with a .write, pretty_string joins it once at the end
+    write = list.append
+
+def pretty_string(node: Node, indent: int = 0, max_depth=None, max_nodes=None) -> str:
+    out = _Parts()
+    pretty_to(node, out, indent, max_depth, max_nodes)
+    return ''.join(out)
+
+# machine readable dump: one json object per node, parents before children.
+#   {"id": 3, "parent": 1, "field": "left", "depth": 2, "type": "Binary", "op": "+"}
+# the non-node fields of each class go in as they are (params as [type, name] pairs),
+# child fields are left out, they show up as their own lines pointing back via parent
+def dump_jsonl(node: Node, out, max_depth=None, max_nodes=None):
+    encode = json.JSONEncoder(ensure_ascii=False, default=str).encode
+    stack = [(node, None, None, 0)]
+    next_id = 0
+    while stack:
+        node, parent, field, depth = stack.pop()
+        if max_nodes is not None and next_id >= max_nodes:
+            out.write(encode({"truncated": True}) + "\n")
+            return
+        record = {"id": next_id, "parent": parent, "field": field, "depth": depth,
+                  "type": type(node).__name__}
+        children = []
+        child_names = set()
+        for name, is_list in child_fields(type(node)):
+            child_names.add(name)
+            value = getattr(node, name)
+            items = value if is_list else ([] if value is None else [value])
+            children.extend((child, name) for child in items)
+        for name in node.__dataclass_fields__:
+            if name not in child_names:
+                record[name] = getattr(node, name)
+        out.write(encode(record) + "\n")
+        if max_depth is None or depth < max_depth:
+            for child, name in reversed(children):
+                stack.append((child, next_id, name, depth + 1))
+        next_id += 1
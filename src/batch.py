@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from cache import CompileCache, DEFAULT_MAX_BYTES
+from driver import decode_source, compile_source, compile_cached, settings, apply_settings
+
+# batch mode: many files, spread over worker processes (main.py -j N dir/ or files...).
+# each file's result comes back as a small tuple, a file that fails to compile is
+# reported and the rest carry on
+
+SOURCE_SUFFIX = ".ctri"
+
+def find_sources(paths):
+    # files as given, directories searched for *.ctri. sorted, so runs are repeatable
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if name.endswith(SOURCE_SUFFIX):
+                        found.append(os.path.join(dirpath, name))
+        else:
+            found.append(path)
+    return found
+
+def output_path(src: str, out_dir=None, base=None) -> str:
+    # foo.ctri -> foo.py, next to the source or under out_dir (keeping the
+    # layout below base)
+    stem = src[:-len(SOURCE_SUFFIX)] if src.endswith(SOURCE_SUFFIX) else src
+    if out_dir is None:
+        return stem + ".py"
+    rel = os.path.relpath(os.path.abspath(stem), base) if base else os.path.basename(stem)
+    return os.path.join(out_dir, rel + ".py")
+
+# per worker process
+_cache = None
+
+def _init_worker(cache_dir, cache_max_bytes, codegen_settings):
+    global _cache
+    apply_settings(codegen_settings)
+    if cache_dir:
+        _cache = CompileCache(cache_dir, cache_max_bytes)
+
+def compile_file(job):
+    # -> (src, error or None, seconds, source bytes, came from the cache)
+    src, dst = job
+    t = time.perf_counter()
+    size = 0
+    cached = False
+    try:
+        with open(src, "rb") as f:
+            source = f.read()
+        size = len(source)
+        if _cache is not None:
+            hits = _cache.hits["py"]
+            python_code = compile_cached(source, _cache)
+            cached = _cache.hits["py"] != hits
+        else:
+            python_code = compile_source(decode_source(source))
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        with open(dst, "w") as out:
+            out.write(python_code + "\n")
+        error = None
+    except Exception as e:  # one bad file shouldn't stop the batch
+        error = f"{type(e).__name__}: {e}"
+    return src, error, time.perf_counter() - t, size, cached
+
+def run_batch(paths, jobs: int = 1, out_dir=None, cache_dir=None,
+              cache_max_bytes: int = DEFAULT_MAX_BYTES, out=sys.stdout) -> int:
+    # compiles everything, prints errors and a summary, returns the exit status
+    sources = find_sources(paths)
+    if not sources:
+        print("no source files found", file=out)
+        return 1
+    base = None
+    if out_dir is not None:
+        # deepest directory holding all of them, outputs keep their layout below it
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(src)) for src in sources])
+    jobs_list = [(src, output_path(src, out_dir, base)) for src in sources]
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+
+    t = time.perf_counter()
+    if jobs == 1:
+        _init_worker(cache_dir, cache_max_bytes, settings())
+        results = [compile_file(job) for job in jobs_list]
+    else:
+        # a few chunks per worker, small enough to keep them all busy to the end
+        chunk = max(1, len(jobs_list) // (jobs * 8))
+        with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                                 initargs=(cache_dir, cache_max_bytes, settings())) as pool:
+            results = list(pool.map(compile_file, jobs_list, chunksize=chunk))
+    elapsed = time.perf_counter() - t
+
+    if cache_dir:
+        # workers don't evict, they'd all be scanning the same directory
+        CompileCache(cache_dir, cache_max_bytes).evict()
+
+    failed = [r for r in results if r[1] is not None]
+    for src, error, _, _, _ in failed:
+        print(f"{src}: {error}", file=out)
+    print_summary(results, elapsed, jobs, out)
+    return 1 if failed else 0
+
+def print_summary(results, elapsed: float, jobs: int, out):
+    failed = sum(1 for r in results if r[1] is not None)
+    cached = sum(1 for r in results if r[4])
+    total_bytes = sum(r[3] for r in results)
+    times = sorted(r[2] for r in results)
+    n = len(results)
+    print(f"{n} files, {n - failed} ok, {failed} failed, {cached} from cache"
+          f" in {elapsed:.2f} s on {jobs} worker{'s' if jobs != 1 else ''}", file=out)
+    print(f"  {n / elapsed:.0f} files/s, {total_bytes / 2**20 / elapsed:.2f} MiB/s", file=out)
+    print(f"  per file: median {times[n // 2] * 1e3:.1f} ms, mean {sum(times) / n * 1e3:.1f} ms,"
+          f" max {times[-1] * 1e3:.1f} ms", file=out)
+    slowest = sorted(results, key=lambda r: r[2], reverse=True)[:5]
+    if n > 5:
+        print("  slowest: " + ", ".join(f"{r[0]} {r[2] * 1e3:.1f} ms" for r in slowest), file=out)
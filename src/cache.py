@@ -0,0 +1,149 @@
+import hashlib
+import marshal
+import os
+import sys
+from collections import Counter
+from codegen import PythonCodeGen
+import loops
+
+# on-disk cache of compile artifacts, content addressed: an entry's key is the
+# sha256 of the compiler version plus the source bytes, so a changed file or a
+# changed compiler just misses and nothing ever has to be invalidated.
+#
+# an entry is one file, root/ab/cdef...0123, holding a marshalled dict of
+# artifacts for that source, e.g.
+#   'tokens'  marshalled token tuples
+#   'ast'     NodeArena.to_bytes()
+#   'py'      PythonCodeGen output
+# (one file rather than one per artifact: creating files is most of the cost of a
+# cold run on slow filesystems)
+#
+# reading an entry bumps its mtime, close() evicts the least recently used
+# entries once the whole thing is over max_bytes
+
+FORMAT = 1
+DEFAULT_MAX_BYTES = 512 * 2**20
+
+_fingerprint = None
+
+def compiler_fingerprint() -> str:
+    # hash of every module of the compiler (and the python version, marshal and
+    # code objects change between them), any edit gives a new set of keys
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256(f"{FORMAT} {sys.version_info[0]}.{sys.version_info[1]}".encode())
+        src_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(src_dir)):
+            if name.endswith(".py"):
+                with open(os.path.join(src_dir, name), "rb") as f:
+                    h.update(name.encode() + b"\0" + f.read())
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+class CompileCache:
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES, version=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        # generated code has pure functions memoized or not, loops vectorized or not
+        # and the typed.py lowering on or off, so those are part of it too
+        settings = (f"memo {PythonCodeGen.memo_size} vector {PythonCodeGen.vector_loops}"
+                    f" division {loops.INT_DIVISION} arrays {PythonCodeGen.typed_arrays}"
+                    f" bind {PythonCodeGen.bind_globals}")
+        self.version = (version or f"{compiler_fingerprint()} {settings}").encode()
+        # per artifact kind
+        self.hits = Counter()
+        self.misses = Counter()
+        self.written = 0
+
+    def key(self, source: bytes) -> str:
+        return hashlib.sha256(self.version + b"\0" + source).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:])
+
+    def load(self, key: str) -> dict:
+        # the artifacts stored for key, {} if there's no entry (or a broken one)
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = marshal.loads(f.read())
+        except (FileNotFoundError, EOFError, ValueError, TypeError):
+            return {}
+        try:
+            os.utime(path)  # recently used
+        except OSError:
+            pass
+        return entry
+
+    def get(self, entry: dict, kind: str):
+        # one artifact out of a loaded entry, counted as a hit or a miss
+        data = entry.get(kind)
+        if data is None:
+            self.misses[kind] += 1
+        else:
+            self.hits[kind] += 1
+        return data
+
+    def store(self, key: str, entry: dict):
+        path = self.path(key)
+        data = marshal.dumps(entry)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, so a reader (or a crash) never sees half an entry
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.written += len(data)
+
+    def close(self):
+        # only anything to do if this run added entries
+        if self.written:
+            self.evict()
+            self.written = 0
+
+    def entries(self):
+        # [(mtime, size, path), ...] for everything in the cache
+        found = []
+        try:
+            dirs = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return found
+        for d in dirs:
+            if not d.is_dir():
+                continue
+            for entry in os.scandir(d.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                st = entry.stat()
+                found.append((st.st_mtime, st.st_size, entry.path))
+        return found
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        # least recently used first, down to 90% of max_bytes so the next few
+        # runs don't have to evict again
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+        target = self.max_bytes * 0.9
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def report(self) -> str:
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        kinds = sorted(set(self.hits) | set(self.misses))
+        per_kind = ", ".join(f"{k} {self.hits[k]}/{self.misses[k]}" for k in kinds)
+        return f"cache: {hits} hits, {misses} misses (hit/miss {per_kind})"
@@ -0,0 +1,95 @@
+import os
+import sys
+import marshal
+import socket
+import struct
+
+# client for the compile server (server.py): same arguments as main.py, sent over a
+# unix socket to a compiler that's already running, output and exit status come
+# back. only socket + builtin modules, nothing of the compiler (not even json or
+# tempfile, they pull in re), so starting this is about as cheap as python gets.
+# no server running -> compiles in process like main.py would
+#
+# wire format, both ways over one connection per request:
+#   request   4 byte length + marshalled {"argv": [...], "cwd": "..."}
+#   response  frames of 1 byte tag + 4 byte length + payload until an EXIT frame
+#             STDOUT / STDERR carry utf-8 text, EXIT the status as ascii digits.
+#             a STDIN frame (empty) asks for the client's stdin, which goes back
+#             as 4 byte length + bytes. only sent if the compile reads stdin
+
+HEADER = struct.Struct(">I")
+FRAME = struct.Struct(">cI")
+STDIN, STDOUT, STDERR, EXIT = b"0", b"1", b"2", b"x"
+
+def socket_path() -> str:
+    # one server per user unless HYPOTENUSE_SOCKET says otherwise
+    return os.environ.get("HYPOTENUSE_SOCKET") or \
+        os.path.join(os.environ.get("TMPDIR") or "/tmp", f"hypotenuse-{os.getuid()}.sock")
+
+def frame(tag: bytes, payload: bytes) -> bytes:
+    return FRAME.pack(tag, len(payload)) + payload
+
+def connect(path=None):
+    # a connected socket, or None when nothing is listening at path
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path or socket_path())
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+def request(sock, argv, stdin=None, out=None, err=None):
+    # sends one request, copies output to out / err (binary streams) as it
+    # arrives. -> exit status, None if the server hung up before sending any output
+    # (it does that to restart itself when the compiler's source changed)
+    stdin = stdin or sys.stdin.buffer
+    out = out or sys.stdout.buffer
+    err = err or sys.stderr.buffer
+    body = marshal.dumps({"argv": list(argv), "cwd": os.getcwd()})
+    reader = sock.makefile("rb")
+    got_output = False
+    try:
+        sock.sendall(HEADER.pack(len(body)) + body)
+    except (BrokenPipeError, ConnectionResetError):
+        return None
+    while True:
+        try:
+            header = reader.read(FRAME.size)
+        except ConnectionResetError:
+            header = b""
+        if len(header) < FRAME.size:
+            if got_output:
+                raise ConnectionError("compile server closed the connection mid request")
+            return None
+        tag, size = FRAME.unpack(header)
+        payload = reader.read(size)
+        if tag == EXIT:
+            out.flush()
+            return int(payload)
+        got_output = True
+        if tag == STDIN:
+            data = stdin.read()
+            sock.sendall(HEADER.pack(len(data)) + data)
+        elif tag == STDERR:
+            # keep the order stdout / stderr were written in
+            out.flush()
+            err.write(payload)
+            err.flush()
+        else:
+            out.write(payload)
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    sock = connect()
+    if sock is not None:
+        with sock:
+            status = request(sock, argv)
+        if status is not None:
+            return status
+    # no server (or it's restarting), do it here
+    import main as compiler
+    return compiler.main(argv)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,117 +1,387 @@
 from parser import *
+from visitor import Visitor
+from loops import INT_TYPES, bound_names, range_loop, top_names
+from purity import DEFAULT_MEMO_SIZE, pure_calls
+from structure import Resolution
+import loops
+import runtime
+import typed
+import vectorize
 
-class PythonCodeGen:
-    def __init__(self):
+def prelude(helpers, written) -> list:
+    # the lines defining the runtime helpers (runtime.HELPERS) in helpers, less
+    # the parts already in written, which gets them added
+    lines = []
+    for name, parts in runtime.HELPERS.items():
+        if name not in helpers:
+            continue
+        for part in parts:
+            if part not in written:
+                written.add(part)
+                lines.extend(runtime.part_source(part).split("\n"))
+                lines.append("")
+    return lines
+
+def with_prelude(items):
+    # the lines of [(helpers, lines), ...], one per top level item
+    # (PythonCodeGen.generate_item), each helper's definition going in right
+    # before the first item that uses it. the same text generate() gives
+    written = set()
+    for helpers, lines in items:
+        yield from prelude(helpers, written)
+        yield from lines
+
+class PythonCodeGen(Visitor):
+    # statements go through gen_<Class> (emit lines), expressions through
+    # expr_<Class> (return a string). both are generators that yield child
+    # nodes, so Visitor runs them off a stack instead of recursing
+    prefix = "gen_"
+    # canonical for loops as `for i in range(...)` (loops.py), off gives the while loop
+    range_loops = True
+    # pure functions (purity.py) get @_memo(memo_size, ...) / @_pure, 0 leaves them plain
+    memo_size = DEFAULT_MEMO_SIZE
+    # element-wise loops as numpy operations (vectorize.py), the loop kept as the
+    # fallback, and `int a[n];` as a numpy array for them to work on. main sets it
+    # from --vectorize
+    vector_loops = False
+    # `int a[n];` as an array module array instead of a list, and the globals a
+    # function reads in its loops copied into locals on entry (typed.py)
+    typed_arrays = False
+    bind_globals = False
+
+    def __init__(self, resolution=None):
+        # structure.Resolution the items are added to as they're generated, or
+        # already are (-O's, when it's passed the same one)
+        self.resolution = Resolution() if resolution is None else resolution
         self.lines = []
         self.indent = 0
+        # the current function's names that always hold ints, for range_loop and
+        # int division
+        self.int_names = set()
+        # the current function's bound globals (name -> local), and how many
+        # __d<n> temporaries its divisions have used
+        self.bound = {}
+        self.divisions = 0
+        # the current function returns an int (typed.coerce)
+        self.int_result = False
+        # its arrays that are numpy arrays, name -> int / float (vectorize.vector_arrays)
+        self.numpy_arrays = {}
+        # variables of the range() loops we're in that can't be negative
+        self.nonnegative = set()
+        # runtime helpers the current top level item uses, and the parts of
+        # their definitions written out already (prelude)
+        self.helpers = set()
+        self.written = set()
 
     def emit(self, line=""):
         self.lines.append("    " * self.indent + line)
 
     def generate(self, node: Node) -> str:
+        if not isinstance(node, Program):
+            self.resolution.add(node)
         self.gen(node)
+        if self.helpers:
+            # not a Program, gen_Program has put them in
+            self.lines[:0] = prelude(self.helpers, self.written)
+            self.helpers.clear()
         return "\n".join(self.lines)
 
+    def generate_item(self, decl):
+        # (helpers it uses, its lines) for one top level item, no definitions of
+        # the helpers. with_prelude() puts items back together. its bindings are
+        # let go of after, what it declares stays for the items after it
+        self.resolution.add(decl)
+        self.gen(decl)
+        self.resolution.release(decl)
+        item = (frozenset(self.helpers), self.lines)
+        self.helpers = set()
+        self.lines = []
+        return item
+
+    def generate_to(self, decls, out):
+        # streaming version of generate for a Program's declarations (any iterable),
+        # each one is written out as soon as it's done. writes the same text as
+        # print(generate(Program(decls)))
+        wrote = False
+        for decl in decls:
+            self.resolution.add(decl)
+            self.gen(decl)
+            self.resolution.release(decl)
+            for line in prelude(self.helpers, self.written):
+                out.write(line + "\n")
+            self.helpers.clear()
+            for line in self.lines:
+                out.write(line + "\n")
+            self.lines.clear()
+            wrote = True
+        if not wrote:
+            out.write("\n")
+
     # dispatch
     def gen(self, node):
-        method = "gen_" + node.__class__.__name__
-        if hasattr(self, method):
-            return getattr(self, method)(node)
-        else:
-            raise NotImplementedError(f"No codegen for {type(node).__name__}")
+        return self.visit(node)
+
+    def gen_Node(self, node):
+        raise NotImplementedError(f"No codegen for {type(node).__name__}")
 
     # top level stuffs
     def gen_Program(self, node: Program):
         for decl in node.declarations:
-            self.gen(decl)
+            start = len(self.lines)
+            self.resolution.add(decl)
+            yield decl
+            self.lines[start:start] = prelude(self.helpers, self.written)
+            self.helpers.clear()
 
     def gen_Function(self, node: Function):
         params = ", ".join(name for _, name in node.params)
+        resolution = self.resolution
+        self.int_names = bound_names(node, resolution) if self.range_loops or loops.INT_DIVISION else set()
+        self.bound = typed.bound_globals(node, resolution) if self.bind_globals else {}
+        self.divisions = 0
+        self.int_result = loops.INT_DIVISION and node.ret_type in INT_TYPES
+        self.numpy_arrays = vectorize.vector_arrays(node, self.int_names) if self.vector_loops else {}
+        pure = pure_calls(node, resolution) if self.memo_size > 0 else None
+        if pure is not None:
+            calls, costly = pure
+            self.helpers.add('_memo' if costly else '_pure')
+            if costly:
+                self.emit(f"@_memo({', '.join([str(self.memo_size)] + [repr(name) for name in calls])})")
+            else:
+                self.emit("@_pure")
         self.emit(f"def {node.name}({params}):")
         self.indent += 1
-        self.gen(node.body)
+        for name, local in self.bound.items():
+            self.emit(f"{local} = {name}")
+        yield node.body
         self.indent -= 1
         self.emit()
+        # top level declarations after it are outside any function
+        self.int_names = set()
+        self.bound = {}
+        self.int_result = False
+        self.numpy_arrays = {}
 
     def gen_Compound(self, node: Compound):
         if not node.stmts:
             self.emit("pass")
         for stmt in node.stmts:
-            self.gen(stmt)
+            yield stmt
 
     # statements
     def gen_Declaration(self, node: Declaration):
-        if node.initializer:
+        top = self.indent == 0
+        if top:
+            self.divisions = 0
+            self.int_names = top_names(node, self.resolution)
+        array = typed.array_type(node.var_type)
+        if array is not None:
+            element, length = array
+            code = typed.typecode(element)
+            if node.name in self.numpy_arrays:
+                self.helpers.add('_zeros')
+                self.emit(f"{node.name} = _zeros({code!r}, {length})")
+            elif code is None or not self.typed_arrays:
+                self.emit(f"{node.name} = [{typed.array_zero(element)!r}] * {length}")
+            else:
+                self.helpers.add('_array')
+                self.emit(f"{node.name} = _array({code!r}, [{typed.array_zero(element)!r}]) * {length}")
+        elif node.initializer:
             expr = self.gen_expr(node.initializer)
+            if node.name in self.int_names and typed.coerce(node.initializer, self.int_names):
+                expr = f"int({expr})"
             self.emit(f"{node.name} = {expr}")
         else:
-            self.emit(f"{node.name} = None")
+            self.emit(f"{node.name} = {typed.initial(node.var_type) if top else None!r}")
+        if top:
+            self.int_names = set()
 
     def gen_Return(self, node: Return):
         if node.expr:
-            self.emit(f"return {self.gen_expr(node.expr)}")
+            expr = self.gen_expr(node.expr)
+            if self.int_result and typed.coerce(node.expr, self.int_names):
+                expr = f"int({expr})"
+            self.emit(f"return {expr}")
         else:
             self.emit("return")
 
     def gen_ExprStmt(self, node: ExprStmt):
         if node.expr:
-            self.emit(self.gen_expr(node.expr))
+            self.emit(self.gen_stmt_expr(node.expr))
+
+    def gen_stmt_expr(self, expr: Node) -> str:
+        # an expression used as a statement: x++ / --x as x += 1 / x -= 1 (the
+        # walrus forms expr_Unary writes are only needed for the value)
+        if isinstance(expr, Unary) and expr.op in ('++', '--'):
+            operand = expr.operand
+            if isinstance(operand, (Var, ArrayAccess)):
+                return f"{self.gen_target(operand)} {expr.op[0]}= 1"
+        return self.gen_expr(expr)
+
+    def gen_target(self, node: Node) -> str:
+        # something being assigned to, an element of a numpy array without expr_ArrayAccess' int(...)
+        if isinstance(node, ArrayAccess):
+            return f"{self.gen_expr(node.array)}[{self.gen_expr(node.index)}]"
+        return self.gen_expr(node)
 
     def gen_If(self, node: If):
         self.emit(f"if {self.gen_expr(node.cond)}:")
         self.indent += 1
-        self.gen(node.then_branch)
+        yield node.then_branch
         self.indent -= 1
         if node.else_branch:
             self.emit("else:")
             self.indent += 1
-            self.gen(node.else_branch)
+            yield node.else_branch
             self.indent -= 1
 
     def gen_While(self, node: While):
         self.emit(f"while {self.gen_expr(node.cond)}:")
         self.indent += 1
-        self.gen(node.body)
+        yield node.body
         self.indent -= 1
 
     def gen_For(self, node: For):
+        vector = vectorize.vector_loop(node, self.int_names) if self.vector_loops else None
+        if vector is None:
+            yield from self.scalar_for(node)
+            return
+        guard, stmts = vector
+        self.helpers.add('_vectors')
+        yield guard
+        self.emit(f"if {vectorize.VECTOR}:")
+        self.indent += 1
+        for stmt in stmts:
+            yield stmt
+        self.indent -= 1
+        self.emit("else:")
+        self.indent += 1
+        yield from self.scalar_for(node)
+        self.indent -= 1
+
+    def scalar_for(self, node: For):
+        loop = range_loop(node, self.int_names) if self.range_loops else None
+        if loop is not None:
+            name, start, stop, adjust, step = loop
+            self.emit(f"for {name} in {self.gen_range(start, stop, adjust, step)}:")
+            self.indent += 1
+            if typed.counts_up(start, step):
+                self.nonnegative.add(name)
+            yield node.body
+            self.nonnegative.discard(name)
+            self.indent -= 1
+            return
+
         # c style for while loop
-        if node.init:
-            self.gen(node.init)
+        if isinstance(node.init, Declaration):
+            yield node.init
+        elif node.init:
+            self.emit(self.gen_stmt_expr(node.init))
 
         cond = self.gen_expr(node.cond) if node.cond else "True"
         self.emit(f"while {cond}:")
         self.indent += 1
-        self.gen(node.body)
+        yield node.body
         if node.post:
-            self.emit(self.gen_expr(node.post))
+            self.emit(self.gen_stmt_expr(node.post))
         self.indent -= 1
 
+    def gen_range(self, start: Node, stop: Node, adjust: int, step: int) -> str:
+        if isinstance(stop, Literal):
+            stop = repr(stop.value + adjust)
+        else:
+            stop = self.gen_expr(stop) + {0: "", 1: " + 1", -1: " - 1"}[adjust]
+        if step != 1:
+            return f"range({self.gen_expr(start)}, {stop}, {step})"
+        if isinstance(start, Literal) and start.value == 0:
+            return f"range({stop})"
+        return f"range({self.gen_expr(start)}, {stop})"
+
     # expressions yayyy
     def gen_expr(self, node: Node) -> str:
-        if isinstance(node, Literal):
-            return repr(node.value)
+        return self.visit(node, "expr_")
+
+    def expr_Node(self, node):
+        raise NotImplementedError(f"No expr codegen for {type(node).__name__}")
 
-        if isinstance(node, Var):
-            return node.name
+    def expr_Literal(self, node: Literal):
+        return repr(node.value)
 
-        if isinstance(node, Binary):
-            return f"({self.gen_expr(node.left)} {node.op} {self.gen_expr(node.right)})"
+    def expr_Var(self, node: Var):
+        return self.bound.get(node.name, node.name)
 
-        if isinstance(node, Unary):
-            if node.prefix:
-                return f"({node.op}{self.gen_expr(node.operand)})"
-            else:
-                return f"({self.gen_expr(node.operand)}{node.op})"
+    def expr_Binary(self, node: Binary):
+        left = yield node.left
+        right = yield node.right
+        if node.op == '/' and typed.c_division(node, self.int_names):
+            return self.c_division(node, left, right)
+        return f"({left} {node.op} {right})"
 
-        if isinstance(node, Assignment):
-            return f"{self.gen_expr(node.target)} = {self.gen_expr(node.value)}"
+    def c_division(self, node: Binary, left: str, right: str) -> str:
+        # left / right truncating toward zero, like c (typed.py)
+        temp_left, temp_right = typed.division_temps(node)
+        first, second = left, right  # what the condition evaluates
+        if temp_left:
+            left = typed.DIVISION_TEMP.format(self.divisions)
+            first = f"({left} := {first})"
+            self.divisions += 1
+        if temp_right:
+            right = typed.DIVISION_TEMP.format(self.divisions)
+            second = f"({right} := {second})"
+            self.divisions += 1
+        if typed.divisor(node.right):
+            if typed.nonnegative(node.left, self.nonnegative):
+                return f"({left} // {right})"
+            return f"({left} // {right} if {first} >= 0 else -(-{left} // {right}))"
+        q = typed.DIVISION_TEMP.format(self.divisions)
+        self.divisions += 1
+        return f"({q} if ({q} := {first} // {second}) >= 0 or {q} * {right} == {left} else {q} + 1)"
 
-        if isinstance(node, Call):
-            args = ", ".join(self.gen_expr(a) for a in node.args)
-            return f"{self.gen_expr(node.callee)}({args})"
+    def expr_Unary(self, node: Unary):
+        if node.op in ('++', '--'):
+            return self.expr_step(node)
+        operand = yield node.operand
+        if node.prefix:
+            return f"({node.op}{operand})"
+        else:
+            return f"({operand}{node.op})"
 
-        if isinstance(node, ArrayAccess):
-            return f"{self.gen_expr(node.array)}[{self.gen_expr(node.index)}]"
+    def expr_step(self, node: Unary) -> str:
+        # ++x is (x := x + 1), x++ is ((x := x + 1) - 1), same as the ast backend.
+        # a[i]++ goes through runtime._step_item
+        operand = node.operand
+        sign = node.op[0]
+        if isinstance(operand, ArrayAccess):
+            array, index = self.gen_expr(operand.array), self.gen_expr(operand.index)
+            self.helpers.add('_step_item')
+            return self.element(operand, f"_step_item({array}, {index}, {1 if sign == '+' else -1}, {node.prefix})")
+        if not isinstance(operand, Var):
+            raise SyntaxError(f"Can't apply {node.op} to {type(operand).__name__} at pos {node.pos}")
+        bumped = f"({operand.name} := {operand.name} {sign} 1)"
+        if node.prefix:
+            return bumped
+        return f"({bumped} {'-' if sign == '+' else '+'} 1)"
 
-        raise NotImplementedError(f"No expr codegen for {type(node).__name__}")
+    def expr_Assignment(self, node: Assignment):
+        target = self.gen_target(node.target)
+        value = yield node.value
+        if typed.target_name(node.target) in self.int_names and typed.coerce(node.value, self.int_names):
+            value = f"int({value})"
+        return f"{target} = {value}"
+
+    def expr_Call(self, node: Call):
+        callee = yield node.callee
+        args = []
+        for a in node.args:
+            args.append((yield a))
+        return f"{callee}({', '.join(args)})"
+
+    def expr_ArrayAccess(self, node: ArrayAccess):
+        array = yield node.array
+        index = yield node.index
+        return self.element(node, f"{array}[{index}]")
+
+    def element(self, node: ArrayAccess, value: str) -> str:
+        # value, an element of node's array, as a python number if that's a numpy array
+        convert = self.numpy_arrays.get(node.array.name) if isinstance(node.array, Var) else None
+        return value if convert is None else f"{convert}({value})"
@@ -0,0 +1,87 @@
+import gc
+import marshal
+from contextlib import contextmanager
+from lexer import get_tokens
+from ast_arena import NodeArena
+import parser as parse
+from codegen import PythonCodeGen
+from pybackend import PythonAstGen
+import loops
+
+# the plain source -> python text pipeline, shared by main, batch mode and the cache
+
+# the codegen switches main() sets from the command line, kept the same on both
+# backends. worker processes (batch.py, split.py) get them through their pool's
+# initializer: under spawn / forkserver they'd start from the defaults
+CODEGEN_SETTINGS = ('memo_size', 'vector_loops', 'typed_arrays', 'bind_globals')
+
+def settings() -> dict:
+    found = {name: getattr(PythonCodeGen, name) for name in CODEGEN_SETTINGS}
+    found['int_division'] = loops.INT_DIVISION
+    return found
+
+def apply_settings(found: dict):
+    # any of settings()'s keys, the rest are left as they are
+    for name, value in found.items():
+        if name == 'int_division':
+            loops.INT_DIVISION = value
+        else:
+            setattr(PythonCodeGen, name, value)
+            setattr(PythonAstGen, name, value)
+
+@contextmanager
+def paused_gc():
+    # for the entry points around parse / lower / compile: the trees are big and
+    # have no cycles, and full collections rescanning every node made so far turn
+    # those phases superlinear (bench/run_suite.py). the library code leaves the
+    # process' gc alone
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def decode_source(source: bytes) -> str:
+    # same text open(path, "r") gives, newlines included
+    text = source.decode()
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def compile_source(content: str) -> str:
+    tokens = get_tokens(content)
+    tokens.append(('EOF', 'EOF', len(content)))
+    with paused_gc():
+        return PythonCodeGen().generate(parse.Parser(tokens).parse_program())
+
+def compile_cached(source: bytes, cache) -> str:
+    # generated code for source, only redoing the phases the cache doesn't have
+    key = cache.key(source)
+    entry = cache.load(key)
+    data = cache.get(entry, "py")
+    if data is not None:
+        return data.decode()
+    with paused_gc():
+        python_code = PythonCodeGen().generate(cached_ast(source, entry, cache))
+    entry["py"] = python_code.encode()
+    cache.store(key, entry)
+    return python_code
+
+def cached_ast(source: bytes, entry: dict, cache):
+    # fills in entry's "tokens" / "ast" if they're missing, storing it is up to the caller
+    data = cache.get(entry, "ast")
+    if data is not None:
+        return NodeArena.from_bytes(data).root()
+    data = cache.get(entry, "tokens")
+    if data is not None:
+        tokens = marshal.loads(data)
+    else:
+        content = decode_source(source)
+        tokens = get_tokens(content)
+        tokens.append(('EOF', 'EOF', len(content)))
+        entry["tokens"] = marshal.dumps(tokens)
+    ast = parse.Parser(tokens).parse_program()
+    entry["ast"] = NodeArena.from_node(ast).to_bytes()
+    return ast
@@ -0,0 +1,454 @@
+import copy
+from parser import *
+from visitor import child_fields
+from loops import bound_names, int_expr, range_loop
+
+# the last part of -O (Optimizer.optimize runs it after folding), per function:
+#
+# loop invariant code motion: an expression a loop works out every time round
+# with the same value goes into a temporary before the loop.
+#   - invariant: no calls / assignments / ++ in it, nothing it reads is written
+#     in the loop. if the loop calls anything, globals and array elements count as
+#     written (the callee could change them), and any array write counts for every
+#     array (two names can be the same list)
+#   - taken from the condition (the parts that always run, not behind && / || / ?:),
+#     which is evaluated before anything else in every iteration, so the
+#     temporary is worked out where the first evaluation was
+#   - taken from the body's leading run of plain statements (no calls, no control
+#     flow, nothing that can leave the loop), the loop then goes inside
+#     `if (cond) { temps; loop }` so the temporary is only worked out when the
+#     body would have run. needs a condition without side effects
+# a range() loop (loops.py) already evaluates its bound once, its condition is
+# left alone.
+#
+# common subexpressions: in a run of plain statements, an expression that comes up
+# again before anything it reads is written goes into a temporary before its
+# first use. the first use has to be in the part of its statement that's
+# evaluated before the statement changes anything, so working it out early is
+# the same as working it out there.
+#
+# common subexpressions go first (loop bodies are done before their loop), so a
+# temporary of a loop body can be invariant itself. hoisting it would leave a
+# copy of the new temporary behind in the loop, `__t0 = __t1;`, so the copy is
+# dropped and __t0's uses read __t1 instead.
+#
+# only expressions of 3+ nodes (a + b, a[i]) are worth a temporary. a hoisted a[i]
+# that's out of range raises before the body's first statements instead of in
+# them, otherwise the program does what it did.
+
+TEMP = "__t{}"
+MIN_NODES = 3
+# read / write masks: a bit per variable, plus these
+ARRAY = 1   # reads / writes an array element
+CALL = 2    # calls something (which could write any global)
+
+def children(n):
+    # (child, parent, field, index) for n's children, in evaluation order
+    found = []
+    for name, is_list in child_fields(type(n)):
+        value = getattr(n, name)
+        if is_list:
+            found.extend((child, n, name, i) for i, child in enumerate(value))
+        elif value is not None:
+            found.append((value, n, name, None))
+    return found
+
+def everywhere(node):
+    # (node, parent, field, index) for every node under node, no recursion
+    stack = [(node, None, None, None)]
+    while stack:
+        item = stack.pop()
+        yield item
+        stack.extend(reversed(children(item[0])))
+
+def unconditional(node):
+    # the same for node and the subexpressions always evaluated with it: not
+    # behind && / ||, not a ?: branch
+    stack = [(node, None, None, None)]
+    while stack:
+        item = stack.pop()
+        yield item
+        n = item[0]
+        if type(n) is Binary and n.op in ('&&', '||', '?:'):
+            stack.append((n.left, n, 'left', None))
+        else:
+            stack.extend(reversed(children(n)))
+
+def replace(parent, name, index, new):
+    if index is None:
+        setattr(parent, name, new)
+    else:
+        getattr(parent, name)[index] = new
+
+def candidate(node) -> bool:
+    # the kind of expression that gets a temporary
+    kind = type(node)
+    return kind is ArrayAccess or kind is Binary and node.op not in ('?:', 'branch')
+
+def statement_expr(stmt):
+    # the expression a plain statement (or a return) evaluates, or None
+    kind = type(stmt)
+    if kind is ExprStmt or kind is Return:
+        return stmt.expr
+    if kind is Declaration:
+        return stmt.initializer
+    return None
+
+class Hoister:
+    def __init__(self):
+        self.hoisted = 0
+        self.reused = 0
+
+    def run(self, node: Node, resolution) -> Node:
+        # node is a Program or one top level item, changed in place. resolution is
+        # its structure.Resolution (node added)
+        if type(node) is Program:
+            for decl in node.declarations:
+                self.run(decl, resolution)
+        elif type(node) is Function:
+            self.function(node, resolution)
+        return node
+
+    def function(self, fn: Function, resolution):
+        self.function_node = fn
+        self.resolution = resolution
+        self.local_names = {name for _, name in fn.params}
+        self.declared = set()
+        self.bits = {}
+        # value numbers: equal expressions get the same number
+        self.numbers = {}
+        # worked out once, again for a loop when something in it was rewritten
+        self.facts = self.find_facts(fn.body)
+        # a temporary can't be called anything the function mentions
+        self.taken = self.local_names | set(self.bits)
+        self.local_names |= self.declared
+        self.global_bits = 0
+        for name, bit in self.bits.items():
+            if name not in self.local_names:
+                self.global_bits |= bit
+        self.next_temp = 0
+        # the temporaries made so far, each one is only ever set by its declaration
+        self.temps = set()
+        self.int_names = None
+        fn.body = self.stmt(fn.body)
+
+    def ints(self):
+        # loops.bound_names for the function, once there's a loop that wants it
+        if self.int_names is None:
+            self.int_names = bound_names(self.function_node, self.resolution)
+        return self.int_names
+
+    def bit(self, name: str) -> int:
+        found = self.bits.get(name)
+        if found is None:
+            found = self.bits[name] = 4 << len(self.bits)
+        return found
+
+    def stale(self, reads: int, writes: int) -> bool:
+        # could something reading `reads` change value when something writing
+        # `writes` runs (a call can write any global)
+        return bool(reads & writes or writes & CALL and reads & self.global_bits)
+
+    def find_facts(self, root):
+        # id(node) -> (value number, size, has side effects, read mask, write mask)
+        # for every node under root, children before parents. the write mask is
+        # what running the node can change, in read mask terms
+        facts = {}
+        numbers = self.numbers
+        bits = self.bits
+        order = []
+        stack = [root]
+        while stack:
+            n = stack.pop()
+            order.append(n)
+            for name, is_list in child_fields(type(n)):
+                value = getattr(n, name)
+                if is_list:
+                    stack.extend(value)
+                elif value is not None:
+                    stack.append(value)
+        for n in reversed(order):
+            kind = type(n)
+            if kind is Var or kind is Literal:
+                if kind is Var:
+                    key = (n.name,)
+                    reads = bits.get(n.name) or self.bit(n.name)
+                else:
+                    key = (type(n.value), n.value)
+                    reads = 0
+                number = numbers.get(key)
+                if number is None:
+                    number = numbers[key] = len(numbers)
+                facts[id(n)] = (number, 1, False, reads, 0)
+                continue
+            size = 1
+            impure = False
+            reads = writes = 0
+            if kind is Binary:
+                key = [kind, n.op]
+            elif kind is Unary:
+                if n.op in ('++', '--'):
+                    impure = True
+                    writes = self.bit(n.operand.name) if type(n.operand) is Var else ARRAY
+                key = [kind, n.op, n.prefix]
+            else:
+                if kind is ArrayAccess:
+                    reads = ARRAY
+                elif kind is Assignment:
+                    impure = True
+                    writes = self.bit(n.target.name) if type(n.target) is Var else ARRAY
+                elif kind is Call:
+                    impure = True
+                    writes = ARRAY | CALL
+                elif kind is Declaration:
+                    writes = self.bit(n.name)
+                    self.declared.add(n.name)
+                key = [kind]
+            for name, is_list in child_fields(kind):
+                value = getattr(n, name)
+                for child in (value if is_list else (value,)):
+                    if child is None:
+                        key.append(None)
+                        continue
+                    number, child_size, child_impure, child_reads, child_writes = facts[id(child)]
+                    key.append(number)
+                    size += child_size
+                    impure = impure or child_impure
+                    reads |= child_reads
+                    writes |= child_writes
+                if is_list:
+                    key.append(len(value))
+            if impure:
+                # never gets a temporary, nor does anything around it
+                number = -1
+            else:
+                key = tuple(key)
+                number = numbers.get(key)
+                if number is None:
+                    number = numbers[key] = len(numbers)
+            facts[id(n)] = (number, size, impure, reads, writes)
+        return facts
+
+    @staticmethod
+    def plain(stmt, facts) -> bool:
+        # a statement that can't call, jump or loop
+        kind = type(stmt)
+        return (kind is ExprStmt or kind is Declaration) and not facts[id(stmt)][4] & CALL
+
+    def temp(self, expr: Node) -> Declaration:
+        while TEMP.format(self.next_temp) in self.taken:
+            self.next_temp += 1
+        name = TEMP.format(self.next_temp)
+        self.next_temp += 1
+        self.taken.add(name)
+        self.temps.add(name)
+        self.local_names.add(name)
+        # typed int when it is one, so a hoisted bound can still make a range() loop
+        is_int = int_expr(expr, self.ints())
+        if is_int:
+            self.int_names.add(name)
+        return Declaration('int' if is_int else 'auto', name, expr, pos=expr.pos)
+
+    def stmt(self, node):
+        kind = type(node)
+        if kind is Compound:
+            node.stmts = [self.stmt(s) for s in node.stmts]
+            self.common(node.stmts)
+        elif kind is If:
+            node.then_branch = self.stmt(node.then_branch)
+            if node.else_branch is not None:
+                node.else_branch = self.stmt(node.else_branch)
+        elif kind is While or kind is For:
+            before = self.hoisted + self.reused
+            node.body = self.stmt(node.body)
+            return self.loop(node, self.hoisted + self.reused != before)
+        return node
+
+    # loop invariant code motion
+    def loop(self, node, rewritten: bool):
+        is_for = type(node) is For
+        init = node.init if is_for else None
+        facts = self.find_facts(node) if rewritten else self.facts
+        # everything the loop (init included) writes
+        changed = facts[id(node)][4]
+
+        def invariant(n):
+            _, size, impure, reads, _ = facts[id(n)]
+            return size >= MIN_NODES and not impure and not self.stale(reads, changed) and candidate(n)
+
+        found = {}  # value number -> first node
+        if node.cond is not None:
+            self.collect(node.cond, invariant, facts, found)
+            if found and is_for and range_loop(node, self.ints()):
+                found.clear()
+        in_cond = len(found)
+        if node.cond is None or self.guardable(node, facts):
+            for stmt in (node.body.stmts if type(node.body) is Compound else [node.body]):
+                if not self.plain(stmt, facts):
+                    break
+                expr = statement_expr(stmt)
+                while type(expr) is Assignment:
+                    # a[i] = ... doesn't read a[i], only a and i
+                    if type(expr.target) is ArrayAccess:
+                        self.collect(expr.target.array, invariant, facts, found)
+                        self.collect(expr.target.index, invariant, facts, found)
+                    expr = expr.value
+                if expr is not None:
+                    self.collect(expr, invariant, facts, found)
+        if not found:
+            return node
+
+        guard = None if len(found) == in_cond or node.cond is None else self.guard(node)
+        temps = {number: self.temp(expr) for number, expr in found.items()}
+        for part in ('cond', 'post', 'body'):
+            if getattr(node, part, None) is not None:
+                self.substitute(node, part, temps, facts)
+        self.drop_copies(node, {decl.name for decl in temps.values()})
+        self.hoisted += len(temps)
+        decls = list(temps.values())
+        if guard is None:
+            # only condition parts (evaluated at least once anyway), or a loop that always runs
+            return Compound(decls + [node], pos=node.pos)
+        guarded = If(guard, Compound(decls + [node], pos=node.pos), None, pos=node.pos)
+        if init is not None and type(init) is not Declaration:
+            # the init runs before the guard
+            node.init = None
+            return Compound([ExprStmt(init, pos=node.pos), guarded], pos=node.pos)
+        return guarded
+
+    @staticmethod
+    def guardable(node, facts) -> bool:
+        # guard() can say whether the body runs: condition and loop variable start
+        # without side effects
+        if facts[id(node.cond)][2]:
+            return False
+        if type(node) is For and type(node.init) is Declaration:
+            start = node.init.initializer
+            return start is not None and not facts[id(start)][2]
+        return True
+
+    @staticmethod
+    def guard(node):
+        # an expression, evaluated before the loop, that's true iff the body runs at
+        # least once: the condition, with a declared loop variable's start put in
+        guard = copy.deepcopy(node.cond)
+        if type(node) is For and type(node.init) is Declaration:
+            start, name = node.init.initializer, node.init.name
+            if type(guard) is Var and guard.name == name:
+                return copy.deepcopy(start)
+            for n, parent, field_name, index in list(everywhere(guard)):
+                if type(n) is Var and n.name == name:
+                    replace(parent, field_name, index, copy.deepcopy(start))
+        return guard
+
+    def drop_copies(self, node, hoisted):
+        # `__t0 = __t1;` left in node's body, __t0 a temporary of the body and __t1
+        # one of hoisted: the declaration goes, __t0's uses read __t1
+        body = node.body
+        if type(body) is not Compound:
+            return
+        renames = {}
+        kept = []
+        for stmt in body.stmts:
+            if type(stmt) is Declaration and stmt.name in self.temps \
+                    and type(stmt.initializer) is Var and stmt.initializer.name in hoisted:
+                renames[stmt.name] = stmt.initializer.name
+            else:
+                kept.append(stmt)
+        if not renames:
+            return
+        body.stmts = kept
+        for n, _, _, _ in everywhere(body):
+            if type(n) is Var and n.name in renames:
+                n.name = renames[n.name]
+
+    def collect(self, expr, invariant, facts, found):
+        # the biggest invariant subexpressions in expr's always evaluated part
+        skip = set()
+        for n, parent, _, _ in unconditional(expr):
+            if id(parent) in skip:
+                skip.add(id(n))
+            elif invariant(n):
+                found.setdefault(facts[id(n)][0], n)
+                skip.add(id(n))
+
+    def substitute(self, holder, field_name, temps, facts):
+        # every occurrence of a temps expression under holder.field_name -> the temp
+        skip = set()
+        for n, parent, name, index in everywhere(getattr(holder, field_name)):
+            if id(parent) in skip:
+                skip.add(id(n))
+                continue
+            decl = temps.get(facts[id(n)][0]) if candidate(n) else None
+            if decl is not None:
+                var = Var(decl.name, pos=n.pos)
+                if parent is None:
+                    setattr(holder, field_name, var)
+                else:
+                    replace(parent, name, index, var)
+                skip.add(id(n))
+
+    # common subexpressions in runs of plain statements
+    def common(self, stmts):
+        facts = self.facts
+        # value number -> [first statement index, size, first node,
+        #                  occurrences (parent, field, index), read mask]
+        live = {}
+        seen = []
+        for i, stmt in enumerate(stmts):
+            kind = type(stmt)
+            if kind is not ExprStmt and kind is not Declaration and kind is not Return:
+                live.clear()
+                continue
+            # what the statement itself writes / calls: past that point only the
+            # part evaluated first still sees what the earlier statements did
+            changed = facts[id(stmt)][4]
+            if changed & CALL and kind is not Return:
+                live.clear()
+                continue
+            first_ok = self.quiet_part(stmt, facts)
+            stack = [(stmt, None, None, None)]
+            while stack:
+                n, parent, name, index = stack.pop()
+                number, size, impure, reads, _ = facts[id(n)]
+                if size < MIN_NODES:
+                    continue
+                if not impure and candidate(n):
+                    entry = live.get(number)
+                    if entry is not None:
+                        if id(n) in first_ok or not self.stale(entry[4], changed):
+                            entry[3].append((parent, name, index))
+                            continue
+                    elif id(n) in first_ok:
+                        entry = live[number] = [i, size, n, [(parent, name, index)], reads]
+                        seen.append(entry)
+                stack.extend(reversed(children(n)))
+            # what the statement wrote is stale from here on
+            for number in [k for k, e in live.items() if self.stale(e[4], changed)]:
+                del live[number]
+        repeated = [e for e in seen if len(e[3]) > 1]
+        if not repeated:
+            return
+        # inner (smaller) expressions first when one contains another
+        repeated.sort(key=lambda e: (e[0], e[1]))
+        inserts = {}
+        for first_stmt, _, node, occurrences, _ in repeated:
+            decl = self.temp(node)
+            for parent, name, index in occurrences:
+                replace(parent, name, index, Var(decl.name, pos=node.pos))
+            inserts.setdefault(first_stmt, []).append(decl)
+            self.reused += len(occurrences) - 1
+        for i in sorted(inserts, reverse=True):
+            stmts[i:i] = inserts[i]
+
+    def quiet_part(self, stmt, facts):
+        # ids of the nodes stmt always evaluates before it changes anything: the
+        # value of its assignment chain, if nothing before that has side effects
+        expr = statement_expr(stmt)
+        while type(expr) is Assignment:
+            if facts[id(expr.target)][2]:
+                return set()
+            expr = expr.value
+        if expr is None or facts[id(expr)][2]:
+            return set()
+        return {id(n) for n, _, _, _ in unconditional(expr)}
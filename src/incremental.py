@@ -0,0 +1,462 @@
+from bisect import bisect_left, bisect_right
+from lexer import get_tokens, iter_tokens
+import parser as parse
+from codegen import PythonCodeGen, with_prelude
+from structure import Resolution, header
+from driver import compile_source
+from split import PRESCAN
+from visitor import iter_children
+
+# recompiling only what changed. the source is kept as pieces, one per top level
+# item (function, declaration, prototype), cut the same way split.py cuts: right
+# after a ; or } at brace depth 0. each piece is lexed, parsed and generated on
+# its own, positions in its tokens / ast are from the start of the piece, and
+# the file's output is all the pieces' lines in order, runtime helper
+# definitions going in before the first piece to use one (same text as compiling
+# the whole file, that's split.py's argument). what a piece generates also goes
+# by the top level names declared above it (structure.py), so a piece is
+# generated again when those changed: each piece keeps a hash of the item
+# headers above it from when it was generated.
+#
+# on a new version of the file the changed range is whatever's left after the
+# common prefix and suffix. pieces touching it are recompiled from the new text,
+# the others keep their tokens, ast and lines. anything that doesn't fit (braces
+# not balancing, a comment or string left open, a piece that doesn't parse) goes
+# through the whole file, which also gives the same errors as without this
+
+def _lex(text: str):
+    tokens = get_tokens(text)
+    tokens.append(('EOF', 'EOF', len(text)))
+    return tokens
+
+class Piece:
+    __slots__ = ('text', 'tokens', 'decls', '_items', '_context', 'error')
+
+    def __init__(self, text: str, tokens=None, decls=None):
+        # lexes / parses whatever isn't passed in, SyntaxError if it doesn't parse
+        self.text = text
+        self.tokens = _lex(text) if tokens is None else tokens
+        self.decls = list(parse.Parser(self.tokens).iter_program()) if decls is None else decls
+        self._items = None
+        self._context = None
+        # Document keeps pieces that don't parse, with decls [] and the error here
+        self.error = None
+
+    def items(self, resolution: Resolution, context: int):
+        # generated code, [(helpers, lines), ...] per decl (codegen.with_prelude),
+        # made when first asked for or when context (the hash of the headers
+        # above, in resolution) isn't what it was made with. adds the decls'
+        # headers to resolution either way
+        if self._items is None or self._context != context:
+            cg = PythonCodeGen(resolution)
+            self._items = [cg.generate_item(decl) for decl in self.decls]
+            self._context = context
+        else:
+            for decl in self.decls:
+                found = header(decl)
+                if found is not None:
+                    resolution.declare(*found)
+        return self._items
+
+def _output(pieces) -> str:
+    # the pieces' generated code, each piece seeing what the ones above declare
+    resolution = Resolution()
+    context = 0
+    items = []
+    for piece in pieces:
+        items.extend(piece.items(resolution, context))
+        context = hash((context, tuple(header(decl) for decl in piece.decls)))
+    return "\n".join(with_prelude(items))
+
+def item_bounds(text: str, at_eof: bool = True):
+    # [0, cut, ..., len(text)] with a cut after every top level item, None if
+    # text can't be compiled piece by piece. no comment or string can be left
+    # open before the last cut, it would run on into whatever comes after it
+    # once it's closed somewhere later. with at_eof=False text is a window out of
+    # a bigger file, it also has to end right after an item
+    bounds = [0]
+    depth = 0
+    last = 0
+    open_at = None
+    for m in PRESCAN.finditer(text):
+        if open_at is None:
+            gap = text[last:m.start()]
+            if '"' in gap or '/*' in gap:
+                open_at = last
+        last = m.end()
+        ch = m.group(1)
+        if ch is None:
+            continue
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth < 0:
+                return None
+        if depth == 0:
+            bounds.append(m.end())
+    if open_at is None:
+        gap = text[last:]
+        if '"' in gap or '/*' in gap:
+            open_at = last
+    if depth != 0:
+        return None
+    if bounds[-1] < len(text):
+        if not at_eof:
+            return None
+        bounds.append(len(text))
+    if open_at is not None and (not at_eof or open_at < bounds[-2]):
+        return None
+    return bounds
+
+def _common_affixes(old: str, new: str):
+    # (prefix length, suffix length), not overlapping in either string
+    limit = min(len(old), len(new))
+    prefix = 0
+    # compare in blocks first, most of a file is the same
+    step = 4096
+    while step:
+        while prefix + step <= limit and old[prefix:prefix + step] == new[prefix:prefix + step]:
+            prefix += step
+        step //= 8
+    limit -= prefix
+    suffix = 0
+    step = 4096
+    while step:
+        while suffix + step <= limit and old[len(old) - suffix - step:len(old) - suffix] == \
+                new[len(new) - suffix - step:len(new) - suffix]:
+            suffix += step
+        step //= 8
+    return prefix, suffix
+
+class IncrementalCompiler:
+    def __init__(self):
+        self.source = None
+        self.pieces = []
+        # what the last update did: pieces recompiled / total, and if it had to
+        # do the whole file
+        self.recompiled = 0
+        self.full = False
+
+    def update(self, source: str) -> str:
+        # generated code for source, raises like compile_source on errors (and
+        # then still holds the last version that compiled)
+        if self.source is None:
+            return self._rebuild(source)
+        if source == self.source:
+            self.recompiled = 0
+            self.full = False
+            return self.output()
+        old = self.source
+        prefix, suffix = _common_affixes(old, source)
+        changed_end = len(old) - suffix
+        # pieces whose span (ends included) meets [prefix, changed_end], an insertion
+        # right at a cut takes both neighbours so the window still ends on an item
+        first = last = None
+        start = 0
+        for i, piece in enumerate(self.pieces):
+            end = start + len(piece.text)
+            if end >= prefix and start <= changed_end:
+                if first is None:
+                    first, window_start = i, start
+                last, window_end = i, end
+            elif start > changed_end:
+                break
+            start = end
+        if first is None:
+            return self._rebuild(source)
+        window_end += len(source) - len(old)
+        window = source[window_start:window_end]
+        bounds = item_bounds(window, at_eof=window_end == len(source))
+        if bounds is None:
+            return self._rebuild(source)
+        try:
+            pieces = [Piece(window[a:b]) for a, b in zip(bounds, bounds[1:])]
+        except SyntaxError:
+            return self._rebuild(source)
+        self.pieces[first:last + 1] = pieces
+        self.source = source
+        self.recompiled = len(pieces)
+        self.full = False
+        return self.output()
+
+    def _rebuild(self, source: str) -> str:
+        bounds = item_bounds(source)
+        try:
+            if bounds is None:
+                raise SyntaxError("unbalanced braces")
+            pieces = [Piece(source[a:b]) for a, b in zip(bounds, bounds[1:])]
+        except SyntaxError:
+            # the whole file the normal way, for the real error. if that works
+            # after all, that's the output and the next update starts over
+            python_code = compile_source(source)
+            self.pieces = []
+            self.source = None
+            self.recompiled = 0
+            self.full = True
+            return python_code
+        self.pieces = pieces
+        self.source = source
+        self.recompiled = len(pieces)
+        self.full = True
+        return self.output()
+
+    def output(self) -> str:
+        return _output(self.pieces)
+
+    def program(self):
+        # the pieces' declarations as one Program (positions are per piece)
+        return parse.Program([decl for piece in self.pieces for decl in piece.decls], pos=0)
+
+    def tokens(self):
+        return [tok for piece in self.pieces for tok in piece.tokens[:-1]]
+
+# editor side (language server style): Document takes edits as ranges, every
+# keystroke. the pieces are the same as above, but inside a piece only the tokens
+# around the edit are lexed again, until the new tokens line up with the old ones
+# (same kind / text at the same place, shifted by the edit), and only the
+# innermost statement holding the changed tokens is parsed again, going out a
+# statement at a time when that doesn't work, up to the whole item. a piece that
+# doesn't parse is kept with its error, the rest of the file is still usable
+
+def _first_open(tokens, upto: int) -> int:
+    # index of the first token before upto that a later edit could make part of
+    # a longer one (a " with no closing quote, a /* with no */), else upto
+    for i in range(upto):
+        kind, value, pos = tokens[i]
+        if kind == 'UNKNOWN' and value == '"':
+            return i
+        if kind == 'DIVIDE' and tokens[i + 1][0] == 'MULTIPLY' and tokens[i + 1][2] == pos + 1:
+            return i
+    return upto
+
+def _shift(node, at: int, delta: int, skip=None):
+    # pos += delta for every node under node starting at or after at, leaving
+    # out the subtree skip (already parsed from the new text)
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is skip:
+            continue
+        if node.pos >= at:
+            node.pos += delta
+        stack.extend(iter_children(node))
+
+def _slots(decl, index, lo: int, hi: int):
+    # statement slots around old token range [lo, hi), innermost last:
+    # [(container, key, first token, end token), ...], container[key] or
+    # getattr(container, key) being the statement. index(pos) -> token index
+    found = []
+    if type(decl) is not parse.Function:
+        return found
+    # the body runs to the end of the item, its } is the piece's last token
+    body = (decl, 'body', index(decl.body.pos), index(None))
+    if not (body[2] <= lo and hi <= body[3]):
+        return found
+    found.append(body)
+    node, e = decl.body, body[3]
+    while True:
+        if type(node) is parse.Compound:
+            # each statement runs up to the next one, the last one up to the }
+            starts = [index(stmt.pos) for stmt in node.stmts] + [e - 1]
+            children = [(node.stmts, k, starts[k], starts[k + 1]) for k in range(len(node.stmts))]
+        elif type(node) is parse.If:
+            then_end = index(node.else_branch.pos) - 1 if node.else_branch is not None else e
+            children = [(node, 'then_branch', index(node.then_branch.pos), then_end)]
+            if node.else_branch is not None:
+                children.append((node, 'else_branch', index(node.else_branch.pos), e))
+        elif type(node) in (parse.While, parse.For):
+            children = [(node, 'body', index(node.body.pos), e)]
+        else:
+            return found
+        for child in children:
+            if child[2] <= lo and hi <= child[3]:
+                break
+        else:
+            return found
+        found.append(child)
+        container, key, _, e = child
+        node = container[key] if type(container) is list else getattr(container, key)
+
+class Document:
+    def __init__(self, text: str = ""):
+        self.text = text
+        self.pieces = []
+        # where each piece starts in text
+        self.starts = []
+        # set when text can't even be cut into pieces (unbalanced braces ...),
+        # there are no pieces then and every edit starts over
+        self.error = None
+        self._reset(text)
+
+    def apply_edit(self, start: int, end: int, new_text: str) -> str:
+        # text[start:end] = new_text, tokens / ast brought up to date. returns
+        # what had to be redone: 'tokens' (only comments / whitespace changed),
+        # 'statement', 'item', 'items' or 'file'
+        text = self.text[:start] + new_text + self.text[end:]
+        delta = len(new_text) - (end - start)
+        self.text = text
+        if self.error is not None or not self.pieces:
+            return self._reset(text)
+        starts = self.starts
+        first = bisect_right(starts, start) - 1
+        last = bisect_right(starts, end) - 1
+        if last > first and starts[last] == end:
+            last -= 1  # ends right where the next piece starts
+        final = last == len(self.pieces) - 1
+        window_start = starts[first]
+        window_end = starts[last] + len(self.pieces[last].text) + delta
+        window = text[window_start:window_end]
+        bounds = item_bounds(window, at_eof=final)
+        if bounds is None:
+            return self._reset(text)
+        if first == last and len(bounds) == 2:
+            piece = self.pieces[first]
+            how = self._edit_piece(piece, start - window_start, end - window_start, new_text, window, final)
+            if how is None:
+                self.pieces[first] = _piece(window)
+                how = 'item'
+        else:
+            self.pieces[first:last + 1] = [_piece(window[a:b]) for a, b in zip(bounds, bounds[1:])]
+            how = 'items'
+        self.starts[first:] = [window_start + b for b in bounds[:-1]] + \
+            [s + delta for s in starts[last + 1:]]
+        return how
+
+    def _reset(self, text: str) -> str:
+        bounds = item_bounds(text)
+        if bounds is None:
+            self.pieces = []
+            self.starts = []
+            self.error = _whole_file_error(text)
+        else:
+            self.pieces = [_piece(text[a:b]) for a, b in zip(bounds, bounds[1:])]
+            self.starts = bounds[:-1]
+            self.error = None
+        return 'file'
+
+    def _edit_piece(self, piece: Piece, start: int, end: int, new_text: str, text: str, final: bool):
+        # the edit inside one piece (offsets within it), text is the piece's new
+        # text. updates piece in place, returns None if it has to be redone whole
+        if piece.error is not None:
+            return None
+        tokens = piece.tokens
+        positions = [tok[2] for tok in tokens]
+        delta = len(text) - len(piece.text)
+        # start lexing from the token before the one the edit is in, the one before
+        # that can't change: what ends it is before the edit
+        lo = max(bisect_left(positions, start) - 1, 0)
+        if final:
+            lo = _first_open(tokens, lo)
+        hi = bisect_left(positions, end)
+        eof = len(tokens) - 1
+        edit_end = start + len(new_text)
+        new = []
+        for tok in iter_tokens(text, positions[lo] if lo else 0):
+            if tok[2] >= edit_end:
+                target = tok[2] - delta
+                while hi < eof and positions[hi] < target:
+                    hi += 1
+                old = tokens[hi]
+                if hi < eof and old[2] == target and old[0] == tok[0] and old[1] == tok[1]:
+                    break  # back in step, the rest is the old tokens moved along
+            new.append(tok)
+        else:
+            hi = eof
+        tail = [(kind, value, pos + delta) for kind, value, pos in tokens[hi:]]
+        new_tokens = tokens[:lo] + new + tail
+        moved = len(new) - (hi - lo)
+
+        # the tokens that really changed: old [first, stop), without the ones at
+        # either end that came out the same
+        first = lo
+        while first < hi and first - lo < len(new) and tokens[first] == new[first - lo]:
+            first += 1
+        stop = hi
+        while stop > first and stop - hi + len(new) > first - lo and \
+                tokens[stop - 1][:2] == new[stop - 1 - hi + len(new)][:2]:
+            stop -= 1
+
+        how = 'tokens'
+        replaced = None
+        if [tok[:2] for tok in tokens[first:stop] if tok[0] not in parse.IGNORED] != \
+                [tok[:2] for tok in new[first - lo:len(new) - (hi - stop)] if tok[0] not in parse.IGNORED]:
+            # smallest statement holding them that still parses, with all of its
+            # tokens used. a statement's end token comes after the change, so in
+            # the new list it's moved along
+            def index(pos):
+                return eof if pos is None else bisect_left(positions, pos)
+            decl = piece.decls[0] if len(piece.decls) == 1 else None
+            for container, key, s, e in reversed(_slots(decl, index, first, stop)):
+                e += moved
+                p = parse.Parser(new_tokens[s:e] + [('EOF', 'EOF', new_tokens[e][2])])
+                try:
+                    stmt = p.parse_statement()
+                except SyntaxError:
+                    continue
+                if p.peek_type() != 'EOF':
+                    continue
+                if type(container) is list:
+                    container[key] = stmt
+                else:
+                    setattr(container, key, stmt)
+                replaced = stmt
+                break
+            if replaced is None:
+                return None
+            how = 'statement'
+        for decl in piece.decls:
+            _shift(decl, end, delta, skip=replaced)
+        piece.text = text
+        piece.tokens = new_tokens
+        piece._items = None
+        return how
+
+    def output(self) -> str:
+        # generated code for the whole text, the first error if something doesn't parse
+        errors = self.errors()
+        if errors:
+            raise errors[0][1]
+        return _output(self.pieces)
+
+    def item_at(self, offset: int):
+        # (piece, where it starts) for the piece holding offset, positions in
+        # its tokens and ast are from that start
+        i = max(bisect_right(self.starts, offset) - 1, 0)
+        return self.pieces[i], self.starts[i]
+
+    def tokens(self):
+        # the whole token list, positions in text (same as get_tokens(text))
+        if self.error is not None:
+            return get_tokens(self.text)
+        out = []
+        for piece, base in zip(self.pieces, self.starts):
+            out.extend((kind, value, pos + base) for kind, value, pos in piece.tokens[:-1])
+        return out
+
+    def program(self):
+        # declarations of all the pieces that parse (positions are per piece)
+        return parse.Program([decl for piece in self.pieces for decl in piece.decls], pos=0)
+
+    def errors(self):
+        # [(offset in text, exception), ...] for what doesn't parse
+        if self.error is not None:
+            return [(0, self.error)]
+        return [(base, piece.error) for piece, base in zip(self.pieces, self.starts) if piece.error is not None]
+
+def _piece(text: str) -> Piece:
+    tokens = _lex(text)
+    try:
+        return Piece(text, tokens)
+    except SyntaxError as e:
+        piece = Piece(text, tokens, [])
+        piece.error = e
+        return piece
+
+def _whole_file_error(text: str):
+    tokens = _lex(text)
+    try:
+        parse.Parser(tokens).parse_program()
+    except SyntaxError as e:
+        return e
+    return SyntaxError("unbalanced braces, or a comment / string left open")
@@ -0,0 +1,263 @@
+import copy
+from parser import *
+from visitor import child_fields, walk
+import loops
+import typed
+
+# the first part of -O: calls to small functions defined further up get the
+# callee's body in their place, saving a python call each time.
+#
+#   - the callee is a Function with a body of at most `max_size` nodes (after -O,
+#     so folding already shrank it) that doesn't call itself
+#   - every argument is free of side effects (no calls / assignments / ++)
+#   - nothing the callee reads from outside (globals, other functions) is a
+#     local of the caller, which would capture it
+#   - no / in the callee while that's c's int division (typed.py)
+#   - an int callee's returns are ints already, with nothing for typed.coerce
+#     to convert (the int(...) would be lost once the return is gone)
+#
+# two ways of doing it:
+#   int sq(int x) { return x * x; }      y = sq(a + 1) * 2;
+#                                         y = (a + 1) * (a + 1) * 2;
+# the callee is one `return e;` with no side effects in e: the arguments go
+# straight in for the parameters, anywhere in an expression. an argument
+# that's more than a variable / literal has to be used at most once, so it
+# isn't worked out twice.
+#
+#   int clamp(int v) { int r = v; if (r > 9) r = 9; return r; }
+#   x = clamp(a[i]);      { int __i0_v = a[i]; int __i0_r = __i0_v;
+#                           if (__i0_r > 9) __i0_r = 9; x = __i0_r; }
+# anything else, as long as its only return is its last statement, when the
+# call is a whole statement: f(...); / x = f(...); / int x = f(...); /
+# return f(...);. parameters and locals get fresh __i<n>_ names.
+#
+# callees are remembered as each top level item goes by (learn), so only
+# functions defined above the caller get inlined, and it works behind
+# Parser.iter_program() like the rest of -O.
+
+DEFAULT_SIZE = 40
+FRESH = "__i{}_{}"
+
+def side_effects(node) -> bool:
+    for n in walk(node):
+        kind = type(n)
+        if kind is Call or kind is Assignment or (kind is Unary and n.op in ('++', '--')):
+            return True
+    return False
+
+def local_names(fn: Function, resolution):
+    # parameters and locals, from fn's structure.FunctionScope
+    return set(resolution.scope(fn).locals)
+
+class Callee:
+    def __init__(self, fn: Function, names, free, value, uses):
+        self.fn = fn
+        self.names = names    # parameters and locals
+        self.free = free      # everything else it mentions
+        self.value = value    # e for a `return e;` function, else None
+        self.uses = uses      # parameter -> how many times e reads it
+
+class Inliner:
+    def __init__(self, max_size: int = DEFAULT_SIZE):
+        self.max_size = max_size
+        self.callees = {}
+        self.sites = []  # (caller, callee, pos of the call)
+
+    def learn(self, node: Node, resolution):
+        # node, an optimized top level item, as a callee for what comes after it.
+        # resolution is the program's structure.Resolution, node bound in it
+        if type(node) is not Function:
+            return
+        self.callees.pop(node.name, None)
+        if self.max_size <= 0:
+            return
+        size = 0
+        returns = []
+        for n in walk(node.body):
+            size += 1
+            if size > self.max_size:
+                return
+            kind = type(n)
+            if kind is Return:
+                returns.append(n)
+            elif kind is Binary and n.op == '/' and loops.INT_DIVISION:
+                # int or float division goes by the parameters' declared types
+                # (typed.py), an argument put in their place doesn't have one
+                return
+        names = local_names(node, resolution)
+        free = set(resolution.uses(node))
+        if node.name in free or node.name in names:
+            return
+        if loops.INT_DIVISION and node.ret_type in loops.INT_TYPES:
+            ints = loops.bound_names(node, resolution)
+            if any(r.expr is not None and typed.coerce(r.expr, ints) for r in returns):
+                return
+        stmts = node.body.stmts if type(node.body) is Compound else [node.body]
+        if returns and (len(returns) > 1 or not stmts or stmts[-1] is not returns[0]):
+            return
+        value, uses = None, {}
+        if len(stmts) == 1 and returns and returns[0].expr is not None and not side_effects(returns[0].expr):
+            value = returns[0].expr
+            uses = {name: 0 for _, name in node.params}
+            for n in walk(value):
+                if type(n) is Var and n.name in uses:
+                    uses[n.name] += 1
+        self.callees[node.name] = Callee(node, names, free, value, uses)
+
+    def run(self, node: Node, resolution) -> Node:
+        # node is one top level item, changed in place. resolution is its
+        # structure.Resolution (node added)
+        if type(node) is Function and self.callees:
+            self.function(node, resolution)
+        return node
+
+    def function(self, fn: Function, resolution):
+        # whether it calls anything known at all is in what it uses from the top
+        # level, most functions don't
+        free = resolution.uses(fn)
+        if not any(name in self.callees for name in free):
+            return
+        names = local_names(fn, resolution)
+        self.caller = fn
+        self.caller_names = names
+        self.taken = names | set(free)
+        self.next_site = 0
+        stack = [(fn.body, fn, 'body', None)]
+        while stack:
+            n, parent, name, index = stack.pop()
+            kind = type(n)
+            if kind is Call:
+                callee = self.callee(n)
+                if callee is not None and callee.value is not None and self.expression_ok(n, callee):
+                    replace(parent, name, index, self.expression(n, callee))
+                    continue
+            elif name in ('stmts', 'then_branch', 'else_branch', 'body'):
+                call = statement_call(n)
+                callee = None if call is None else self.callee(call)
+                if callee is not None and (callee.value is None or not self.expression_ok(call, callee)):
+                    spliced = self.statement(n, call, callee)
+                    if spliced is not None:
+                        replace(parent, name, index, spliced)
+                        continue
+            # children pushed last first, so calls are met (and reported) in source order
+            for field_name, is_list in reversed(child_fields(kind)):
+                value = getattr(n, field_name)
+                if is_list:
+                    stack.extend((value[i], n, field_name, i) for i in range(len(value) - 1, -1, -1))
+                elif value is not None:
+                    stack.append((value, n, field_name, None))
+
+    def callee(self, call: Call):
+        # the Callee for call if it can be inlined here, else None
+        if type(call.callee) is not Var:
+            return None
+        callee = self.callees.get(call.callee.name)
+        if callee is None or call.callee.name in self.caller_names:
+            return None
+        if len(call.args) != len(callee.fn.params) or callee.free & self.caller_names:
+            return None
+        if any(side_effects(arg) for arg in call.args):
+            return None
+        return callee
+
+    @staticmethod
+    def expression_ok(call: Call, callee: Callee) -> bool:
+        for (_, name), arg in zip(callee.fn.params, call.args):
+            if callee.uses[name] > 1 and type(arg) is not Var and type(arg) is not Literal:
+                return False
+        return True
+
+    def expression(self, call: Call, callee: Callee) -> Node:
+        args = {name: arg for (_, name), arg in zip(callee.fn.params, call.args)}
+        value = copy.deepcopy(callee.value)
+        self.sites.append((self.caller.name, callee.fn.name, call.pos))
+        if type(value) is Var and value.name in args:
+            return copy.deepcopy(args[value.name])
+        for n, parent, name, index in list(parents(value)):
+            if type(n) is Var and n.name in args:
+                replace(parent, name, index, copy.deepcopy(args[n.name]))
+        return value
+
+    def statement(self, stmt, call: Call, callee: Callee):
+        fn = callee.fn
+        body = copy.deepcopy(fn.body)
+        stmts = body.stmts if type(body) is Compound else [body]
+        value = None
+        if stmts and type(stmts[-1]) is Return:
+            value = stmts.pop().expr
+        if value is None and type(stmt) is not Return and not (type(stmt) is ExprStmt and stmt.expr is call):
+            # the call's value is used and there isn't one
+            return None
+        while True:
+            site = self.next_site
+            self.next_site += 1
+            rename = {name: FRESH.format(site, name) for name in callee.names}
+            if self.taken.isdisjoint(rename.values()):
+                break
+        self.taken.update(rename.values())
+        self.caller_names.update(rename.values())
+        for n in walk(body):
+            if type(n) is Var or type(n) is Declaration:
+                n.name = rename.get(n.name, n.name)
+        if value is not None:
+            for n in walk(value):
+                if type(n) is Var:
+                    n.name = rename.get(n.name, n.name)
+        out = [Declaration(typ, rename[name], arg, pos=arg.pos)
+               for (typ, name), arg in zip(fn.params, call.args)]
+        out.extend(stmts)
+        # the call's value where the call was
+        if type(stmt) is ExprStmt and stmt.expr is call:
+            if value is not None:
+                out.append(ExprStmt(value, pos=stmt.pos))
+        elif type(stmt) is Return:
+            out.append(Return(value, pos=stmt.pos))
+        else:
+            if type(stmt) is Declaration:
+                stmt.initializer = value
+            else:
+                expr = stmt.expr
+                while expr.value is not call:
+                    expr = expr.value
+                expr.value = value
+            out.append(stmt)
+        self.sites.append((self.caller.name, fn.name, call.pos))
+        return Compound(out, pos=stmt.pos)
+
+def statement_call(stmt):
+    # the Call that's the whole value of stmt (f(...); / x = f(...); /
+    # int x = f(...); / return f(...);), None if it isn't one of those
+    kind = type(stmt)
+    if kind is ExprStmt or kind is Return:
+        expr = stmt.expr
+    elif kind is Declaration:
+        expr = stmt.initializer
+    else:
+        return None
+    if kind is not Declaration:
+        # x = y = f(...) too, as long as the targets don't do anything themselves
+        while type(expr) is Assignment and kind is ExprStmt:
+            if side_effects(expr.target):
+                return None
+            expr = expr.value
+    return expr if type(expr) is Call else None
+
+def parents(node):
+    # (node, parent, field, index) for every node under node
+    stack = [(node, None, None, None)]
+    while stack:
+        item = stack.pop()
+        yield item
+        n = item[0]
+        for name, is_list in child_fields(type(n)):
+            value = getattr(n, name)
+            if is_list:
+                stack.extend((child, n, name, i) for i, child in enumerate(value))
+            elif value is not None:
+                stack.append((value, n, name, None))
+
+def replace(parent, name, index, new):
+    if index is None:
+        setattr(parent, name, new)
+    else:
+        getattr(parent, name)[index] = new
@@ -1,4 +1,8 @@
 import re
+import mmap
+from typing import Tuple
+
+Token = Tuple[str, str, int]  # (type, lexeme, pos)
 
 #order matters, there might be errors if certain elements are not in the right order
 
@@ -86,7 +90,58 @@
     ('WHITESPACE', re.compile(r'\s+'))
 ]
 
-def get_tokens(source: str):
+# single pass scanner stuffs
+# the old loop matched every pattern against a fresh slice of the source, so a
+# leading \b always saw start-of-string. matching by offset would look at the
+# char before instead, so leading \b's are dropped here to keep the same tokens.
+# keywords are not in the big regex, they get looked up after an IDENTIFIER.
+KEYWORDS = {}
+_MASTER_PARTS = []
+for _name, _regex in Tokens:
+    _pattern = _regex.pattern
+    if _pattern.startswith(r'\b') and _pattern.endswith(r'\b') and _pattern[2:-2].isidentifier():
+        KEYWORDS[_pattern[2:-2]] = _name
+        continue
+    if _pattern.startswith(r'\b'):
+        _pattern = _pattern[2:]
+    if _regex.flags & re.DOTALL:
+        _pattern = f'(?s:{_pattern})'
+    _MASTER_PARTS.append(f'(?P<{_name}>{_pattern})')
+
+MASTER = re.compile('|'.join(_MASTER_PARTS))
+# a keyword only counts if the next char is not a (unicode) word char, same as its trailing \b
+_WORD_CHAR = re.compile(r'\w')
+
+def iter_tokens(source: str, pos: int = 0):
+    # generator version, so the parser can pull tokens as it goes. pos has to be
+    # the start of a token (incremental.py restarts the scan part way through)
+    match = MASTER.match
+    keywords = KEYWORDS
+    end = len(source)
+
+    while pos < end:
+        m = match(source, pos)
+        if m is None:
+            yield ('UNKNOWN', source[pos], pos)
+            pos += 1
+            continue
+        kind = m.lastgroup
+        stop = m.end()
+        if kind == 'IDENTIFIER':
+            lexeme = m.group()
+            keyword = keywords.get(lexeme)
+            if keyword is not None and not _WORD_CHAR.match(source, stop):
+                kind = keyword
+            yield (kind, lexeme, pos)
+        elif kind != 'WHITESPACE':
+            yield (kind, m.group(), pos)
+        pos = stop
+
+def scan_tokens(source: str):
+    return list(iter_tokens(source))
+
+# old slice-per-token lexer, kept around to check scan_tokens against
+def get_tokens_legacy(source: str):
     var = source
     tokens = []
     pos = 0  # character position
@@ -107,3 +162,98 @@ def get_tokens(source: str):
             pos += 1
 
     return tokens
+
+# bytes level lexing for huge files
+# same table again but compiled for bytes, so an mmap can be scanned without
+# decoding it. \w \s \d are ascii only here, and pos is a byte offset (same
+# as the char offset for ascii sources, non ascii bytes come out as UNKNOWN).
+MASTER_BYTES = re.compile(MASTER.pattern.encode('ascii'))
+KEYWORDS_BYTES = {k.encode('ascii'): v for k, v in KEYWORDS.items()}
+_KEYWORD_MAX = max(len(k) for k in KEYWORDS_BYTES)
+_WORD_BYTE = re.compile(rb'\w')
+
+class LazyToken:
+    # looks like a (type, lexeme, pos) tuple but only decodes the lexeme when asked
+    __slots__ = ('type', 'start', 'end', 'data', '_lexeme')
+
+    def __init__(self, type, start, end, data):
+        self.type = type
+        self.start = start
+        self.end = end
+        self.data = data
+        self._lexeme = None
+
+    @property
+    def lexeme(self) -> str:
+        if self._lexeme is None:
+            self._lexeme = self.data[self.start:self.end].decode('utf-8', 'replace')
+        return self._lexeme
+
+    def __getitem__(self, i):
+        if i == 0:
+            return self.type
+        if i == 2:
+            return self.start
+        return (self.type, self.lexeme, self.start)[i]
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        yield self.type
+        yield self.lexeme
+        yield self.start
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+def open_mapped(path: str):
+    with open(path, 'rb') as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files can't be mapped
+            return b''
+
+def iter_spans(source):
+    # (type, start, end) for every non whitespace token, str or bytes source.
+    # nothing gets sliced out of the source, that's up to whoever is asking
+    if isinstance(source, str):
+        match, keywords, word = MASTER.match, KEYWORDS, _WORD_CHAR.match
+    else:
+        match, keywords, word = MASTER_BYTES.match, KEYWORDS_BYTES, _WORD_BYTE.match
+    pos = 0
+    end = len(source)
+
+    while pos < end:
+        m = match(source, pos)
+        if m is None:
+            yield ('UNKNOWN', pos, pos + 1)
+            pos += 1
+            continue
+        kind = m.lastgroup
+        stop = m.end()
+        if kind == 'IDENTIFIER':
+            if stop - pos <= _KEYWORD_MAX:
+                keyword = keywords.get(source[pos:stop])
+                if keyword is not None and not word(source, stop):
+                    kind = keyword
+            yield (kind, pos, stop)
+        elif kind != 'WHITESPACE':
+            yield (kind, pos, stop)
+        pos = stop
+
+def iter_tokens_mapped(data):
+    for kind, start, end in iter_spans(data):
+        yield LazyToken(kind, start, end, data)
+
+def get_tokens_mapped(data):
+    return list(iter_tokens_mapped(data))
+
+def get_tokens(source: str, legacy: bool = False):
+    if legacy:
+        return get_tokens_legacy(source)
+    return scan_tokens(source)
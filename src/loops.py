@@ -0,0 +1,223 @@
+import re
+from parser import *
+from visitor import walk
+import runtime
+
+# c for loops that can be python range() loops, for both backends:
+#
+#     for (int i = a; i < b; i++)      for i in range(a, b)
+#     for (int i = a; i <= b; i += k)  for i in range(a, b + 1, k)   (i = i + k)
+#     for (int i = a; i > b; i--)      for i in range(a, b, -1)
+#
+# which needs
+#   - i declared by the loop (so nothing reads it after the loop, where c and
+#     range disagree on its value)
+#   - a nonzero literal step going the way the condition counts
+#   - a and b ints: built from int literals, the function's int variables
+#     (bound_names) and calls to functions returning int, because range() won't
+#     take 2.5 where the while loop would. / counts while it's c's int division
+#   - nothing in the body writes i or anything b reads
+# anything else stays a while loop.
+#
+# (nodes can be NodeArena views, subclasses of the real classes, hence isinstance)
+
+INT_TYPES = {'int', 'long', 'short', 'char', 'signed', 'unsigned', '_Bool'}
+# ops on ints that give an int back in python (/ doesn't)
+INT_OPS = {'+', '-', '*', '%', '<<', '>>', '&', '|', '^'}
+# / on ints is c's truncating division, an int too (typed.py). a module switch
+# rather than a backend one, the optimizer and everything using int_expr have to
+# agree with the backends on it. main sets it from --no-int-division
+INT_DIVISION = True
+# ops giving a python bool, an int too
+COMPARE_OPS = {'==', '!=', '<', '>', '<=', '>='}
+# a function f that returns an int is "f()" in int_expr's names, an int array
+# a is "a[]" (a[i] is an int)
+INT_CALL = "{}()"
+INT_ARRAY = "{}[]"
+# the parser gives `int a[100];` the type "int[100]"
+ARRAY = re.compile(r'(\w+)\[(\d+)\]$')
+# i < b, with the operands swapped when the loop variable is on the right
+FLIPPED = {'<': '>', '>': '<', '<=': '>=', '>=': '<='}
+
+def array_type(var_type: str):
+    # (element type, length) if var_type is an array's, else None
+    m = ARRAY.match(var_type)
+    return (m.group(1), int(m.group(2))) if m else None
+
+def int_expr(node, names) -> bool:
+    # node always evaluates to a python int (given names hold ints, and the
+    # functions named f() / arrays named a[] in it return / hold them)
+    if isinstance(node, Literal):
+        return type(node.value) is int
+    if isinstance(node, Var):
+        return node.name in names
+    if isinstance(node, Unary):
+        if node.op == '!':
+            return True
+        if node.op in ('++', '--'):
+            return isinstance(node.operand, Var) and node.operand.name in names
+        return node.op in ('-', '+', '~') and int_expr(node.operand, names)
+    if isinstance(node, Binary):
+        if node.op in COMPARE_OPS or node.op in ('&&', '||'):
+            return True
+        return (node.op in INT_OPS or node.op == '/' and INT_DIVISION) \
+            and int_expr(node.left, names) and int_expr(node.right, names)
+    if isinstance(node, Call):
+        return isinstance(node.callee, Var) and INT_CALL.format(node.callee.name) in names
+    if isinstance(node, ArrayAccess):
+        return isinstance(node.array, Var) and INT_ARRAY.format(node.array.name) in names
+    return False
+
+def written_names(node):
+    # variables assigned, declared or stepped (++ / --) anywhere under node
+    written = set()
+    for n in walk(node):
+        if isinstance(n, Assignment) and isinstance(n.target, Var):
+            written.add(n.target.name)
+        elif isinstance(n, Unary) and n.op in ('++', '--') and isinstance(n.operand, Var):
+            written.add(n.operand.name)
+        elif isinstance(n, Declaration):
+            written.add(n.name)
+    return written
+
+def bound_names(function: Function, resolution=None):
+    # names in function that always hold an int, and the functions it calls
+    # that return one (as f()). with INT_DIVISION on that's every name only
+    # declared int, parameters and locals: the backends make whatever they're
+    # given an int the way c converts it, int(...) where the value isn't known
+    # to be one (typed.py), so is a function declared to return int, and an
+    # element of an array declared int (as a[]). with a resolution
+    # (structure.py) the same goes for the top level names the function uses
+    # (outer_names). otherwise it's the int parameters and locals whose every
+    # assignment is an int expression of such names, starting from all of them
+    # and dropping names until nothing changes. globals are never in it then, and
+    # a name given a string isn't either
+    declared = set()
+    values = {}  # name -> what it gets assigned, None for "not an int"
+    arrays = {}  # name -> every declaration of it is an int array
+    for typ, name in function.params:
+        declared.add(name)
+        values.setdefault(name, []).append(None if typ not in INT_TYPES else Literal(0))
+        arrays[name] = False
+    if resolution is None:
+        writes = walk(function.body)
+    else:
+        writes = (n for found in resolution.scope(function).writes.values() for n in found)
+    for n in writes:
+        if isinstance(n, Declaration):
+            declared.add(n.name)
+            if n.var_type not in INT_TYPES:
+                values.setdefault(n.name, []).append(None)
+                array = array_type(n.var_type)
+                arrays[n.name] = arrays.get(n.name, True) and array is not None and array[0] in INT_TYPES
+            else:
+                arrays[n.name] = False
+                if n.initializer is not None:
+                    values.setdefault(n.name, []).append(n.initializer)
+        elif isinstance(n, Assignment) and isinstance(n.target, Var):
+            values.setdefault(n.target.name, []).append(n.value)
+    names = set(declared)
+    if INT_DIVISION:
+        for name in declared:
+            if any(value is None or isinstance(value, Literal) and type(value.value) is str
+                   for value in values.get(name, ())):
+                names.discard(name)
+        names.update(INT_ARRAY.format(name) for name, ints in arrays.items() if ints)
+        if resolution is None:
+            names.update(INT_CALL.format(name) for name in runtime.INT_RESULTS if name not in declared)
+            if function.ret_type in INT_TYPES and function.name not in declared:
+                names.add(INT_CALL.format(function.name))
+        else:
+            names |= outer_names(resolution.uses(function))
+        return names
+    changed = True
+    while changed:
+        changed = False
+        for name in list(names):
+            if not all(value is not None and int_expr(value, names) for value in values.get(name, ())):
+                names.discard(name)
+                changed = True
+    return names
+
+def outer_names(uses):
+    # bound_names for the top level names an item uses (Resolution.uses, name ->
+    # Symbol): globals declared int, a[] for int arrays and f() for functions
+    # declared to return int and the runtime's int builtins. only with INT_DIVISION on, like the int(...) on
+    # every store that makes them hold
+    names = set()
+    if not INT_DIVISION:
+        return names
+    for name, symbol in uses.items():
+        if symbol is None:
+            continue
+        if symbol.kind == 'builtin':
+            if name in runtime.INT_RESULTS:
+                names.add(INT_CALL.format(name))
+        elif symbol.kind != 'global':
+            if symbol.type in INT_TYPES:
+                names.add(INT_CALL.format(name))
+        elif symbol.type in INT_TYPES:
+            names.add(name)
+        else:
+            array = array_type(symbol.type)
+            if array is not None and array[0] in INT_TYPES:
+                names.add(INT_ARRAY.format(name))
+    return names
+
+def top_names(decl: Declaration, resolution):
+    # bound_names for a top level declaration's initializer: the names it can
+    # count on, and the variable itself if it's an int
+    if decl.initializer is None or not INT_DIVISION:
+        return set()
+    names = outer_names(resolution.uses(decl))
+    if decl.var_type in INT_TYPES:
+        names.add(decl.name)
+    return names
+
+def loop_step(post, name: str):
+    # the literal step of i++ / --i / i = i + k / i = i - k / i = k + i, else None
+    if isinstance(post, Unary) and post.op in ('++', '--'):
+        if isinstance(post.operand, Var) and post.operand.name == name:
+            return 1 if post.op == '++' else -1
+        return None
+    if not (isinstance(post, Assignment) and isinstance(post.target, Var) and post.target.name == name):
+        return None
+    value = post.value
+    if not (isinstance(value, Binary) and value.op in ('+', '-')):
+        return None
+    left, right = value.left, value.right
+    if isinstance(left, Var) and left.name == name and isinstance(right, Literal) and type(right.value) is int:
+        step = right.value
+    elif value.op == '+' and isinstance(right, Var) and right.name == name \
+            and isinstance(left, Literal) and type(left.value) is int:
+        step = left.value
+    else:
+        return None
+    return -step if value.op == '-' else step
+
+def range_loop(node: For, names):
+    # (loop variable, start, stop, stop adjust, step) if node can be a range loop.
+    # stop adjust is +1 / -1 for <= / >= (range's stop is exclusive), else 0
+    init, cond = node.init, node.cond
+    if not (isinstance(init, Declaration) and init.var_type in INT_TYPES and init.initializer is not None):
+        return None
+    name = init.name
+    if not (isinstance(cond, Binary) and cond.op in FLIPPED):
+        return None
+    op, bound = cond.op, cond.right
+    if not (isinstance(cond.left, Var) and cond.left.name == name):
+        if not (isinstance(cond.right, Var) and cond.right.name == name):
+            return None
+        op, bound = FLIPPED[op], cond.left
+    step = loop_step(node.post, name)
+    if not step or (step > 0) != (op in ('<', '<=')):
+        return None
+    written = written_names(node.body)
+    if name in written:
+        return None
+    # a and b are ints and b doesn't change while the loop runs. a reading i
+    # (int i = i) is left alone too
+    if not int_expr(init.initializer, names - {name}) or not int_expr(bound, names - written - {name}):
+        return None
+    adjust = {'<': 0, '>': 0, '<=': 1, '>=': -1}[op]
+    return name, init.initializer, bound, adjust, step
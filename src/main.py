@@ -1,31 +1,310 @@
+import os
 import sys
-from lexer import get_tokens
+import argparse
+from itertools import chain
+from lexer import get_tokens, get_tokens_mapped, open_mapped, iter_tokens, iter_tokens_mapped
+from tokenbuf import TokenBuffer
+from ast_arena import NodeArena
+from astdump import pretty_to, dump_jsonl
 import parser as parse
 from codegen import PythonCodeGen
+from pybackend import LineMap, compile_program, run_code, write_pyc, load_pyc
+from cache import CompileCache, DEFAULT_MAX_BYTES
+from driver import compile_cached, cached_ast, apply_settings, paused_gc
+from batch import run_batch
+from split import compile_parallel, parse_parallel
+from watch import watch
+from metrics import Profiler, NULL_PROFILER
+from optimizer import Optimizer
+from inliner import DEFAULT_SIZE
+from purity import DEFAULT_MEMO_SIZE
 
-def main():
-    if len(sys.argv) < 2:
-        print("usage: python main.py <source_file>")
-        sys.exit(1)
+def build_arg_parser():
+    ap = argparse.ArgumentParser(prog="main.py", description="hypotenuse compiler, C triangle to python")
+    ap.add_argument("sources", nargs="+", metavar="source",
+                    help="a .ctri file (- for stdin), or for batch mode any number of files / directories")
+    ap.add_argument("-j", "--jobs", type=int, metavar="N",
+                    help="batch mode: compile with N worker processes (0 = one per cpu)")
+    ap.add_argument("-o", "--out-dir", metavar="DIR",
+                    help="batch mode: write outputs under DIR instead of next to each source")
+    ap.add_argument("--legacy-lexer", action="store_true",
+                    help="use the old slice-per-token lexer (slow, for checking the scanner)")
+    ap.add_argument("--mmap", action="store_true",
+                    help="mmap the source and lex the raw bytes (for very large files, pos is a byte offset)")
+    ap.add_argument("--compact-tokens", action="store_true",
+                    help="keep tokens in a TokenBuffer (arrays + lazy lexemes) instead of a list of tuples")
+    ap.add_argument("--stream", action="store_true",
+                    help="lex, parse and generate one top level declaration at a time, printing as it goes")
+    ap.add_argument("--ast-arena", action="store_true",
+                    help="pack the ast into flat arrays (NodeArena) as it's parsed, codegen reads it through views")
+    ap.add_argument("--dump-ast", metavar="PATH",
+                    help="also write the ast to PATH ('-' for stdout)")
+    ap.add_argument("--dump-format", choices=("text", "jsonl"), default="text",
+                    help="text is the pretty() format, jsonl is one json object per node")
+    ap.add_argument("--dump-max-depth", type=int, metavar="N", help="cut the dump off below depth N")
+    ap.add_argument("--dump-max-nodes", type=int, metavar="N", help="stop the dump after N nodes")
+    ap.add_argument("--run", action="store_true",
+                    help="compile to a python code object and run it (main() if there is one) instead of"
+                         " printing code, the source file can also be a .pyc written by --pyc")
+    ap.add_argument("--pyc", metavar="PATH", help="write the compiled code object to PATH as a .pyc")
+    ap.add_argument("--parallel-parse", type=int, metavar="N",
+                    help="cut one big file between top level declarations and lex / parse / generate the"
+                         " pieces on N worker processes (0 = one per cpu), same output as without")
+    ap.add_argument("--cache", metavar="DIR",
+                    help="keep tokens, ast and generated code in DIR keyed by source hash, an unchanged"
+                         " file skips straight to the output")
+    ap.add_argument("--cache-max-size", type=int, metavar="MB", default=DEFAULT_MAX_BYTES // 2**20,
+                    help="evict least recently used cache entries past this size (default %(default)s)")
+    ap.add_argument("--cache-stats", action="store_true", help="print cache hits / misses to stderr")
+    ap.add_argument("--profile", metavar="JSON",
+                    help="time each phase, count tokens / ast nodes / lines, print a summary to stderr"
+                         " and write it all to JSON")
+    ap.add_argument("--profile-memory", action="store_true",
+                    help="with --profile: peak memory per phase via tracemalloc (slower, timings include it)")
+    ap.add_argument("--profile-functions", type=int, default=0, metavar="N",
+                    help="with --profile: run under cProfile and list the N functions with the most own time")
+    ap.add_argument("-O", "--optimize", action="store_true",
+                    help="fold constants, simplify x + 0 / x * 1, prune constant if / while and drop"
+                         " dead statements before generating code (reports what it removed on stderr)")
+    ap.add_argument("--inline-size", type=int, default=DEFAULT_SIZE, metavar="N",
+                    help="with -O: inline calls to functions whose body is at most N ast nodes"
+                         " (default %(default)s, 0 = no inlining), listing each call inlined on stderr")
+    ap.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE, metavar="N",
+                    help="pure functions (no globals, no arrays, only calling pure functions) are wrapped"
+                         " in an lru_cache of N entries (default %(default)s)")
+    ap.add_argument("--no-memoize", action="store_true", help="don't cache pure functions' results")
+    ap.add_argument("--no-int-division", action="store_true",
+                    help="int / int stays python's float division instead of c's truncating one")
+    ap.add_argument("--vectorize", action="store_true",
+                    help="element-wise array loops as numpy operations (the loop kept for when they can't"
+                         " be), `int a[n];` / `double a[n];` as numpy arrays")
+    ap.add_argument("--typed-arrays", action="store_true",
+                    help="`int a[n];` / `double a[n];` as array module arrays (8 bytes an element)"
+                         " instead of lists")
+    ap.add_argument("--bind-globals", action="store_true",
+                    help="copy the functions, builtins and globals a function reads in its loops into"
+                         " locals when it's called")
+    ap.add_argument("--watch", action="store_true",
+                    help="recompile the source every time it's saved, to source.py (or under -o DIR),"
+                         " redoing only the top level items that changed")
+    return ap
 
-    with open(sys.argv[1], "r") as file:
-        content = file.read()
+def read_source(path: str, binary: bool = False):
+    # '-' is stdin (what the compile server client forwards)
+    if path == "-":
+        text = sys.stdin.read()
+        return text.encode() if binary else text
+    with open(path, "rb" if binary else "r") as file:
+        return file.read()
+
+def main(argv=None):
+    # returns the exit status, argv defaults to sys.argv[1:]. everything goes through
+    # sys.stdout / sys.stderr at call time so server.py can point them at a client
+    ap = build_arg_parser()
+    args = ap.parse_args(argv)
+    # set every time, the compile server runs main() over and over in one process
+    apply_settings({
+        'memo_size': 0 if args.no_memoize else max(args.memo_size, 0),
+        'int_division': not args.no_int_division,
+        'vector_loops': args.vectorize,
+        'typed_arrays': args.typed_arrays,
+        'bind_globals': args.bind_globals,
+    })
+
+    if args.watch:
+        if args.profile or args.optimize:
+            ap.error("--profile and -O take a single compile, not --watch")
+        if len(args.sources) != 1 or os.path.isdir(args.sources[0]) or args.sources[0] == "-":
+            ap.error("--watch takes a single source file")
+        return watch(args.sources[0], args.out_dir)
+
+    # several files, a directory, -j or -o: compile each source to its own .py
+    if len(args.sources) > 1 or os.path.isdir(args.sources[0]) or args.jobs is not None or args.out_dir:
+        if args.run or args.pyc or args.stream or args.dump_ast or args.profile or args.optimize:
+            ap.error("--run, --pyc, --stream, --dump-ast, --profile and -O take a single source file")
+        return run_batch(args.sources, 1 if args.jobs is None else args.jobs, args.out_dir,
+                         args.cache, args.cache_max_size * 2**20)
+    args.source_file = args.sources[0]
+
+    if not args.profile:
+        return compile_file(ap, args, NULL_PROFILER)
+    prof = Profiler(args.profile_memory, args.profile_functions)
+    prof.note("source", args.source_file)
+    prof.start()
+    try:
+        status = compile_file(ap, args, prof)
+    finally:
+        prof.stop()
+    print(prof.summary(), file=sys.stderr)
+    prof.write_json(args.profile)
+    return status
+
+def compile_file(ap, args, prof):
+    # one source file, every mode but batch / watch. prof gets the phases
+    if args.run and args.source_file.endswith(".pyc"):
+        prof.note("mode", "run .pyc")
+        with prof.phase("load"):
+            code = load_pyc(args.source_file)
+        with prof.phase("run"):
+            return run_code(code, [args.source_file])
+
+    if args.cache and args.optimize:
+        ap.error("-O output isn't cached, drop --cache")
+    if args.cache and not (args.run or args.pyc or args.stream):
+        prof.note("mode", "cache")
+        cache = CompileCache(args.cache, args.cache_max_size * 2**20)
+        with prof.phase("read"):
+            source = read_source(args.source_file, binary=True)
+        if args.dump_ast:
+            with prof.phase("dump"):
+                key = cache.key(source)
+                entry = cache.load(key)
+                had_ast = "ast" in entry
+                dump_ast(cached_ast(source, entry, cache), args)
+                if not had_ast:
+                    cache.store(key, entry)
+        with prof.phase("cache"):
+            python_code = compile_cached(source, cache)
+            cache.close()
+        with prof.phase("output"):
+            print("code generated (python)")
+            print(python_code)
+        prof.count("lines", python_code.count("\n") + 1)
+        if args.cache_stats:
+            print(cache.report(), file=sys.stderr)
+        return 0
 
     # lexing stuffs
-    tokens = get_tokens(content)
-    tokens.append(('EOF', 'EOF', len(content)))
+    with prof.phase("read"):
+        if args.mmap:
+            if args.source_file == "-":
+                ap.error("--mmap needs a file, not stdin")
+            content = open_mapped(args.source_file)
+        else:
+            content = read_source(args.source_file)
+    prof.count("bytes", len(content))
+
+    if args.stream and not (args.run or args.pyc):
+        # lex / parse / codegen / output all interleaved, one phase
+        prof.note("mode", "stream")
+        opt = Optimizer(args.inline_size) if args.optimize else None
+        with prof.phase("stream"), paused_gc():
+            stream_compile(content, sys.stdout, opt)
+        if opt is not None:
+            report_optimizer(opt, prof, content)
+        return 0
 
-    # parsing stuffs
-    p = parse.Parser(tokens)
-    ast = p.parse_program()
+    if args.parallel_parse is not None:
+        if args.mmap:
+            ap.error("--parallel-parse works on the source as text, not with --mmap")
+        if not (args.run or args.pyc or args.dump_ast or args.optimize):
+            prof.note("mode", "parallel")
+            with prof.phase("parallel"):
+                python_code = compile_parallel(content, args.parallel_parse)
+            with prof.phase("output"):
+                print("code generated (python)")
+                print(python_code)
+            prof.count("lines", python_code.count("\n") + 1)
+            return 0
+        with prof.phase("parallel"), paused_gc():
+            # -O changes the tree, the arena views it'd otherwise get are read only
+            ast = parse_parallel(content, args.parallel_parse, mutable=args.optimize)
+    else:
+        with prof.phase("lex"):
+            if args.compact_tokens:
+                tokens = TokenBuffer.from_source(content)
+            elif args.mmap:
+                tokens = get_tokens_mapped(content)
+            else:
+                tokens = get_tokens(content, legacy=args.legacy_lexer)
+            tokens.append(('EOF', 'EOF', len(content)))
+        prof.count("tokens", len(tokens) - 1)
+
+        # parsing stuffs
+        with prof.phase("parse"), paused_gc():
+            p = parse.Parser(tokens)
+            if args.ast_arena:
+                decls = p.iter_program()
+                if args.optimize:
+                    # arena nodes are read only, each item is optimized before it's packed
+                    opt = Optimizer(args.inline_size)
+                    decls = map(opt.optimize, decls)
+                ast = NodeArena.from_decls(decls).root()
+            else:
+                ast = p.parse_program()
+    # -O's structure.Resolution goes on to the backend, so the program is only
+    # resolved once. not an arena's: its nodes aren't the ones -O bound
+    resolution = None
+    if args.optimize:
+        if not (args.ast_arena and args.parallel_parse is None):
+            with prof.phase("optimize"), paused_gc():
+                opt = Optimizer(args.inline_size)
+                ast = opt.optimize(ast)
+            resolution = opt.resolution
+        report_optimizer(opt, prof, content)
+    prof.count_nodes(ast)
+
+    if args.dump_ast:
+        with prof.phase("dump"):
+            dump_ast(ast, args)
+
+    # python ast backend, no source text
+    if args.run or args.pyc:
+        prof.note("mode", "run" if args.run else "pyc")
+        with prof.phase("compile"), paused_gc():
+            code = compile_program(ast, content, args.source_file, resolution)
+        if args.pyc:
+            with prof.phase("output"):
+                write_pyc(code, args.pyc, None if args.source_file == "-" else args.source_file)
+        if args.run:
+            with prof.phase("run"):
+                return run_code(code, [args.source_file])
+        return 0
 
     # codegen
-    cg = PythonCodeGen()
-    python_code = cg.generate(ast)
+    prof.note("mode", "codegen")
+    with prof.phase("codegen"), paused_gc():
+        cg = PythonCodeGen(resolution)
+        python_code = cg.generate(ast)
+    prof.count("lines", len(cg.lines))
 
     # codegen output
-    print("code generated (python)")
-    print(python_code)
+    with prof.phase("output"):
+        print("code generated (python)")
+        print(python_code)
+    return 0
+
+def report_optimizer(opt, prof, content):
+    print(opt.report(), file=sys.stderr)
+    if opt.inliner.sites:
+        lines = LineMap(content)
+        for caller, callee, pos in opt.inliner.sites:
+            print(f"-O: inlined {callee}() into {caller}() at line {lines.line(pos)}", file=sys.stderr)
+    prof.count("removed", opt.removed)
+
+def dump_ast(ast, args):
+    dump = dump_jsonl if args.dump_format == "jsonl" else pretty_to
+    if args.dump_ast == "-":
+        dump(ast, sys.stdout, max_depth=args.dump_max_depth, max_nodes=args.dump_max_nodes)
+        return
+    with open(args.dump_ast, "w") as out:
+        dump(ast, out, max_depth=args.dump_max_depth, max_nodes=args.dump_max_nodes)
+
+def stream_compile(content, out, opt=None):
+    # tokens are pulled by the parser, each finished top level node goes straight
+    # to codegen and out (through opt first, for -O). pair with --mmap so the
+    # source isn't in memory either
+    if isinstance(content, str):
+        tokens = iter_tokens(content)
+    else:
+        tokens = iter_tokens_mapped(content)
+    tokens = chain(tokens, [('EOF', 'EOF', len(content))])
+
+    out.write("code generated (python)\n")
+    decls = parse.Parser(tokens).iter_program()
+    if opt is not None:
+        decls = map(opt.optimize, decls)
+    PythonCodeGen(None if opt is None else opt.resolution).generate_to(decls, out)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import sys
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from visitor import walk
+
+# --profile: where one compile's time goes. main wraps each phase in
+# `with prof.phase("lex"):` and hands over counts as it gets them. when it's off
+# prof is NULL_PROFILER, whose phase() is a shared nullcontext and whose counts
+# do nothing, so an unprofiled compile pays a handful of no-op calls.
+#
+# (not called profile.py, cProfile imports the stdlib module of that name)
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, memory: bool = False, functions: int = 0):
+        # memory: tracemalloc peak per phase (slows everything down, the
+        # timings include it). functions: the hottest N functions from cProfile
+        self.memory = memory
+        self.functions = functions
+        self.phases = {}
+        self.counts = {}
+        self.nodes = Counter()
+        self.info = {}
+        self.cprofile = None
+        self.hottest = []
+        self.started = None
+        # time spent counting nodes, taken back out of the totals
+        self.overhead = [0.0, 0.0]
+
+    def start(self):
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        if self.functions:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        self.started = (time.perf_counter(), time.process_time())
+
+    def stop(self):
+        self.wall = time.perf_counter() - self.started[0] - self.overhead[0]
+        self.cpu = time.process_time() - self.started[1] - self.overhead[1]
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.hottest = self._hottest(self.cprofile, self.functions)
+        if self.memory:
+            import tracemalloc
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        if self.memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            stats = self.phases.setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0})
+            stats['wall_s'] += time.perf_counter() - wall
+            stats['cpu_s'] += time.process_time() - cpu
+            if self.memory:
+                # what the phase needed on top of what was already there
+                peak = tracemalloc.get_traced_memory()[1] - before
+                stats['peak_bytes'] = max(stats.get('peak_bytes', 0), peak)
+
+    def count(self, name: str, value: int):
+        self.counts[name] = value
+
+    def note(self, name: str, value):
+        # anything else worth having in the json (source, mode ...)
+        self.info[name] = value
+
+    def count_nodes(self, ast):
+        # ast nodes by class. the walk is the profiler's own cost, it's kept out
+        # of the phases, the totals and cProfile's numbers
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        nodes = Counter(type(node).__name__ for node in walk(ast))
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        self.nodes = nodes
+        self.counts['nodes'] = sum(nodes.values())
+        self.overhead[0] += time.perf_counter() - wall
+        self.overhead[1] += time.process_time() - cpu
+
+    @staticmethod
+    def _hottest(cprofile, n: int):
+        import pstats
+        stats = pstats.Stats(cprofile).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:n]
+        hottest = []
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in rows:
+            where = f"{filename.rsplit('/', 1)[-1]}:{line}" if line else filename
+            hottest.append({'function': f"{where}({name})", 'calls': calls,
+                            'tottime_s': tottime, 'cumtime_s': cumtime})
+        return hottest
+
+    def to_json(self) -> dict:
+        data = dict(self.info)
+        data['python'] = sys.version.split()[0]
+        data['wall_s'] = self.wall
+        data['cpu_s'] = self.cpu
+        data['phases'] = self.phases
+        data['counts'] = self.counts
+        data['nodes'] = dict(self.nodes.most_common())
+        if self.memory:
+            data['peak_bytes'] = self.peak
+        if self.functions:
+            data['functions'] = self.hottest
+        return data
+
+    def write_json(self, path: str):
+        with open(path, "w") as out:
+            json.dump(self.to_json(), out, indent=2)
+            out.write("\n")
+
+    def summary(self) -> str:
+        lines = [f"profile: {self.info.get('source', '?')}, {self.wall * 1e3:.1f} ms wall,"
+                 f" {self.cpu * 1e3:.1f} ms cpu"]
+        header = f"  {'phase':<10} {'wall ms':>9} {'cpu ms':>9} {'%':>6}"
+        lines.append(header + ("       peak" if self.memory else ""))
+        for name, stats in self.phases.items():
+            share = stats['wall_s'] / self.wall * 100 if self.wall else 0.0
+            row = f"  {name:<10} {stats['wall_s'] * 1e3:9.2f} {stats['cpu_s'] * 1e3:9.2f} {share:6.1f}"
+            if self.memory:
+                row += f" {stats.get('peak_bytes', 0) / 2**20:6.1f} MiB"
+            lines.append(row)
+        if self.counts:
+            lines.append("  " + ", ".join(f"{name} {value}" for name, value in self.counts.items()))
+        if self.nodes:
+            lines.append("  nodes: " + ", ".join(f"{name} {n}" for name, n in self.nodes.most_common(8)))
+        if self.memory:
+            lines.append(f"  peak traced memory {self.peak / 2**20:.1f} MiB")
+        if self.hottest:
+            lines.append(f"  {'own ms':>9} {'total ms':>9} {'calls':>9}  function")
+            for row in self.hottest:
+                lines.append(f"  {row['tottime_s'] * 1e3:9.2f} {row['cumtime_s'] * 1e3:9.2f}"
+                             f" {row['calls']:9}  {row['function']}")
+        return "\n".join(lines)
+
+class NullProfiler:
+    enabled = False
+    _phase = nullcontext()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def phase(self, name: str):
+        return self._phase
+
+    def count(self, name: str, value: int):
+        pass
+
+    def note(self, name: str, value):
+        pass
+
+    def count_nodes(self, ast):
+        pass
+
+NULL_PROFILER = NullProfiler()
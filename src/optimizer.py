@@ -0,0 +1,292 @@
+from parser import *
+from visitor import Transformer, child_fields, walk
+from hoist import Hoister
+from inliner import DEFAULT_SIZE, Inliner
+import loops
+from typed import c_divide
+from structure import Resolution
+
+# -O: a pass over the ast between the parser and either backend.
+#   inlining       small functions at their call sites (inliner.py), before the rest
+#   folding        literal arithmetic / comparisons, worked out the way the
+#                  generated python would (so 7 / 2 is 3 with the backends'
+#                  c int division, 3.5 without, like at run time)
+#   simplifying    x + 0, x * 1, 1 && x, 0 || x, ... and ?: on a constant
+#   pruning        if / while / for on a constant condition
+#   dropping       statements after a return (or a loop that never ends) in a
+#                  block, and expression statements that do nothing (x; 5; x = x;)
+#   hoisting       loop invariant expressions and repeated ones into temporaries
+#                  (hoist.py), after the rest
+# it rewrites the tree in place and works one top level item at a time, so it
+# can sit behind Parser.iter_program() too.
+
+# what a folded Binary computes, for number literals on both sides
+FOLD = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: c_divide(a, b) if loops.INT_DIVISION and type(a) is int and type(b) is int else a / b,
+    '%': lambda a, b: a % b,
+    '<<': lambda a, b: a << b,
+    '>>': lambda a, b: a >> b,
+    '&': lambda a, b: a & b,
+    '|': lambda a, b: a | b,
+    '^': lambda a, b: a ^ b,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '>': lambda a, b: a > b,
+    '<=': lambda a, b: a <= b,
+    '>=': lambda a, b: a >= b,
+}
+FOLD_UNARY = {
+    '-': lambda a: -a,
+    '+': lambda a: +a,
+    '~': lambda a: ~a,
+    '!': lambda a: not a,
+}
+# x op c == x for these (op, c), with c on the right. the ones that also work
+# with c on the left are in LEFT_IDENTITY
+RIGHT_IDENTITY = {('+', 0), ('-', 0), ('*', 1), ('<<', 0), ('>>', 0), ('|', 0), ('^', 0)}
+LEFT_IDENTITY = {('+', 0), ('*', 1), ('|', 0), ('^', 0)}
+# ops that can't raise or have side effects on numbers, for pure()
+SAFE_OPS = {'+', '-', '*', '&', '|', '^', '==', '!=', '<', '>', '<=', '>=', '&&', '||'}
+# folding 1 << 10 ** 9 would take a while and a lot of memory
+MAX_SHIFT = 64
+
+def number(node) -> bool:
+    # a literal with a numeric value (string / char literals are their source text)
+    return type(node) is Literal and isinstance(node.value, (int, float))
+
+def pure(node) -> bool:
+    # no side effects and can't raise: fine to drop or to evaluate fewer times
+    for n in walk(node):
+        kind = type(n)
+        if kind is Binary:
+            if n.op not in SAFE_OPS and n.op not in ('?:', 'branch'):
+                return False
+        elif kind is Unary:
+            if n.op in ('++', '--'):
+                return False
+        elif kind is not Literal and kind is not Var:
+            return False
+    return True
+
+def never_completes(stmt) -> bool:
+    # control can't fall out of the end of stmt (there's no break / goto to get out of a loop)
+    kind = type(stmt)
+    if kind is Return:
+        return True
+    if kind is Compound:
+        return bool(stmt.stmts) and never_completes(stmt.stmts[-1])
+    if kind is If:
+        return (stmt.else_branch is not None and never_completes(stmt.then_branch)
+                and never_completes(stmt.else_branch))
+    if kind is While or kind is For:
+        forever = stmt.cond is None or (number(stmt.cond) and bool(stmt.cond.value))
+        return forever and not any(type(n) is Return for n in walk(stmt.body))
+    return False
+
+def count_nodes(node) -> int:
+    # same count as walk() gives, without building a child list per node
+    n = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        n += 1
+        for name, is_list in child_fields(type(node)):
+            value = getattr(node, name)
+            if is_list:
+                stack.extend(value)
+            elif value is not None:
+                stack.append(value)
+    return n
+
+class Optimizer(Transformer):
+    # statement methods return None to drop the statement, the parent puts an
+    # empty block in where a statement has to be
+    prefix = "opt_"
+    # run hoist.py after the rest (off to measure what it's worth)
+    hoist = True
+
+    def __init__(self, inline_size: int = DEFAULT_SIZE, resolution=None):
+        # the program's structure.Resolution, items are added as they go by.
+        # pass the same one to the backend after and it doesn't resolve again
+        self.resolution = Resolution() if resolution is None else resolution
+        self.folded = 0
+        self.simplified = 0
+        self.pruned = 0
+        self.dropped = 0
+        self.nodes = 0
+        self.removed = 0
+        self.hoister = Hoister()
+        self.inliner = Inliner(inline_size)
+
+    def optimize(self, node: Node) -> Node:
+        # node is a Program or one top level item. items go through one at a time, in
+        # order, so the inliner has seen the functions above each one
+        if type(node) is Program:
+            node.declarations = [self.optimize(decl) for decl in node.declarations]
+            return node
+        # a pass that changed the item has it bound again, for the new nodes in it
+        resolution = self.resolution.add(node)
+        sites = len(self.inliner.sites)
+        node = self.inliner.run(node, resolution)
+        if len(self.inliner.sites) != sites:
+            resolution.rebind(node)
+        changes = self.changes()
+        before = count_nodes(node)
+        item, node = node, self.visit(node)
+        self.nodes += before
+        self.removed += before - count_nodes(node)
+        if self.changes() != changes:
+            resolution.rebind(item, node)
+        if self.hoist:
+            changes = self.hoister.hoisted + self.hoister.reused
+            node = self.hoister.run(node, resolution)
+            if self.hoister.hoisted + self.hoister.reused != changes:
+                resolution.rebind(node)
+        self.inliner.learn(node, resolution)
+        return node
+
+    def changes(self) -> int:
+        return self.folded + self.simplified + self.pruned + self.dropped
+
+    def report(self) -> str:
+        return (f"-O: removed {self.removed} of {self.nodes} nodes ({self.folded} folded,"
+                f" {self.simplified} simplified, {self.pruned} branches / loops pruned,"
+                f" {self.dropped} dead statements dropped), {self.hoister.hoisted} loop invariant"
+                f" expressions hoisted, {self.hoister.reused} repeated ones reused,"
+                f" {len(self.inliner.sites)} calls inlined")
+
+    @staticmethod
+    def block(stmt, node: Node) -> Node:
+        return Compound([], pos=node.pos) if stmt is None else stmt
+
+    # statements
+    def opt_Function(self, node: Function):
+        node.body = self.block((yield node.body), node)
+        return node
+
+    def opt_Compound(self, node: Compound):
+        stmts = []
+        for stmt in node.stmts:
+            stmt = yield stmt
+            if stmt is None:
+                continue
+            if type(stmt) is Compound:
+                # c block scopes mean nothing to the python either backend writes
+                stmts.extend(stmt.stmts)
+            else:
+                stmts.append(stmt)
+        for i, stmt in enumerate(stmts):
+            if never_completes(stmt) and i + 1 < len(stmts):
+                self.dropped += len(stmts) - i - 1
+                del stmts[i + 1:]
+                break
+        node.stmts = stmts
+        return node
+
+    def opt_ExprStmt(self, node: ExprStmt):
+        if node.expr is None:
+            return None
+        node.expr = expr = yield node.expr
+        if pure(expr) or (type(expr) is Assignment and type(expr.target) is Var
+                          and type(expr.value) is Var and expr.target.name == expr.value.name):
+            self.dropped += 1
+            return None
+        return node
+
+    def opt_If(self, node: If):
+        node.cond = yield node.cond
+        then_branch = yield node.then_branch
+        else_branch = yield node.else_branch
+        if number(node.cond):
+            self.pruned += 1
+            return then_branch if node.cond.value else else_branch
+        if type(else_branch) is Compound and not else_branch.stmts:
+            else_branch = None
+        if else_branch is None and (then_branch is None or type(then_branch) is Compound
+                                    and not then_branch.stmts) and pure(node.cond):
+            self.pruned += 1
+            return None
+        node.then_branch = self.block(then_branch, node)
+        node.else_branch = else_branch
+        return node
+
+    def opt_While(self, node: While):
+        node.cond = yield node.cond
+        if number(node.cond) and not node.cond.value:
+            self.pruned += 1
+            return None
+        node.body = self.block((yield node.body), node)
+        return node
+
+    def opt_For(self, node: For):
+        node.init = yield node.init
+        node.cond = yield node.cond
+        if node.cond is not None and number(node.cond):
+            if not node.cond.value:
+                # only the init part ever runs
+                self.pruned += 1
+                if node.init is None or type(node.init) is Declaration:
+                    return node.init
+                return None if pure(node.init) else ExprStmt(node.init, pos=node.pos)
+            node.cond = None
+        node.post = yield node.post
+        node.body = self.block((yield node.body), node)
+        return node
+
+    # expressions
+    def opt_Unary(self, node: Unary):
+        node.operand = operand = yield node.operand
+        fold = FOLD_UNARY.get(node.op)
+        if fold is not None and number(operand):
+            try:
+                value = fold(operand.value)
+            except (ArithmeticError, TypeError):
+                return node
+            self.folded += 1
+            return Literal(value, pos=node.pos)
+        return node
+
+    def opt_Binary(self, node: Binary):
+        node.left = left = yield node.left
+        node.right = right = yield node.right
+        op = node.op
+        if op == '?:':
+            if number(left):
+                self.simplified += 1
+                return right.left if left.value else right.right
+            return node
+        if number(left) and number(right):
+            fold = FOLD.get(op)
+            if fold is None:
+                # && / || are 0 or 1, like c (and the ast backend)
+                if op == '&&':
+                    fold = lambda a, b: int(bool(a and b))
+                elif op == '||':
+                    fold = lambda a, b: int(bool(a or b))
+                else:
+                    return node
+            if op in ('<<', '>>') and not 0 <= right.value <= MAX_SHIFT:
+                return node
+            try:
+                value = fold(left.value, right.value)
+            except (ArithmeticError, TypeError, ValueError):
+                return node
+            self.folded += 1
+            return Literal(value, pos=node.pos)
+        if number(left) and op in ('&&', '||'):
+            # 1 && x is x != 0, 0 && x is 0, 0 || x is x != 0, 1 || x is 1
+            self.simplified += 1
+            if bool(left.value) == (op == '&&'):
+                return Binary(op='!=', left=right, right=Literal(0, pos=node.pos), pos=node.pos)
+            return Literal(int(bool(left.value)), pos=node.pos)
+        if number(right) and (op, right.value) in RIGHT_IDENTITY and type(right.value) is int:
+            self.simplified += 1
+            return left
+        if number(left) and (op, left.value) in LEFT_IDENTITY and type(left.value) is int:
+            self.simplified += 1
+            return right
+        return node
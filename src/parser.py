@@ -1,145 +1,226 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from itertools import islice
 from typing import List, Optional, Any, Tuple
-from lexer import Tokens as Token
+from lexer import Token
+from tokenbuf import KIND, TOKEN_TYPES
 
 # ast data classes
-@dataclass
+# slots=True: no per node __dict__, a big program's tree is a lot smaller
+@dataclass(slots=True)
 class Node:
-    pass
+    # offset of the node's first token in the source (-1 if not known). keyword only
+    # and left out of == / repr, so building and comparing trees works like before
+    pos: int = field(default=-1, kw_only=True, compare=False, repr=False)
 
-@dataclass
+@dataclass(slots=True)
 class Program(Node):
     declarations: List[Node]
 
-@dataclass
+@dataclass(slots=True)
 class Function(Node):
     ret_type: str
     name: str
     params: List[Tuple[str, str]]
     body: Node
 
-@dataclass
+@dataclass(slots=True)
 class Declaration(Node):
     var_type: str
     name: str
     initializer: Optional[Node]
 
-@dataclass
+@dataclass(slots=True)
 class Compound(Node):
     stmts: List[Node]
 
-@dataclass
+@dataclass(slots=True)
 class If(Node):
     cond: Node
     then_branch: Node
     else_branch: Optional[Node]
 
-@dataclass
+@dataclass(slots=True)
 class While(Node):
     cond: Node
     body: Node
 
-@dataclass
+@dataclass(slots=True)
 class For(Node):
     init: Optional[Node]
     cond: Optional[Node]
     post: Optional[Node]
     body: Node
 
-@dataclass
+@dataclass(slots=True)
 class Return(Node):
     expr: Optional[Node]
 
-@dataclass
+@dataclass(slots=True)
 class ExprStmt(Node):
     expr: Optional[Node]
 
-@dataclass
+@dataclass(slots=True)
 class Binary(Node):
     op: str
     left: Node
     right: Node
 
-@dataclass
+@dataclass(slots=True)
 class Unary(Node):
     op: str
     operand: Node
     prefix: bool = True
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Node):
     value: Any
 
-@dataclass
+@dataclass(slots=True)
 class Var(Node):
     name: str
 
-@dataclass
+@dataclass(slots=True)
 class Assignment(Node):
     target: Node
     value: Node
 
-@dataclass
+@dataclass(slots=True)
 class Call(Node):
     callee: Node
     args: List[Node]
 
-@dataclass
+@dataclass(slots=True)
 class ArrayAccess(Node):
     array: Node
     index: Node
 
+# token types the parser never looks at
+IGNORED = ('UNKNOWN', 'COMMENT_MULTI', 'COMMENT_LINE')
+IGNORED_KINDS = frozenset(KIND[name] for name in IGNORED)
+# tokens a declaration (or a function / parameter) starts with
+TYPE_TOKENS = ('INT', 'CHAR', 'VOID', 'FLOAT', 'DOUBLE', 'LONG', 'SHORT', 'SIGNED', 'UNSIGNED', 'STRUCT', 'UNION', 'ENUM', 'BOOLEAN')
+
+# binary operators for the precedence climbing expression parser:
+# token type -> (precedence, op). higher binds tighter, all left associative.
+# same levels as the parse_logical_or ... parse_multiplicative cascade below
+BINARY_OPS = {
+    'OR': (1, '||'),
+    'AND': (2, '&&'),
+    'BITOR': (3, '|'),
+    'XOR': (4, '^'),
+    'BITAND': (5, '&'),
+    'EQ': (6, '=='), 'NE': (6, '!='),
+    'LT': (7, '<'), 'GT': (7, '>'), 'LE': (7, '<='), 'GE': (7, '>='),
+    'LSHIFT': (8, '<<'), 'RSHIFT': (8, '>>'),
+    'PLUS': (9, '+'), 'MINUS': (9, '-'),
+    'MULTIPLY': (10, '*'), 'DIVIDE': (10, '/'), 'MODULO': (10, '%'),
+}
+
+PREFIX_OPS = {
+    'PLUS': '+', 'MINUS': '-', 'NOT': '!', 'TILDE': '~',
+    'INCREMENT': '++', 'DECREMENT': '--',
+}
+
 # parser
 class Parser:
-    def __init__(self, tokens, var=None):
+    # how many tokens to pull at a time when reading from a stream
+    STREAM_CHUNK = 1024
+
+    def __init__(self, tokens, var=None, cascade=False):
         self.var = var
+        # cascade=True uses the old one-method-per-precedence-level expression parser
+        self.cascade = cascade
+        self.stream = None
+        # token types are read as small ints (tokenbuf.KIND), a TokenBuffer's kinds
+        # array is used as it is. its comments and unknown chars stay in the buffer and
+        # are stepped over as the parser moves, anything else is filtered once here
+        self.ignored = ()
+        if not hasattr(tokens, '__getitem__'):
+            # generator / iterator: keep a small window and pull more as we go
+            self.stream = (tok for tok in tokens if tok[0] not in IGNORED)
+            tokens = []
+            self.types = []
+        elif hasattr(tokens, 'kinds'):
+            self.types = tokens.kinds
+            self.ignored = IGNORED_KINDS
+        else:
+            tokens = [tok for tok in tokens if tok[0] not in IGNORED]
+            self.types = [KIND[tok[0]] for tok in tokens]
         self.tokens = tokens
         self.i = 0
+        self.n = len(tokens)
+
+    def refill(self) -> bool:
+        # only does anything for streams. tokens before self.i are never looked at again,
+        # so they get dropped and the window only ever holds about one chunk
+        if self.stream is None:
+            return False
+        chunk = list(islice(self.stream, self.STREAM_CHUNK))
+        if not chunk:
+            self.stream = None
+            return False
+        del self.tokens[:self.i]
+        del self.types[:self.i]
+        self.tokens.extend(chunk)
+        self.types.extend(KIND[tok[0]] for tok in chunk)
+        self.i = 0
+        self.n = len(self.tokens)
+        return True
 
-    def skip_ignored(self):
-        while self.i < len(self.tokens):
-            tok_type = self.tokens[self.i][0]
-            if tok_type in ('UNKNOWN', 'COMMENT_MULTI', 'COMMENT_LINE'):
-                self.i += 1
-            else:
-                break
+    def skip_ignored(self) -> bool:
+        # moves self.i onto the next token the parser looks at, False at the end.
+        # peek_type / peek / advance only get here off their fast path
+        while True:
+            if self.i >= self.n and not self.refill():
+                return False
+            if self.types[self.i] not in self.ignored:
+                return True
+            self.i += 1
 
     def peek(self) -> Token:
-        self.skip_ignored()
-        if self.i >= len(self.tokens):
+        if not (self.i < self.n and self.types[self.i] not in self.ignored) and not self.skip_ignored():
             return ('EOF', 'EOF', -1)  # Adjust to match token format (type, value, pos)
         return self.tokens[self.i]
 
     def advance(self) -> Token:
-        self.skip_ignored()
-        if self.i >= len(self.tokens):
+        if not (self.i < self.n and self.types[self.i] not in self.ignored) and not self.skip_ignored():
             return ('EOF', 'EOF', -1)
         tok = self.tokens[self.i]
         self.i += 1
         return tok
 
+    def peek_type(self) -> str:
+        # peek()[0] without building the token
+        i = self.i
+        if i < self.n and self.types[i] not in self.ignored:
+            return TOKEN_TYPES[self.types[i]]
+        if not self.skip_ignored():
+            return 'EOF'
+        return TOKEN_TYPES[self.types[self.i]]
+
     def expect(self, type_name: str) -> Token:
-        tok = self.peek()
-        if tok[0] == type_name:
+        if self.peek_type() == type_name:
             return self.advance()
+        tok = self.peek()
         raise SyntaxError(f"Expected {type_name} at pos {tok[2]}, got {tok[0]} ({tok[1]!r})")
 
     def accept(self, type_name: str) -> Optional[Token]:
-        tok = self.peek()
-        if tok[0] == type_name:
+        if self.peek_type() == type_name:
             return self.advance()
         return None
 
     # top level
     def parse_program(self) -> Program:
-        decls = []
-        while self.peek()[0] != 'EOF':
-            decls.append(self.parse_external())
-        return Program(decls)
+        return Program(list(self.iter_program()), pos=0)
+
+    def iter_program(self):
+        # hands out each top level function / declaration as soon as it's parsed
+        while self.peek_type() != 'EOF':
+            yield self.parse_external()
 
     def parse_external(self) -> Node:
         t = self.peek()
-        if t[0] in ('INT','CHAR','VOID','FLOAT','DOUBLE','LONG','SHORT','SIGNED','UNSIGNED','STRUCT','UNION','ENUM','BOOLEAN'):
+        if t[0] in TYPE_TOKENS:
             typ = self.advance()[1]
             idtok = self.expect('IDENTIFIER')
             name = idtok[1]
@@ -148,7 +229,7 @@ def parse_external(self) -> Node:
                 if not self.accept('RPAREN'):
                     while True:
                         ptype_tok = self.peek()
-                        if ptype_tok[0] not in ('INT','CHAR','VOID','FLOAT','DOUBLE','LONG','SHORT','SIGNED','UNSIGNED','STRUCT','UNION','ENUM','BOOLEAN'):
+                        if ptype_tok[0] not in TYPE_TOKENS:
                             raise SyntaxError(f"Expected type in parameter list at pos {ptype_tok[2]} got {ptype_tok[0]}")
                         ptype = self.advance()[1]
                         pname_tok = self.expect('IDENTIFIER')
@@ -161,20 +242,31 @@ def parse_external(self) -> Node:
                 # function body or prototype
                 if self.peek()[0] == 'LBRACE':
                     body = self.parse_compound()
-                    return Function(ret_type=typ, name=name, params=params, body=body)
+                    return Function(ret_type=typ, name=name, params=params, body=body, pos=t[2])
                 else:
                     self.expect('SEMICOLON')
-                    return Declaration(var_type=f"{typ} (func prototype)", name=name, initializer=None)
+                    return Declaration(var_type=f"{typ} (func prototype)", name=name, initializer=None, pos=t[2])
             else:
                 # variable declaration
+                typ = self.array_suffix(typ)
                 init = None
                 if self.accept('ASSIGN'):
                     init = self.parse_expression()
                 self.expect('SEMICOLON')
-                return Declaration(var_type=typ, name=name, initializer=init)
+                return Declaration(var_type=typ, name=name, initializer=init, pos=t[2])
         else:
             raise SyntaxError(f"Unexpected token at top-level: {t}")
 
+    def array_suffix(self, typ: str) -> str:
+        # `int a[100]` is a Declaration of type "int[100]" (typed.py), fixed size only
+        if not self.accept('LBRACKET'):
+            return typ
+        size = self.expect('INT_LITERAL')
+        self.expect('RBRACKET')
+        if self.peek()[0] == 'ASSIGN':
+            raise SyntaxError(f"Array initializers aren't supported at pos {size[2]}")
+        return f"{typ}[{int(size[1])}]"
+
     # statements
     def parse_statement(self) -> Node:
         t = self.peek()
@@ -189,26 +281,27 @@ def parse_statement(self) -> Node:
             else_branch = None
             if self.accept('ELSE'):
                 else_branch = self.parse_statement()
-            return If(cond=cond, then_branch=then_branch, else_branch=else_branch)
+            return If(cond=cond, then_branch=then_branch, else_branch=else_branch, pos=t[2])
         if t[0] == 'WHILE':
             self.advance()
             self.expect('LPAREN')
             cond = self.parse_expression()
             self.expect('RPAREN')
             body = self.parse_statement()
-            return While(cond=cond, body=body)
+            return While(cond=cond, body=body, pos=t[2])
         if t[0] == 'FOR':
             self.advance()
             self.expect('LPAREN')
             init = None
             if self.peek()[0] != 'SEMICOLON':
                 # could be declaration or expression
-                if self.peek()[0] in ('INT','CHAR','VOID','FLOAT','DOUBLE','LONG','SHORT','SIGNED','UNSIGNED','STRUCT','UNION','ENUM','BOOLEAN'):
+                if self.peek()[0] in TYPE_TOKENS:
                     # local declaration
-                    typ = self.advance()[1]
+                    typtok = self.advance()
+                    typ = typtok[1]
                     idtok = self.expect('IDENTIFIER')
                     name = idtok[1]
-                    init = Declaration(var_type=typ, name=name, initializer=None)
+                    init = Declaration(var_type=typ, name=name, initializer=None, pos=typtok[2])
                     if self.accept('ASSIGN'):
                         init.initializer = self.parse_expression()
                 else:
@@ -223,47 +316,94 @@ def parse_statement(self) -> Node:
                 post = self.parse_expression()
             self.expect('RPAREN')
             body = self.parse_statement()
-            return For(init=init, cond=cond, post=post, body=body)
+            return For(init=init, cond=cond, post=post, body=body, pos=t[2])
         if t[0] == 'RETURN':
             self.advance()
             expr = None
             if self.peek()[0] != 'SEMICOLON':
                 expr = self.parse_expression()
             self.expect('SEMICOLON')
-            return Return(expr=expr)
+            return Return(expr=expr, pos=t[2])
         # local declaration
-        if t[0] in ('INT','CHAR','VOID','FLOAT','DOUBLE','LONG','SHORT','SIGNED','UNSIGNED','STRUCT','UNION','ENUM','BOOLEAN'):
+        if t[0] in TYPE_TOKENS:
             typ = self.advance()[1]
             idtok = self.expect('IDENTIFIER')
             name = idtok[1]
+            typ = self.array_suffix(typ)
             init = None
             if self.accept('ASSIGN'):
                 init = self.parse_expression()
             self.expect('SEMICOLON')
-            return Declaration(var_type=typ, name=name, initializer=init)
+            return Declaration(var_type=typ, name=name, initializer=init, pos=t[2])
         # expression statement
         expr = None
         if self.peek()[0] != 'SEMICOLON':
             expr = self.parse_expression()
         self.expect('SEMICOLON')
-        return ExprStmt(expr=expr)
+        return ExprStmt(expr=expr, pos=t[2])
 
     def parse_compound(self) -> Compound:
-        self.expect('LBRACE')
+        lbrace = self.expect('LBRACE')
         stmts = []
         while self.peek()[0] != 'RBRACE':
             stmts.append(self.parse_statement())
         self.expect('RBRACE')
-        return Compound(stmts=stmts)
+        return Compound(stmts=stmts, pos=lbrace[2])
 
     def parse_expression(self) -> Node:
-        return self.parse_assignment()
+        if self.cascade:
+            return self.parse_assignment()
+        node = self.parse_ternary()
+        if self.peek_type() == 'ASSIGN':
+            self.i += 1
+            return Assignment(target=node, value=self.parse_expression(), pos=node.pos)
+        return node
+
+    # precedence climbing, builds the same trees as the cascade below with a
+    # table lookup per operator instead of a failed accept() per level
+    def parse_ternary(self) -> Node:
+        node = self.parse_binary(1)
+        if self.peek_type() == 'QUESTION':
+            self.i += 1
+            true_expr = self.parse_expression()
+            self.expect('COLON')
+            false_expr = self.parse_ternary()  # right associative
+            return Binary(op='?:', left=node, right=Binary(op='branch', left=true_expr, right=false_expr, pos=true_expr.pos), pos=node.pos)
+        return node
+
+    def parse_binary(self, min_prec: int) -> Node:
+        node = self.parse_prefix()
+        binary_ops = BINARY_OPS
+        while True:
+            op = binary_ops.get(self.peek_type())
+            if op is None or op[0] < min_prec:
+                return node
+            self.i += 1
+            rhs = self.parse_binary(op[0] + 1)
+            node = Binary(op=op[1], left=node, right=rhs, pos=node.pos)
+
+    def parse_prefix(self) -> Node:
+        if self.peek_type() not in PREFIX_OPS:
+            return self.parse_postfix()
+        ops = []
+        while True:
+            op = PREFIX_OPS.get(self.peek_type())
+            if op is None:
+                break
+            ops.append((op, self.tokens[self.i][2]))
+            self.i += 1
+        node = self.parse_postfix()
+        for op, pos in reversed(ops):
+            node = Unary(op=op, operand=node, prefix=True, pos=pos)
+        return node
+
+    # old recursive cascade, one method per precedence level (Parser(cascade=True))
 
     def parse_assignment(self) -> Node:
         node = self.parse_conditional()
         if self.accept('ASSIGN'):
             rhs = self.parse_assignment()
-            return Assignment(target=node, value=rhs)
+            return Assignment(target=node, value=rhs, pos=node.pos)
         return node
 
     def parse_conditional(self) -> Node:
@@ -272,42 +412,42 @@ def parse_conditional(self) -> Node:
             true_expr = self.parse_expression()
             self.expect('COLON')
             false_expr = self.parse_conditional()  # right associative
-            return Binary(op='?:', left=node, right=Binary(op='branch', left=true_expr, right=false_expr))
+            return Binary(op='?:', left=node, right=Binary(op='branch', left=true_expr, right=false_expr, pos=true_expr.pos), pos=node.pos)
         return node
 
     def parse_logical_or(self) -> Node:
         node = self.parse_logical_and()
         while self.accept('OR'):
             rhs = self.parse_logical_and()
-            node = Binary(op='||', left=node, right=rhs)
+            node = Binary(op='||', left=node, right=rhs, pos=node.pos)
         return node
 
     def parse_logical_and(self) -> Node:
         node = self.parse_bitwise_or()
         while self.accept('AND'):
             rhs = self.parse_bitwise_or()
-            node = Binary(op='&&', left=node, right=rhs)
+            node = Binary(op='&&', left=node, right=rhs, pos=node.pos)
         return node
 
     def parse_bitwise_or(self) -> Node:
         node = self.parse_bitwise_xor()
         while self.accept('BITOR'):
             rhs = self.parse_bitwise_xor()
-            node = Binary(op='|', left=node, right=rhs)
+            node = Binary(op='|', left=node, right=rhs, pos=node.pos)
         return node
 
     def parse_bitwise_xor(self) -> Node:
         node = self.parse_bitwise_and()
         while self.accept('XOR'):
             rhs = self.parse_bitwise_and()
-            node = Binary(op='^', left=node, right=rhs)
+            node = Binary(op='^', left=node, right=rhs, pos=node.pos)
         return node
 
     def parse_bitwise_and(self) -> Node:
         node = self.parse_equality()
         while self.accept('BITAND'):
             rhs = self.parse_equality()
-            node = Binary(op='&', left=node, right=rhs)
+            node = Binary(op='&', left=node, right=rhs, pos=node.pos)
         return node
 
     def parse_equality(self) -> Node:
@@ -315,10 +455,10 @@ def parse_equality(self) -> Node:
         while True:
             if self.accept('EQ'):
                 rhs = self.parse_relational()
-                node = Binary(op='==', left=node, right=rhs)
+                node = Binary(op='==', left=node, right=rhs, pos=node.pos)
             elif self.accept('NE'):
                 rhs = self.parse_relational()
-                node = Binary(op='!=', left=node, right=rhs)
+                node = Binary(op='!=', left=node, right=rhs, pos=node.pos)
             else:
                 break
         return node
@@ -328,16 +468,16 @@ def parse_relational(self) -> Node:
         while True:
             if self.accept('LT'):
                 rhs = self.parse_shifts()
-                node = Binary(op='<', left=node, right=rhs)
+                node = Binary(op='<', left=node, right=rhs, pos=node.pos)
             elif self.accept('GT'):
                 rhs = self.parse_shifts()
-                node = Binary(op='>', left=node, right=rhs)
+                node = Binary(op='>', left=node, right=rhs, pos=node.pos)
             elif self.accept('LE'):
                 rhs = self.parse_shifts()
-                node = Binary(op='<=', left=node, right=rhs)
+                node = Binary(op='<=', left=node, right=rhs, pos=node.pos)
             elif self.accept('GE'):
                 rhs = self.parse_shifts()
-                node = Binary(op='>=', left=node, right=rhs)
+                node = Binary(op='>=', left=node, right=rhs, pos=node.pos)
             else:
                 break
         return node
@@ -347,10 +487,10 @@ def parse_shifts(self) -> Node:
         while True:
             if self.accept('LSHIFT'):
                 rhs = self.parse_additive()
-                node = Binary(op='<<', left=node, right=rhs)
+                node = Binary(op='<<', left=node, right=rhs, pos=node.pos)
             elif self.accept('RSHIFT'):
                 rhs = self.parse_additive()
-                node = Binary(op='>>', left=node, right=rhs)
+                node = Binary(op='>>', left=node, right=rhs, pos=node.pos)
             else:
                 break
         return node
@@ -360,10 +500,10 @@ def parse_additive(self) -> Node:
         while True:
             if self.accept('PLUS'):
                 rhs = self.parse_multiplicative()
-                node = Binary(op='+', left=node, right=rhs)
+                node = Binary(op='+', left=node, right=rhs, pos=node.pos)
             elif self.accept('MINUS'):
                 rhs = self.parse_multiplicative()
-                node = Binary(op='-', left=node, right=rhs)
+                node = Binary(op='-', left=node, right=rhs, pos=node.pos)
             else:
                 break
         return node
@@ -373,36 +513,39 @@ def parse_multiplicative(self) -> Node:
         while True:
             if self.accept('MULTIPLY'):
                 rhs = self.parse_unary()
-                node = Binary(op='*', left=node, right=rhs)
+                node = Binary(op='*', left=node, right=rhs, pos=node.pos)
             elif self.accept('DIVIDE'):
                 rhs = self.parse_unary()
-                node = Binary(op='/', left=node, right=rhs)
+                node = Binary(op='/', left=node, right=rhs, pos=node.pos)
             elif self.accept('MODULO'):
                 rhs = self.parse_unary()
-                node = Binary(op='%', left=node, right=rhs)
+                node = Binary(op='%', left=node, right=rhs, pos=node.pos)
             else:
                 break
         return node
 
     def parse_unary(self) -> Node:
+        pos = self.peek()[2]
         if self.accept('PLUS'):
-            return Unary(op='+', operand=self.parse_unary(), prefix=True)
+            return Unary(op='+', operand=self.parse_unary(), prefix=True, pos=pos)
         if self.accept('MINUS'):
-            return Unary(op='-', operand=self.parse_unary(), prefix=True)
+            return Unary(op='-', operand=self.parse_unary(), prefix=True, pos=pos)
         if self.accept('NOT'):
-            return Unary(op='!', operand=self.parse_unary(), prefix=True)
+            return Unary(op='!', operand=self.parse_unary(), prefix=True, pos=pos)
         if self.accept('TILDE'):
-            return Unary(op='~', operand=self.parse_unary(), prefix=True)
+            return Unary(op='~', operand=self.parse_unary(), prefix=True, pos=pos)
         if self.accept('INCREMENT'):
-            return Unary(op='++', operand=self.parse_unary(), prefix=True)
+            return Unary(op='++', operand=self.parse_unary(), prefix=True, pos=pos)
         if self.accept('DECREMENT'):
-            return Unary(op='--', operand=self.parse_unary(), prefix=True)
+            return Unary(op='--', operand=self.parse_unary(), prefix=True, pos=pos)
         return self.parse_postfix()
 
     def parse_postfix(self) -> Node:
         node = self.parse_primary()
         while True:
-            if self.accept('LPAREN'):
+            kind = self.peek_type()
+            if kind == 'LPAREN':
+                self.i += 1
                 args = []
                 if not self.accept('RPAREN'):
                     while True:
@@ -411,15 +554,18 @@ def parse_postfix(self) -> Node:
                             continue
                         self.expect('RPAREN')
                         break
-                node = Call(callee=node, args=args)
-            elif self.accept('LBRACKET'):
+                node = Call(callee=node, args=args, pos=node.pos)
+            elif kind == 'LBRACKET':
+                self.i += 1
                 idx = self.parse_expression()
                 self.expect('RBRACKET')
-                node = ArrayAccess(array=node, index=idx)
-            elif self.accept('INCREMENT'):
-                node = Unary(op='++', operand=node, prefix=False)
-            elif self.accept('DECREMENT'):
-                node = Unary(op='--', operand=node, prefix=False)
+                node = ArrayAccess(array=node, index=idx, pos=node.pos)
+            elif kind == 'INCREMENT':
+                self.i += 1
+                node = Unary(op='++', operand=node, prefix=False, pos=node.pos)
+            elif kind == 'DECREMENT':
+                self.i += 1
+                node = Unary(op='--', operand=node, prefix=False, pos=node.pos)
             else:
                 break
         return node
@@ -427,30 +573,30 @@ def parse_postfix(self) -> Node:
     def parse_primary(self) -> Node:
         tok = self.peek()
         if tok[0] == 'IDENTIFIER':
-            self.advance()
-            return Var(name=tok[1])
+            self.i += 1
+            return Var(name=tok[1], pos=tok[2])
+        if tok[0] == 'INT_LITERAL':
+            self.i += 1
+            return Literal(value=int(tok[1]), pos=tok[2])
         if tok[0] == 'STRING_LITERAL':
             self.advance()
-            return Literal(value=tok[1])
+            return Literal(value=tok[1], pos=tok[2])
         if tok[0] == 'CHAR_LITERAL':
             self.advance()
-            return Literal(value=tok[1])
+            return Literal(value=tok[1], pos=tok[2])
         if tok[0] == 'FLOAT_LITERAL':
             self.advance()
             try:
                 val = float(tok[1])
             except:
                 val = tok[1]
-            return Literal(value=val)
+            return Literal(value=val, pos=tok[2])
         if tok[0] == 'HEX_LITERAL':
             self.advance()
-            return Literal(value=int(tok[1], 16))
+            return Literal(value=int(tok[1], 16), pos=tok[2])
         if tok[0] == 'BIN_LITERAL':
             self.advance()
-            return Literal(value=int(tok[1], 2))
-        if tok[0] == 'INT_LITERAL':
-            self.advance()
-            return Literal(value=int(tok[1]))
+            return Literal(value=int(tok[1], 2), pos=tok[2])
         if tok[0] == 'LPAREN':
             self.advance()
             e = self.parse_expression()
@@ -458,75 +604,16 @@ def parse_primary(self) -> Node:
             return e
         raise SyntaxError(f"Unexpected token in expression at pos {tok[2]}: {tok}")
 
-# pretty printer for ast
+# pretty printer for ast, the printer itself lives in astdump (it needs visitor, which imports us).
+# astdump.pretty_to writes straight into a file / stream instead of building the string
 def pretty(node: Node, indent: int = 0) -> str:
-    pad = '  ' * indent
-    if isinstance(node, Program):
-        s = pad + "Program:\n"
-        for d in node.declarations:
-            s += pretty(d, indent+1)
-        return s
-    if isinstance(node, Function):
-        s = pad + f"Function: {node.ret_type} {node.name}({', '.join(t+' '+n for t,n in node.params)})\n"
-        s += pretty(node.body, indent+1)
-        return s
-    if isinstance(node, Declaration):
-        s = pad + f"Declaration: {node.var_type} {node.name}"
-        if node.initializer:
-            s += " =\n" + pretty(node.initializer, indent+1)
-        else:
-            s += "\n"
-        return s
-    if isinstance(node, Compound):
-        s = pad + "Compound:\n"
-        for st in node.stmts:
-            s += pretty(st, indent+1)
-        return s
-    if isinstance(node, If):
-        s = pad + "If:\n"
-        s += pad + "  Cond:\n" + pretty(node.cond, indent+2)
-        s += pad + "  Then:\n" + pretty(node.then_branch, indent+2)
-        if node.else_branch:
-            s += pad + "  Else:\n" + pretty(node.else_branch, indent+2)
-        return s
-    if isinstance(node, While):
-        return pad + "While:\n" + pad + "  Cond:\n" + pretty(node.cond, indent+2) + pad + "  Body:\n" + pretty(node.body, indent+2)
-    if isinstance(node, For):
-        s = pad + "For:\n"
-        s += pad + "  Init:\n" + (pretty(node.init, indent+2) if node.init else pad + "    <none>\n")
-        s += pad + "  Cond:\n" + (pretty(node.cond, indent+2) if node.cond else pad + "    <none>\n")
-        s += pad + "  Post:\n" + (pretty(node.post, indent+2) if node.post else pad + "    <none>\n")
-        s += pad + "  Body:\n" + pretty(node.body, indent+2)
-        return s
-    if isinstance(node, Return):
-        return pad + "Return:\n" + (pretty(node.expr, indent+1) if node.expr else pad + "  <none>\n")
-    if isinstance(node, ExprStmt):
-        return pad + "ExprStmt:\n" + (pretty(node.expr, indent+1) if node.expr else pad + "  <none>\n")
-    if isinstance(node, Binary):
-        return pad + f"Binary({node.op}):\n" + pretty(node.left, indent+1) + pretty(node.right, indent+1)
-    if isinstance(node, Unary):
-        return pad + f"Unary({'prefix' if node.prefix else 'postfix'} {node.op}):\n" + pretty(node.operand, indent+1)
-    if isinstance(node, Literal):
-        return pad + f"Literal({node.value})\n"
-    if isinstance(node, Var):
-        return pad + f"Var({node.name})\n"
-    if isinstance(node, Assignment):
-        return pad + "Assignment:\n" + pretty(node.target, indent+1) + pretty(node.value, indent+1)
-    if isinstance(node, Call):
-        s = pad + "Call:\n" + pretty(node.callee, indent+1)
-        for a in node.args:
-            s += pretty(a, indent+1)
-        return s
-    if isinstance(node, ArrayAccess):
-        return pad + "ArrayAccess:\n" + pretty(node.array, indent+1) + pretty(node.index, indent+1)
-    return pad + f"UnknownNode:{node}\n"
+    from astdump import pretty_string
+    if node is None:
+        return '  ' * indent + "UnknownNode:None\n"
+    return pretty_string(node, indent)
 
 # example use
 def main(tokens):
     p = Parser(tokens)
     ast = p.parse_program()
     print(pretty(ast))
-
-
-
-
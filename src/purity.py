@@ -0,0 +1,58 @@
+from parser import *
+from visitor import walk
+from loops import INT_TYPES
+
+# functions whose result depends on nothing but their arguments, which both
+# backends wrap in a bounded functools.lru_cache (runtime._memo). fib-style
+# recursion goes from exponential to linear that way.
+#
+# a function is pure when it
+#   - only reads / writes its parameters and locals (no globals at all: reading
+#     one that something else changes would make a cached result stale)
+#   - doesn't index anything (no a[i] = x, and an array argument would be a
+#     python list, which lru_cache can't hash). indexing a string literal is fine
+#   - only calls itself and other pure functions, never printf / puts / ...
+#   - takes scalar parameters only
+#
+# one with no loop and no call is cheaper to run than to look up, it only gets
+# @_pure (runtime._pure), which marks it for its callers without a cache.
+#
+# whether a callee is pure is only known once it's defined, and codegen works
+# one top level item at a time (split.py and incremental.py generate items on
+# their own), so that part is left to runtime._memo: it gets the names of the
+# other functions called and only caches when every one of them is already
+# marked pure in the module's globals. a callee defined further down isn't
+# there yet and the function stays plain, same as the inliner only going by
+# functions above the caller.
+
+DEFAULT_MEMO_SIZE = 1024
+SCALAR_TYPES = INT_TYPES | {'float', 'double'}
+
+def pure_calls(fn: Function, resolution):
+    # None if fn isn't pure, else (the other functions it calls, sorted, and
+    # whether it has a loop or a call, i.e. is worth caching). resolution is
+    # the program's structure.Resolution, fn added to it
+    if not all(typ in SCALAR_TYPES for typ, _ in fn.params):
+        return None
+    # walk has a Call before its callee Var, which then isn't a read of a global
+    called = {fn.name}
+    costly = False
+    for n in walk(fn.body):
+        if isinstance(n, (While, For)):
+            costly = True
+        elif isinstance(n, Call):
+            if not isinstance(n.callee, Var):
+                return None
+            symbol = resolution.symbol(n)
+            if symbol is not None and (symbol.kind == 'builtin' or resolution.local(n)):
+                return None
+            called.add(n.callee.name)
+            costly = True
+        elif isinstance(n, Var):
+            if not resolution.local(n) and n.name not in called:
+                return None
+        elif isinstance(n, ArrayAccess):
+            # reads and writes
+            if not isinstance(n.array, Literal):
+                return None
+    return sorted(called - {fn.name}), costly
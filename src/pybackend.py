@@ -0,0 +1,528 @@
+import ast
+import builtins
+import importlib.util
+import marshal
+import os
+import re
+from bisect import bisect_right
+from parser import *
+from visitor import Visitor
+from loops import INT_TYPES, bound_names, range_loop, top_names
+from purity import DEFAULT_MEMO_SIZE, pure_calls
+from structure import Resolution
+import loops
+import typed
+import vectorize
+import runtime
+
+# second backend: lowers a Program straight to python ast nodes and compile()s
+# that, no source text in between. line numbers come from Node.pos, so a
+# traceback points at the .ctri line.
+#
+# mostly the same python as PythonCodeGen writes, except where that text isn't
+# valid python or isn't what the c means:
+#   &&, ||, !        and / or / not
+#   a ? b : c        b if a else c
+#   x++, ++x, x += 1 as statements, walrus in expressions (PythonCodeGen too now)
+#   "str", 'c'       the string's value (escapes decoded), the char's code
+#   prototypes       nothing (they'd set the function to None)
+#   globals          functions assigning to a top level variable get a global stmt
+#   pure functions   @_memo(memo_size, ...) / @_pure (purity.py), PythonCodeGen too
+#   element-wise     numpy operations with the loop as the fallback (vectorize.py), PythonCodeGen too
+#   int a / b        c's truncating division, arrays / bound globals (typed.py), PythonCodeGen too
+
+BIN_OPS = {
+    '+': ast.Add, '-': ast.Sub, '*': ast.Mult, '/': ast.Div, '%': ast.Mod,
+    '<<': ast.LShift, '>>': ast.RShift, '&': ast.BitAnd, '|': ast.BitOr, '^': ast.BitXor,
+}
+COMPARE_OPS = {
+    '==': ast.Eq, '!=': ast.NotEq, '<': ast.Lt, '>': ast.Gt, '<=': ast.LtE, '>=': ast.GtE,
+}
+BOOL_OPS = {'&&': ast.And, '||': ast.Or}
+UNARY_OPS = {'+': ast.UAdd, '-': ast.USub, '!': ast.Not, '~': ast.Invert}
+STEP_OPS = {'++': ast.Add, '--': ast.Sub}
+# contexts carry no state, one of each is enough (cpython's own parser shares them too)
+LOAD, STORE = ast.Load(), ast.Store()
+
+def is_prototype(node) -> bool:
+    return isinstance(node, Declaration) and node.var_type.endswith("(func prototype)")
+
+def c_literal(value):
+    # string / char literals come out of the parser as their source text, quotes and all
+    if isinstance(value, str) and len(value) >= 2 and value[0] in '"\'' and value[-1] == value[0]:
+        text = value[1:-1].encode('latin-1', 'backslashreplace').decode('unicode_escape')
+        if value[0] == "'":
+            return ord(text) if len(text) == 1 else text
+        return text
+    return value
+
+def location(line: int):
+    # what goes on every ast node. positions are per line: tracebacks only show
+    # the line, and one shared dict per line is a lot cheaper than one per node
+    return {'lineno': line, 'col_offset': 0, 'end_lineno': line, 'end_col_offset': 0}
+
+class LineMap:
+    # source offset (Node.pos) -> line, counted from 1 like python's.
+    # works on str and on bytes / mmap sources (where pos is a byte offset)
+    def __init__(self, source):
+        newline = '\n' if isinstance(source, str) else b'\n'
+        self.starts = [0]
+        self.starts.extend(m.end() for m in re.finditer(re.escape(newline), source))
+        self.starts.append(float('inf'))
+
+    def line(self, pos: int) -> int:
+        return bisect_right(self.starts, pos)
+
+    def span(self, line: int):
+        # offsets [start, end) of a line
+        return self.starts[line - 1], self.starts[line]
+
+class PythonAstGen(Visitor):
+    # statements go through stmt_<Class> and return a list of ast statements,
+    # expressions through expr_<Class> and return one ast expression
+    prefix = "stmt_"
+    # canonical for loops as range() loops, like PythonCodeGen.range_loops
+    range_loops = True
+    # like PythonCodeGen.memo_size / vector_loops
+    memo_size = DEFAULT_MEMO_SIZE
+    vector_loops = False
+    # like PythonCodeGen.typed_arrays / bind_globals
+    typed_arrays = False
+    bind_globals = False
+
+    def __init__(self, source=None, resolution=None):
+        self.lines = LineMap(source) if source is not None else None
+        # the structure.Resolution items are added to as they're lowered (or
+        # already are, -O's), the top level variables the current function
+        # assigns to, for its global stmt, and whether we're outside of any function
+        self.resolution = Resolution() if resolution is None else resolution
+        self.shared = set()
+        self.top = True
+        self.int_names = set()
+        # the current function returns an int (typed.coerce)
+        self.int_result = False
+        # its arrays that are numpy arrays, name -> int / float (vectorize.vector_arrays)
+        self.numpy_arrays = {}
+        # bound globals (name -> local), __d<n> temporaries used and range() loop
+        # variables that can't be negative, like PythonCodeGen
+        self.bound = {}
+        self.divisions = 0
+        self.nonnegative = set()
+        # location of the line the last positioned node was on, and where that line starts / ends
+        self.loc = location(1)
+        self.line_start = self.line_end = 0
+
+    def lower(self, node: Node) -> ast.Module:
+        if not isinstance(node, Program):
+            self.resolution.add(node)
+        return ast.Module(body=self.block(self.visit(node), node), type_ignores=[])
+
+    def at(self, py_node, node: Node):
+        # every python node needs a position for compile(). node's own line if it has
+        # a pos, otherwise (pos -1, e.g. made by a later pass) the last one we saw.
+        # going through __dict__ is several times faster than setting the four attributes
+        pos = node.pos
+        if pos >= 0 and not self.line_start <= pos < self.line_end and self.lines is not None:
+            line = self.lines.line(pos)
+            self.loc = location(line)
+            self.line_start, self.line_end = self.lines.span(line)
+        py_node.__dict__.update(self.loc)
+        return py_node
+
+    def const(self, value, node: Node):
+        return self.at(ast.Constant(value), node)
+
+    def block(self, stmts, node: Node):
+        # python blocks can't be empty
+        return stmts or [self.at(ast.Pass(), node)]
+
+    def stmt_Node(self, node):
+        raise NotImplementedError(f"No ast lowering for {type(node).__name__}")
+
+    # top level stuffs
+    def stmt_Program(self, node: Program):
+        body = []
+        for decl in node.declarations:
+            self.divisions = 0
+            self.resolution.add(decl)
+            body.extend((yield decl))
+        return body
+
+    def stmt_Function(self, node: Function):
+        params = [name for _, name in node.params]
+        self.shared = set()
+        self.top = False
+        self.int_names = bound_names(node, self.resolution) if self.range_loops or loops.INT_DIVISION else set()
+        self.bound = typed.bound_globals(node, self.resolution) if self.bind_globals else {}
+        self.divisions = 0
+        self.int_result = loops.INT_DIVISION and node.ret_type in INT_TYPES
+        self.numpy_arrays = vectorize.vector_arrays(node, self.int_names) if self.vector_loops else {}
+        body = self.block((yield node.body), node.body)
+        body[:0] = [self.at(ast.Assign(targets=[self.at(ast.Name(id=local, ctx=STORE), node)],
+                                       value=self.at(ast.Name(id=name, ctx=LOAD), node)), node)
+                    for name, local in self.bound.items()]
+        if self.shared:
+            body.insert(0, self.at(ast.Global(names=sorted(self.shared)), node))
+        self.int_names = set()
+        self.bound = {}
+        self.int_result = False
+        self.numpy_arrays = {}
+        self.top = True
+        args = ast.arguments(posonlyargs=[], args=[self.at(ast.arg(arg=p), node) for p in params],
+                             vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[])
+        decorators = []
+        pure = pure_calls(node, self.resolution) if self.memo_size > 0 else None
+        if pure is not None:
+            calls, costly = pure
+            if costly:
+                memo_args = [self.const(self.memo_size, node)] + [self.const(name, node) for name in calls]
+                decorators.append(self.runtime_call('_memo', memo_args, node))
+            else:
+                decorators.append(self.at(ast.Name(id='_pure', ctx=LOAD), node))
+        fn = ast.FunctionDef(name=node.name, args=args, body=body, decorator_list=decorators, returns=None)
+        if 'type_params' in ast.FunctionDef._fields:
+            fn.type_params = []
+        return [self.at(fn, node)]
+
+    def stmt_Compound(self, node: Compound):
+        body = []
+        for stmt in node.stmts:
+            body.extend((yield stmt))
+        return body
+
+    # statements
+    def stmt_Declaration(self, node: Declaration):
+        if is_prototype(node):
+            return []
+        if self.top:
+            self.int_names = top_names(node, self.resolution)
+            try:
+                return self.declaration(node)
+            finally:
+                self.int_names = set()
+        return self.declaration(node)
+
+    def declaration(self, node: Declaration):
+        targets = [self.at(ast.Name(id=node.name, ctx=STORE), node)]
+        array = typed.array_type(node.var_type)
+        if array is not None:
+            return [self.at(ast.Assign(targets=targets, value=self.array(*array, node)), node)]
+        value = node.initializer
+        if value is None:
+            initial = typed.initial(node.var_type) if self.top else None
+            return [self.at(ast.Assign(targets=targets, value=self.const(initial, node)), node)]
+        # int x = y = 3; is chained assignment in python too
+        names = [node.name]
+        while isinstance(value, Assignment):
+            targets.append(self.target(value.target))
+            names.append(typed.target_name(value.target))
+            value = value.value
+        return [self.at(ast.Assign(targets=targets, value=self.stored(names, value)), node)]
+
+    def stored(self, names, value: Node):
+        # value's python expression, as an int if it goes in an int variable
+        # (one of names) and isn't known to be one (typed.coerce)
+        py_value = self.expr(value)
+        if any(name in self.int_names for name in names) and typed.coerce(value, self.int_names):
+            return self.runtime_call('int', [py_value], value)
+        return py_value
+
+    def array(self, element: str, length: int, node: Declaration):
+        # [0] * length, _zeros(code, length) for a numpy array, or
+        # _array(code, [0]) * length for typed arrays
+        zero = self.at(ast.List(elts=[self.const(typed.array_zero(element), node)], ctx=LOAD), node)
+        code = typed.typecode(element)
+        if node.name in self.numpy_arrays:
+            return self.runtime_call('_zeros', [self.const(code, node), self.const(length, node)], node)
+        if code is not None and self.typed_arrays:
+            zero = self.runtime_call('_array', [self.const(code, node), zero], node)
+        return self.at(ast.BinOp(left=zero, op=ast.Mult(), right=self.const(length, node)), node)
+
+    def stmt_Return(self, node: Return):
+        value = self.expr(node.expr) if node.expr else None
+        if value is not None and self.int_result and typed.coerce(node.expr, self.int_names):
+            value = self.runtime_call('int', [value], node.expr)
+        return [self.at(ast.Return(value=value), node)]
+
+    def stmt_ExprStmt(self, node: ExprStmt):
+        if not node.expr:
+            return []
+        return self.expr_statement(node.expr, node)
+
+    def expr_statement(self, expr: Node, node: Node):
+        # an expression used as a statement, where assignments and ++ / -- can be
+        # real python statements instead of walrus expressions
+        if isinstance(expr, Assignment):
+            targets = []
+            names = []
+            while isinstance(expr, Assignment):
+                targets.append(self.target(expr.target))
+                names.append(typed.target_name(expr.target))
+                expr = expr.value
+            return [self.at(ast.Assign(targets=targets, value=self.stored(names, expr)), node)]
+        if isinstance(expr, Unary) and expr.op in STEP_OPS:
+            step = ast.AugAssign(target=self.target(expr.operand), op=STEP_OPS[expr.op](),
+                                 value=self.const(1, node))
+            return [self.at(step, node)]
+        return [self.at(ast.Expr(value=self.expr(expr)), node)]
+
+    def stmt_If(self, node: If):
+        test = self.test(node.cond)
+        body = self.block((yield node.then_branch), node)
+        orelse = (yield node.else_branch) if node.else_branch else []
+        return [self.at(ast.If(test=test, body=body, orelse=orelse), node)]
+
+    def stmt_While(self, node: While):
+        test = self.test(node.cond)
+        body = self.block((yield node.body), node)
+        return [self.at(ast.While(test=test, body=body, orelse=[]), node)]
+
+    def stmt_For(self, node: For):
+        vector = vectorize.vector_loop(node, self.int_names) if self.vector_loops else None
+        if vector is None:
+            return (yield from self.scalar_for(node))
+        guard, stmts = vector
+        body = yield guard
+        test = self.at(ast.Name(id=vectorize.VECTOR, ctx=LOAD), node)
+        vectorized = []
+        for stmt in stmts:
+            vectorized.extend((yield stmt))
+        orelse = yield from self.scalar_for(node)
+        return body + [self.at(ast.If(test=test, body=vectorized, orelse=orelse), node)]
+
+    def scalar_for(self, node: For):
+        loop = range_loop(node, self.int_names) if self.range_loops else None
+        if loop is not None:
+            name, start, stop, adjust, step = loop
+            if isinstance(stop, Literal):
+                stop = self.const(stop.value + adjust, node)
+            else:
+                stop = self.expr(stop)
+                if adjust:
+                    stop = self.at(ast.BinOp(left=stop, op=ast.Add(), right=self.const(adjust, node)), node)
+            args = [self.expr(start), stop]
+            if step != 1:
+                args.append(self.const(step, node))
+            target = self.at(ast.Name(id=name, ctx=STORE), node)
+            if typed.counts_up(start, step):
+                self.nonnegative.add(name)
+            body = self.block((yield node.body), node)
+            self.nonnegative.discard(name)
+            return [self.at(ast.For(target=target, iter=self.runtime_call('range', args, node),
+                                    body=body, orelse=[]), node)]
+        # c style for, same while loop PythonCodeGen writes
+        init = []
+        if isinstance(node.init, Declaration):
+            init = yield node.init
+        elif node.init:
+            init = self.expr_statement(node.init, node)
+        test = self.test(node.cond) if node.cond else self.const(True, node)
+        body = yield node.body
+        if node.post:
+            body = body + self.expr_statement(node.post, node.post)
+        return init + [self.at(ast.While(test=test, body=self.block(body, node), orelse=[]), node)]
+
+    # expressions
+    def expr(self, node: Node):
+        return self.visit(node, "expr_")
+
+    def test(self, node: Node):
+        # node as a condition, where only its truth counts: && / || can stay
+        # python's and / or, which hand back the deciding operand
+        if isinstance(node, Binary) and node.op in BOOL_OPS:
+            values = [self.test(node.left), self.test(node.right)]
+            return self.at(ast.BoolOp(op=BOOL_OPS[node.op](), values=values), node)
+        return self.expr(node)
+
+    def target(self, node: Node):
+        # something being assigned to
+        if isinstance(node, Var):
+            self.assign(node)
+            return self.at(ast.Name(id=node.name, ctx=STORE), node)
+        if isinstance(node, ArrayAccess):
+            return self.at(ast.Subscript(value=self.expr(node.array), slice=self.expr(node.index),
+                                         ctx=STORE), node)
+        raise SyntaxError(f"Can't assign to {type(node).__name__} at pos {node.pos}")
+
+    def expr_Node(self, node):
+        raise NotImplementedError(f"No ast lowering for expression {type(node).__name__}")
+
+    def expr_Literal(self, node: Literal):
+        return self.const(c_literal(node.value), node)
+
+    def expr_Var(self, node: Var):
+        return self.at(ast.Name(id=self.bound.get(node.name, node.name), ctx=LOAD), node)
+
+    def expr_Binary(self, node: Binary):
+        op = node.op
+        if op == '?:':
+            test = self.test(node.left)
+            body = yield node.right.left
+            orelse = yield node.right.right
+            return self.at(ast.IfExp(test=test, body=body, orelse=orelse), node)
+        if op in BOOL_OPS:
+            # as a value c's && / || are 0 or 1: (1 if a and b else 0)
+            return self.at(ast.IfExp(test=self.test(node), body=self.const(1, node),
+                                     orelse=self.const(0, node)), node)
+        left = yield node.left
+        right = yield node.right
+        if op == '/' and typed.c_division(node, self.int_names):
+            return self.c_division(node, left, right)
+        if op in BIN_OPS:
+            return self.at(ast.BinOp(left=left, op=BIN_OPS[op](), right=right), node)
+        if op in COMPARE_OPS:
+            return self.at(ast.Compare(left=left, ops=[COMPARE_OPS[op]()], comparators=[right]), node)
+        raise NotImplementedError(f"No ast lowering for operator {op!r}")
+
+    def c_division(self, node: Binary, left, right):
+        # left / right truncating toward zero, like c (typed.py). the names and
+        # constants used twice can be the same ast node, compile() doesn't mind
+        temp_left, temp_right = typed.division_temps(node)
+        first, second = left, right
+        if temp_left:
+            first, left = self.division_temp(left, node)
+        if temp_right:
+            second, right = self.division_temp(right, node)
+        zero = self.const(0, node)
+        if typed.divisor(node.right):
+            quotient = self.at(ast.BinOp(left=left, op=ast.FloorDiv(), right=right), node)
+            if typed.nonnegative(node.left, self.nonnegative):
+                return quotient
+            negated = self.at(ast.UnaryOp(op=ast.USub(), operand=left), node)
+            flipped = self.at(ast.UnaryOp(op=ast.USub(), operand=self.at(
+                ast.BinOp(left=negated, op=ast.FloorDiv(), right=right), node)), node)
+            test = self.at(ast.Compare(left=first, ops=[ast.GtE()], comparators=[zero]), node)
+            return self.at(ast.IfExp(test=test, body=quotient, orelse=flipped), node)
+        # (q if (q := a // b) >= 0 or q * b == a else q + 1)
+        floor, q = self.division_temp(self.at(ast.BinOp(left=first, op=ast.FloorDiv(), right=second), node), node)
+        below = self.at(ast.Compare(left=floor, ops=[ast.GtE()], comparators=[zero]), node)
+        product = self.at(ast.BinOp(left=q, op=ast.Mult(), right=right), node)
+        exact = self.at(ast.Compare(left=product, ops=[ast.Eq()], comparators=[left]), node)
+        test = self.at(ast.BoolOp(op=ast.Or(), values=[below, exact]), node)
+        up = self.at(ast.BinOp(left=q, op=ast.Add(), right=self.const(1, node)), node)
+        return self.at(ast.IfExp(test=test, body=q, orelse=up), node)
+
+    def division_temp(self, value, node: Node):
+        # ((__d<n> := value), __d<n>)
+        name = typed.DIVISION_TEMP.format(self.divisions)
+        self.divisions += 1
+        target = self.at(ast.Name(id=name, ctx=STORE), node)
+        return self.at(ast.NamedExpr(target=target, value=value), node), self.at(ast.Name(id=name, ctx=LOAD), node)
+
+    def expr_Unary(self, node: Unary):
+        if node.op in STEP_OPS:
+            return self.step(node)
+        operand = self.test(node.operand) if node.op == '!' else (yield node.operand)
+        return self.at(ast.UnaryOp(op=UNARY_OPS[node.op](), operand=operand), node)
+
+    def step(self, node: Unary):
+        # ++x is (x := x + 1), x++ is (x := x + 1) - 1, a[i]++ goes through runtime._step_item
+        operand = node.operand
+        if isinstance(operand, ArrayAccess):
+            delta = 1 if node.op == '++' else -1
+            args = [self.expr(operand.array), self.expr(operand.index),
+                    self.const(delta, node), self.const(node.prefix, node)]
+            return self.element(operand, self.runtime_call('_step_item', args, node))
+        if not isinstance(operand, Var):
+            raise SyntaxError(f"Can't apply {node.op} to {type(operand).__name__} at pos {node.pos}")
+        name = operand.name
+        self.assign(operand)
+        op = STEP_OPS[node.op]
+        bumped = self.at(ast.BinOp(left=self.at(ast.Name(id=name, ctx=LOAD), node),
+                                   op=op(), right=self.const(1, node)), node)
+        value = ast.NamedExpr(target=self.at(ast.Name(id=name, ctx=STORE), node), value=bumped)
+        if not node.prefix:
+            value = ast.BinOp(left=self.at(value, node), op=(ast.Sub if op is ast.Add else ast.Add)(),
+                              right=self.const(1, node))
+        return self.at(value, node)
+
+    def expr_Assignment(self, node: Assignment):
+        # assignment used as a value
+        if isinstance(node.target, ArrayAccess):
+            array = yield node.target.array
+            index = yield node.target.index
+            value = yield node.value
+            if typed.target_name(node.target) in self.int_names and typed.coerce(node.value, self.int_names):
+                value = self.runtime_call('int', [value], node.value)
+            return self.runtime_call('_set_item', [array, index, value], node)
+        if not isinstance(node.target, Var):
+            raise SyntaxError(f"Can't assign to {type(node.target).__name__} at pos {node.pos}")
+        value = yield node.value
+        if node.target.name in self.int_names and typed.coerce(node.value, self.int_names):
+            value = self.runtime_call('int', [value], node.value)
+        self.assign(node.target)
+        target = self.at(ast.Name(id=node.target.name, ctx=STORE), node.target)
+        return self.at(ast.NamedExpr(target=target, value=value), node)
+
+    def assign(self, var: Var):
+        # a top level variable the function assigns to goes in its global stmt
+        symbol = self.resolution.symbol(var)
+        if symbol is not None and symbol.kind == 'global':
+            self.shared.add(var.name)
+
+    def runtime_call(self, name: str, args, node: Node):
+        func = self.at(ast.Name(id=name, ctx=LOAD), node)
+        return self.at(ast.Call(func=func, args=args, keywords=[]), node)
+
+    def expr_Call(self, node: Call):
+        func = yield node.callee
+        args = []
+        for a in node.args:
+            args.append((yield a))
+        return self.at(ast.Call(func=func, args=args, keywords=[]), node)
+
+    def expr_ArrayAccess(self, node: ArrayAccess):
+        array = yield node.array
+        index = yield node.index
+        return self.element(node, self.at(ast.Subscript(value=array, slice=index, ctx=LOAD), node))
+
+    def element(self, node: ArrayAccess, value):
+        # value, an element of node's array, as a python number if that's a numpy array
+        convert = self.numpy_arrays.get(node.array.name) if isinstance(node.array, Var) else None
+        return value if convert is None else self.runtime_call(convert, [value], node)
+
+def compile_program(node: Node, source=None, filename: str = "<ctri>", resolution=None):
+    # source is only used for line numbers, pass what the tokens were made from.
+    # resolution is node's structure.Resolution if something (-O) has one already
+    tree = PythonAstGen(source, resolution).lower(node)
+    return compile(tree, filename, "exec", dont_inherit=True)
+
+def run_code(code, argv=()) -> int:
+    # runs the module, then main() if there is one. returns main's int result
+    # (the exit status), 0 otherwise
+    namespace = {'__name__': '__ctri__', '__builtins__': builtins}
+    namespace.update(runtime.BUILTINS)
+    exec(code, namespace)
+    entry = namespace.get('main')
+    if not callable(entry):
+        return 0
+    if getattr(entry, '__code__', None) is not None and entry.__code__.co_argcount == 2:
+        result = entry(len(argv), list(argv))
+    else:
+        result = entry()
+    return result if isinstance(result, int) else 0
+
+# .pyc files, same layout importlib writes: magic, flags, source mtime, source size,
+# then the marshalled code object. python can also run them directly but then
+# there's no runtime and nothing calls main()
+def write_pyc(code, path: str, source_path=None):
+    mtime = size = 0
+    if source_path is not None:
+        st = os.stat(source_path)
+        mtime, size = int(st.st_mtime), st.st_size
+    data = bytearray(importlib.util.MAGIC_NUMBER)
+    data += (0).to_bytes(4, 'little')
+    data += (mtime & 0xFFFFFFFF).to_bytes(4, 'little')
+    data += (size & 0xFFFFFFFF).to_bytes(4, 'little')
+    data += marshal.dumps(code)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as out:
+        out.write(data)
+    os.replace(tmp, path)
+
+def load_pyc(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != importlib.util.MAGIC_NUMBER:
+        raise ValueError(f"{path}: not a .pyc for this python version")
+    return marshal.loads(data[16:])
@@ -0,0 +1,134 @@
+import inspect
+import sys
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the bits of libc programs call, put in the program's globals by --run
+# (pybackend.run_code). strings reach these as python strs
+
+def printf(fmt, *args):
+    text = fmt % args
+    sys.stdout.write(text)
+    return len(text)
+
+def puts(s):
+    sys.stdout.write(s + "\n")
+    return len(s) + 1
+
+def putchar(c):
+    sys.stdout.write(chr(c))
+    return c
+
+# for what python can't do inside an expression: a[i]++, a[i] = x used as a value
+def _step_item(seq, index, delta, prefix):
+    old = seq[index]
+    seq[index] = old + delta
+    return old + delta if prefix else old
+
+def _set_item(seq, index, value):
+    seq[index] = value
+    return value
+
+# decorators for the functions purity.py finds pure. _memo caches fn in a bounded
+# lru_cache if everything else it calls is marked pure already, else leaves it be
+def _pure(fn):
+    fn._pure = True
+    return fn
+
+def _memo(size, *calls):
+    def wrap(fn):
+        module = fn.__globals__
+        if not all(getattr(module.get(name), '_pure', False) for name in calls):
+            return fn
+        return _pure(lru_cache(maxsize=size)(fn))
+    return wrap
+
+# element-wise loops vectorize.py rewrote: __v = _vectors(lo, hi, count, *arrays, *numbers).
+# None (run the loop) unless numpy is there, the arrays are 1-d numpy arrays of
+# numbers with [lo, hi) inside them and the rest are numbers. python lists always
+# get the loop: converting one to an array and back costs about what the loop
+# does. __v[k] is the k-th array's [lo, hi) slice, a view, so setting it writes
+# straight into the array
+VECTOR_MIN = 64
+
+class _Vectors:
+    def __init__(self, lo, hi, arrays):
+        self.lo = lo
+        self.hi = hi
+        self.arrays = arrays
+
+    def __getitem__(self, k):
+        return self.arrays[k][self.lo:self.hi]
+
+    def __setitem__(self, k, value):
+        self.arrays[k][self.lo:self.hi] = value
+
+def _vectors(lo, hi, count, *values):
+    if numpy is None or lo < 0 or hi - lo < VECTOR_MIN:
+        return None
+    arrays = values[:count]
+    for x in values[count:]:
+        if not isinstance(x, (int, float, numpy.number)):
+            return None
+    for i, x in enumerate(arrays):
+        if type(x) is not numpy.ndarray or x.ndim != 1 or len(x) < hi or x.dtype.kind not in 'iuf' \
+                or not x.flags.writeable:
+            return None
+        # two views of the same memory could pass values between iterations
+        for y in arrays[:i]:
+            if x is not y and numpy.may_share_memory(x, y):
+                return None
+    return _Vectors(lo, hi, arrays)
+
+# a fixed size array (typed.py) when loops are vectorized: int64 / float64 zeros
+# as a numpy array, which _vectors takes, or the list [0] * length without numpy
+def _zeros(code, length):
+    if numpy is None:
+        return [0.0 if code == 'd' else 0] * length
+    return numpy.zeros(length, numpy.float64 if code == 'd' else numpy.int64)
+
+# the builtins returning an int, like their c versions (loops.bound_names)
+INT_RESULTS = ('printf', 'puts', 'putchar')
+
+BUILTINS = {
+    'printf': printf,
+    'puts': puts,
+    'putchar': putchar,
+    '_step_item': _step_item,
+    '_set_item': _set_item,
+    '_pure': _pure,
+    '_memo': _memo,
+    '_vectors': _vectors,
+    '_zeros': _zeros,
+    # typed arrays (typed.py)
+    '_array': array,
+}
+
+# generated source (codegen.py) can't count on BUILTINS, so it defines the
+# helpers it uses itself: the parts each one needs, in order. a part is one of
+# the definitions above (its source is copied) or a line of PARTS, and is only
+# written once a file
+HELPERS = {
+    '_step_item': ('_step_item',),
+    '_set_item': ('_set_item',),
+    '_pure': ('_pure',),
+    '_memo': ('lru_cache', '_pure', '_memo'),
+    '_vectors': ('numpy', 'VECTOR_MIN', '_Vectors', '_vectors'),
+    '_zeros': ('numpy', '_zeros'),
+    '_array': ('_array',),
+}
+PARTS = {
+    'lru_cache': "from functools import lru_cache",
+    'numpy': "try:\n    import numpy\nexcept ImportError:\n    numpy = None",
+    'VECTOR_MIN': f"VECTOR_MIN = {VECTOR_MIN}",
+    '_array': "from array import array as _array",
+}
+
+def part_source(part: str) -> str:
+    text = PARTS.get(part)
+    return text if text is not None else inspect.getsource(globals()[part]).rstrip()
@@ -0,0 +1,205 @@
+import io
+import os
+import sys
+import marshal
+import time
+import signal
+import socket
+import argparse
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from client import HEADER, STDIN, STDOUT, STDERR, EXIT, socket_path, frame
+from cache import compiler_fingerprint
+from driver import compile_source
+import main as compiler
+
+# compile server: one long running process with everything imported (the lexer's
+# regexes compiled, the cache fingerprint hashed), taking main.py command lines
+# from client.py over a unix socket. saves python startup + imports on every call,
+# which is most of the time for a small file.
+#
+# requests are served one at a time, in this process: main() writes through
+# sys.stdout / sys.stderr and a request gets them pointed at its connection, so
+# two can't run at once. a compile is a few ms, clients queue on the socket.
+# if any of the compiler's .py files change, the server starts itself over rather
+# than keep serving the old code
+
+# stdout is sent in pieces this big, stderr right away
+FLUSH_SIZE = 64 * 1024
+
+class Channel(io.TextIOBase):
+    # sys.stdout / sys.stderr for one request, writes become frames on the socket
+    def __init__(self, sock, tag: bytes, buffer_size: int):
+        self.sock = sock
+        self.tag = tag
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, s):
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size >= self.buffer_size:
+            self.flush()
+        return len(s)
+
+    def flush(self):
+        if self.parts:
+            data = "".join(self.parts).encode()
+            self.parts = []
+            self.size = 0
+            self.sock.sendall(frame(self.tag, data))
+
+class StdinChannel(io.TextIOBase):
+    # sys.stdin for one request, fetched from the client the first time it's read
+    def __init__(self, sock, out):
+        self.sock = sock
+        self.out = out
+        self.text = None
+
+    def readable(self):
+        return True
+
+    def _fetch(self):
+        if self.text is None:
+            self.out.flush()
+            self.sock.sendall(frame(STDIN, b""))
+            size, = HEADER.unpack(_recv_exact(self.sock, HEADER.size))
+            self.text = io.StringIO(_recv_exact(self.sock, size).decode())
+        return self.text
+
+    def read(self, size=-1):
+        return self._fetch().read(size)
+
+    def readline(self, size=-1):
+        return self._fetch().readline(size)
+
+def _recv_exact(sock, n: int) -> bytes:
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("client hung up")
+        data += chunk
+    return bytes(data)
+
+def _exit_status(code, err) -> int:
+    # SystemExit.code the way the interpreter turns it into a status
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=err)
+    return 1
+
+def handle(sock):
+    size, = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    req = marshal.loads(_recv_exact(sock, size))
+    out = Channel(sock, STDOUT, FLUSH_SIZE)
+    err = Channel(sock, STDERR, 0)
+    stdin = sys.stdin
+    cwd = os.getcwd()
+    try:
+        os.chdir(req["cwd"])
+        sys.stdin = StdinChannel(sock, out)
+        with redirect_stdout(out), redirect_stderr(err):
+            try:
+                status = compiler.main(req["argv"])
+            except SystemExit as e:
+                status = _exit_status(e.code, err)
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            out.flush()
+    finally:
+        sys.stdin = stdin
+        os.chdir(cwd)
+    sock.sendall(frame(EXIT, str(status or 0).encode()))
+
+def _source_stamp():
+    # mtimes of the compiler's own modules, to notice it being edited under us
+    src = os.path.dirname(os.path.abspath(__file__))
+    return sorted((name, os.stat(os.path.join(src, name)).st_mtime_ns)
+                  for name in os.listdir(src) if name.endswith(".py"))
+
+def warm_up():
+    # touch everything a request would, so the first one isn't slower
+    compiler_fingerprint()
+    compile_source("int f(int a) { int b = a * 2; if (b > 1) { return b; } return 0; }\n")
+
+def serve(path: str, idle_timeout: float = 0):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        sys.exit(f"a compile server is already listening on {path}")
+    except (FileNotFoundError, ConnectionRefusedError):
+        pass
+    finally:
+        probe.close()
+    if os.path.exists(path):
+        os.unlink(path)  # left over from one that died
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # requests can run code (--run) and read files as us, keep other users out
+    umask = os.umask(0o077)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(umask)
+    listener.listen(64)
+    if idle_timeout > 0:
+        listener.settimeout(idle_timeout)
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, stop)
+
+    warm_up()
+    stamp = _source_stamp()
+    served = 0
+    started = time.perf_counter()
+    print(f"compile server listening on {path}", file=sys.stderr, flush=True)
+    try:
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except socket.timeout:
+                print(f"idle for {idle_timeout:g} s, stopping", file=sys.stderr)
+                break
+            with conn:
+                conn.settimeout(None)
+                if _source_stamp() != stamp:
+                    # hang up without answering, the client then compiles by itself
+                    print("compiler source changed, restarting", file=sys.stderr, flush=True)
+                    conn.close()
+                    listener.close()
+                    os.unlink(path)
+                    os.execv(sys.executable, [sys.executable] + sys.argv)
+                try:
+                    handle(conn)
+                except (ConnectionError, BrokenPipeError) as e:
+                    print(f"request dropped: {e}", file=sys.stderr)
+                served += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.exists(path):
+            os.unlink(path)
+        print(f"served {served} requests in {time.perf_counter() - started:.0f} s", file=sys.stderr)
+
+def main():
+    ap = argparse.ArgumentParser(prog="server.py",
+                                 description="keep the compiler loaded, serve client.py requests over a unix socket")
+    ap.add_argument("--socket", metavar="PATH", default=socket_path(),
+                    help="socket to listen on (default %(default)s, or $HYPOTENUSE_SOCKET)")
+    ap.add_argument("--idle-timeout", type=float, default=0, metavar="SECONDS",
+                    help="exit after this long without a request (default 0, never)")
+    args = ap.parse_args()
+    serve(args.socket, args.idle_timeout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from array import array
+from bisect import bisect_left
+from lexer import KEYWORDS, Tokens, get_tokens
+from ast_arena import NodeArena
+import parser as parse
+from codegen import PythonCodeGen, with_prelude
+from driver import compile_source, settings, apply_settings
+from structure import Resolution, header
+
+# one big file on several cores: top level items (functions, global declarations)
+# only depend on what's declared above them (structure.py), so the source is cut
+# between them and each piece is lexed, parsed (and generated) in a worker,
+# results put back in order.
+#
+# finding the cuts can't wait for the lexer (that's a big part of the work being
+# spread out), so a regex that only knows comments, strings and { } ; finds the
+# places where brace depth is back to 0 after a ; or }. the comment / string
+# patterns are the lexer's own, so a ; or brace it finds is one the lexer sees too.
+# the same scan reads each item's header (type, name, and whether a ( or [n]
+# follows), which is all a worker needs to declare what's above its piece. a
+# worker checks its items' headers against the scan's, so one it got wrong is
+# a failed worker. if anything goes wrong in a worker the whole file is redone
+# serially, errors come out exactly as they would without this
+
+_PATTERNS = dict(Tokens)
+PRESCAN = re.compile('|'.join([
+    '(?s:' + _PATTERNS['COMMENT_MULTI'].pattern + ')',
+    _PATTERNS['COMMENT_LINE'].pattern,
+    _PATTERNS['STRING_LITERAL'].pattern,
+    '([{};])',
+]))
+
+_GAP = r'(?:\s|' + _PATTERNS['COMMENT_LINE'].pattern + '|(?s:' + _PATTERNS['COMMENT_MULTI'].pattern + '))*'
+_TYPES = sorted(word for word, kind in KEYWORDS.items() if kind in parse.TYPE_TOKENS)
+HEADER = re.compile(_GAP + '(' + '|'.join(_TYPES) + r')\b' + _GAP + '(' + _PATTERNS['IDENTIFIER'].pattern + ')'
+                    + _GAP + r'(?:(\()|\[' + _GAP + r'(\d+)' + _GAP + r'\])?')
+
+# smaller files aren't worth starting workers for
+MIN_PARALLEL_SIZE = 256 * 1024
+# pieces per worker, more than one so a slow piece doesn't hold everything up
+CHUNKS_PER_JOB = 4
+
+def item_header(source: str, start: int, end: str):
+    # (start, name, kind, type) for the item at start, structure.header()'s,
+    # end being the ; or } it ends with. None if it doesn't look like one
+    m = HEADER.match(source, start)
+    if m is None:
+        return None
+    typ, name, call, length = m.groups()
+    if call is not None:
+        return start, name, 'function' if end == '}' else 'prototype', typ
+    return start, name, 'global', typ if length is None else f"{typ}[{int(length)}]"
+
+def split_points(source: str, chunks: int, headers=None):
+    # offsets to cut source at, each one right after a top level item, roughly
+    # len(source) / chunks apart. None if the braces don't balance. headers, a
+    # list, gets item_header() for every item
+    step = len(source) // chunks
+    target = step
+    points = [0]
+    depth = 0
+    start = 0
+    for m in PRESCAN.finditer(source):
+        ch = m.group(1)
+        if ch is None:
+            continue
+        if ch == '{':
+            depth += 1
+            continue
+        if ch == '}':
+            depth -= 1
+            if depth < 0:
+                return None
+        if depth != 0:
+            continue
+        if headers is not None:
+            headers.append(item_header(source, start, ch))
+            start = m.end()
+        if m.end() >= target:
+            points.append(m.end())
+            target = m.end() + step
+    if depth != 0:
+        return None
+    if points[-1] < len(source):
+        points.append(len(source))
+    return points
+
+def _tokens(text: str):
+    tokens = get_tokens(text)
+    tokens.append(('EOF', 'EOF', len(text)))
+    return tokens
+
+# every item's header, set in each worker by _start_worker
+_headers = []
+
+def _start_worker(found: dict, headers):
+    global _headers
+    apply_settings(found)
+    _headers = headers
+
+def _generate_chunk(job):
+    # -> [(helpers, lines), ...] per decl (PythonCodeGen.generate_item)
+    text, offset = job
+    resolution = Resolution()
+    above = bisect_left(_headers, (offset,))
+    for _, name, kind, typ in _headers[:above]:
+        resolution.declare(name, kind, typ)
+    cg = PythonCodeGen(resolution)
+    items = []
+    for i, decl in enumerate(parse.Parser(_tokens(text)).iter_program(), above):
+        if i >= len(_headers) or _headers[i][1:] != header(decl):
+            raise ValueError(f"item at {offset + decl.pos} isn't what the prescan saw")
+        items.append(cg.generate_item(decl))
+    return items
+
+def _parse_chunk(job):
+    # -> NodeArena.to_bytes() of the chunk, positions moved to be file offsets
+    text, offset = job
+    arena = NodeArena.from_decls(parse.Parser(_tokens(text)).iter_program())
+    arena.positions = array('q', [p + offset if p >= 0 else p for p in arena.positions])
+    return arena.to_bytes()
+
+def _chunk_jobs(source: str, jobs: int, min_size: int, headers=None):
+    # [(text, offset), ...] or None when it's not worth it / can't be split.
+    # headers as for split_points
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(source) < min_size:
+        return None, jobs
+    points = split_points(source, jobs * CHUNKS_PER_JOB, headers)
+    if points is None or len(points) < 3 or headers is not None and None in headers:
+        return None, jobs
+    return [(source[a:b], a) for a, b in zip(points, points[1:])], jobs
+
+def compile_parallel(source: str, jobs: int = 0, min_size: int = MIN_PARALLEL_SIZE) -> str:
+    # same text as driver.compile_source(source)
+    headers = []
+    chunks, jobs = _chunk_jobs(source, jobs, min_size, headers)
+    if chunks is None:
+        return compile_source(source)
+    try:
+        with ProcessPoolExecutor(min(jobs, len(chunks)), initializer=_start_worker,
+                                 initargs=(settings(), headers)) as pool:
+            results = list(pool.map(_generate_chunk, chunks))
+    except Exception:
+        return compile_source(source)
+    return "\n".join(with_prelude(item for items in results for item in items))
+
+def parse_parallel(source: str, jobs: int = 0, min_size: int = MIN_PARALLEL_SIZE, mutable: bool = False):
+    # a Program equal to Parser(tokens).parse_program(), its declarations are
+    # views into one NodeArena per chunk (read only), or real nodes with mutable
+    chunks, jobs = _chunk_jobs(source, jobs, min_size)
+    if chunks is not None:
+        try:
+            with ProcessPoolExecutor(min(jobs, len(chunks))) as pool:
+                packed = list(pool.map(_parse_chunk, chunks))
+        except Exception:
+            packed = None
+        if packed is not None:
+            decls = []
+            for data in packed:
+                arena = NodeArena.from_bytes(data)
+                decls.extend((arena.to_node() if mutable else arena.root()).declarations)
+            return parse.Program(decls, pos=0)
+    tokens = get_tokens(source)
+    tokens.append(('EOF', 'EOF', len(source)))
+    return parse.Parser(tokens).parse_program()
@@ -1,31 +1,309 @@
+import sys
+from types import MappingProxyType
+from parser import *
+from visitor import child_fields
+import runtime
 
-# new stuff guys!
-class Scope:
-    def __init__(self, name):
-        self.name = name
-        self.children = []
-    def add_child(self, child):
-        self.children.append(child)
-        return self
+# symbol table: what every name in the program refers to, worked out once and
+# handed to the -O passes and either backend, so none of them walks a function
+# again for its declarations.
+#
+# scopes are dicts (name -> Symbol) chained to the scope around them: the
+# runtime's builtins (Lib), then the top level, a function's parameters and one
+# per { } block / for loop. lookup goes outwards from the innermost one, so a
+# declaration in a block shadows one further out, like c. declare interns the
+# name, every symbol of a name shares the one string.
+#
+# both backends make a whole function one python scope though, so a name the
+# function declares anywhere is its local everywhere in it: a use c would find
+# no (or a global) declaration for, e.g. after the block that declared it, is
+# bound to that local too. what the bindings say is what the generated code does.
+#
+# top level items go into a Resolution one at a time, in source order, and each
+# one sees what's declared above it and itself, c's rule. that's all of the file
+# an item depends on, and the same whichever way the file is cut up: split.py's
+# workers declare what's above their chunk first (its item headers), and
+# incremental.py declares the pieces above the one it generates. declare() is
+# just the top level name and its type, which is all later items use.
+#
+# bindings are kept by node: its id for real nodes, (arena, index) for
+# ast_arena's views, which are a new object every time a field is read. the
+# nodes bound for an item are kept with it, so their ids stay theirs until the
+# item is released. a pass that rewrites an item (-O's inliner and hoister) has
+# it bound again after.
+
+LOCAL_KINDS = ('param', 'local')
+PROTOTYPE = " (func prototype)"
+# uses() of an item with nothing to bind, e.g. `int x = 1;`, most of a big file's globals
+NO_USES = MappingProxyType({})
+
+class Symbol:
+    # kind is 'builtin', 'function', 'prototype', 'global', 'param' or 'local'.
+    # type is the declared c type ("int", "double[8]", a function's return
+    # type), None for builtins
+    __slots__ = ('name', 'kind', 'type', 'scope')
 
-class Caller:
-    def __init__(self, name, value):
+    def __init__(self, name, kind, type, scope):
         self.name = name
-        self.value = value
-        self.points = []
-    def start(self, scope):
-        scope.add_child(self)
-        return self
-    def call(self, point, scopes):
-        for scope in scopes:
-            if point in scope.children:
-                self.points.append(point)
+        self.kind = kind
+        self.type = type
+        self.scope = scope
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, {self.kind!r}, {self.type!r})"
 
+class Scope:
+    __slots__ = ('name', 'parent', 'symbols')
 
-class Lib:
-    def __init__(self, name, scope):
+    def __init__(self, name, parent=None):
         self.name = name
-        self.functions = []
-        scope.add_child(self)
+        self.parent = parent
+        self.symbols = {}
+
+    def declare(self, name, kind, type=None) -> Symbol:
+        # a later declaration of the same name in this scope replaces the earlier one
+        name = sys.intern(name)
+        symbol = Symbol(name, kind, type, self)
+        self.symbols[name] = symbol
+        return symbol
+
+    def lookup(self, name):
+        # the innermost declaration of name, None if nothing declares it
+        scope = self
+        while scope is not None:
+            symbol = scope.symbols.get(name)
+            if symbol is not None:
+                return symbol
+            scope = scope.parent
+        return None
+
+    def __contains__(self, name):
+        # declared in this scope itself
+        return name in self.symbols
+
+class FunctionScope(Scope):
+    # a function's parameters. locals is every name declared anywhere in the
+    # function (its first declaration), the python function's locals. writes is
+    # name -> the Declarations, Assignments and ++ / -- in it that set name
+    __slots__ = ('locals', 'writes')
+
+    def __init__(self, name, parent=None):
+        super().__init__(name, parent)
+        self.locals = {}
+        self.writes = {}
+
+class Lib(Scope):
+    # builtin functions, the scope around the top level
+    def __init__(self, name, functions=()):
+        super().__init__(name)
+        for function in functions:
+            self.add_function(function)
+
     def add_function(self, function):
-        self.functions.append(function)
\ No newline at end of file
+        return self.declare(function, 'builtin')
+
+def key(node):
+    # what node's binding is kept under (see the top)
+    arena = getattr(node, '_arena', None)
+    return id(node) if arena is None else (id(arena), node._index)
+
+def header(item):
+    # (name, kind, type) an item declares at the top level, None for anything else
+    if isinstance(item, Function):
+        return item.name, 'function', item.ret_type
+    if isinstance(item, Declaration):
+        if item.var_type.endswith(PROTOTYPE):
+            return item.name, 'prototype', item.var_type[:-len(PROTOTYPE)]
+        return item.name, 'global', item.var_type
+    return None
+
+class Resolution:
+    # the bindings of a program's top level items, added in source order
+    def __init__(self):
+        self.lib = Lib('runtime', runtime.BUILTINS)
+        self.top = Scope('<top>', self.lib)
+        self.bindings = {}  # key(Var / Call) -> Symbol
+        self.scopes = {}  # key(Function) -> FunctionScope
+        # key(item) -> the nodes bound in it, and -> name -> Symbol (None if
+        # nothing declares it) for every name it uses that isn't its own local
+        self.nodes = {}
+        self.outer = {}
+        self.resolver = Resolver(self)
+
+    def add(self, item) -> 'Resolution':
+        # declares and binds a top level item, unless it's in already
+        found = key(item)
+        if found not in self.nodes:
+            self.resolver.item(item, found, header(item))
+        return self
+
+    def declare(self, name, kind, type):
+        # a top level name without its item (header()), e.g. an item above a
+        # split.py chunk. a prototype only declares what nothing else has
+        if kind == 'prototype' and name in self.top:
+            return
+        self.top.declare(name, kind, type)
+
+    def rebind(self, item, new=None):
+        # binds item (or new, what a pass replaced it with) again after a pass
+        # changed it, keeping its top level name
+        self.release(item)
+        item = item if new is None else new
+        self.resolver.item(item, key(item))
+
+    def release(self, item):
+        # forgets item's bindings, for once it's generated. what it declares at
+        # the top level stays
+        for node in self.nodes.pop(key(item), ()):
+            self.bindings.pop(key(node), None)
+        self.scopes.pop(key(item), None)
+        self.outer.pop(key(item), None)
+
+    def symbol(self, node):
+        # what a Var, or a Call's callee, refers to. None if nothing seen declares it
+        return self.bindings.get(key(node))
+
+    def scope(self, function: Function) -> FunctionScope:
+        return self.scopes[key(function)]
+
+    def uses(self, item) -> dict:
+        return self.outer[key(item)]
+
+    def local(self, node) -> bool:
+        # a parameter or local of the function it's in
+        symbol = self.bindings.get(key(node))
+        return symbol is not None and symbol.kind in LOCAL_KINDS
+
+class Resolver:
+    # binds one top level item at a time into a Resolution
+    def __init__(self, resolution: Resolution):
+        self.resolution = resolution
+
+    def item(self, item, found, declares=None):
+        # found is key(item), declares its header() to declare first
+        resolution = self.resolution
+        if declares is not None:
+            resolution.declare(*declares)
+        if isinstance(item, Function):
+            nodes = resolution.nodes[found] = []
+            outer = resolution.outer[found] = {}
+            self.function(item, nodes, outer)
+        elif isinstance(item, Declaration) and item.initializer is not None \
+                and not isinstance(item.initializer, Literal):  # nothing to bind in a literal
+            nodes = resolution.nodes[found] = []
+            outer = resolution.outer[found] = {}
+            self.walk(item.initializer, resolution.top, None, nodes, outer)
+        else:
+            resolution.nodes[found] = ()
+            resolution.outer[found] = NO_USES
+
+    def function(self, function: Function, nodes, outer):
+        scope = FunctionScope(function.name, self.resolution.top)
+        for typ, name in function.params:
+            symbol = scope.declare(name, 'param', typ)
+            scope.locals.setdefault(symbol.name, symbol)
+        self.resolution.scopes[key(function)] = scope
+        pending = self.walk(function.body, scope, scope, nodes, outer)
+        # names c didn't find a local for where they're used
+        for node, name, symbol, call in pending:
+            symbol = scope.locals.get(name, symbol)
+            if symbol is None or symbol.kind not in LOCAL_KINDS:
+                outer[name] = symbol
+            self.bind(node, symbol, call, nodes)
+
+    def walk(self, node: Node, scope: Scope, function, nodes, outer):
+        # binds what's under node, -> [(Var, name, symbol c finds, Call or None), ...]
+        # left for function() when it isn't a local yet
+        bindings = self.resolution.bindings
+        pending = []
+        stack = [(node, scope)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, scope = pop()
+            role = _ROLES.get(type(node))
+            if role is None:
+                role = _role(type(node))
+            if role is _VAR:
+                symbol = scope.lookup(node.name)
+                if function is not None and (symbol is None or symbol.kind not in LOCAL_KINDS):
+                    pending.append((node, node.name, symbol, None))
+                else:
+                    if function is None:
+                        outer[node.name] = symbol
+                    if symbol is not None:
+                        bindings[key(node)] = symbol
+                        nodes.append(node)
+                continue
+            if role is _CALL:
+                callee = node.callee
+                for arg in reversed(node.args):
+                    push((arg, scope))
+                if not isinstance(callee, Var):
+                    push((callee, scope))
+                    continue
+                symbol = scope.lookup(callee.name)
+                if function is not None and (symbol is None or symbol.kind not in LOCAL_KINDS):
+                    pending.append((callee, callee.name, symbol, node))
+                else:
+                    if function is None:
+                        outer[callee.name] = symbol
+                    self.bind(callee, symbol, node, nodes)
+                continue
+            if role is _DECLARATION:
+                symbol = scope.declare(node.name, 'local', node.var_type)
+                function.locals.setdefault(symbol.name, symbol)
+                function.writes.setdefault(symbol.name, []).append(node)
+            elif role is _ASSIGNMENT:
+                if function is not None and isinstance(node.target, Var):
+                    function.writes.setdefault(node.target.name, []).append(node)
+            elif role is _STEP:
+                if function is not None and node.op in ('++', '--') and isinstance(node.operand, Var):
+                    function.writes.setdefault(node.operand.name, []).append(node)
+            elif role is _BLOCK:
+                # only a block that declares something needs a scope of its own
+                if any(isinstance(stmt, Declaration) for stmt in node.stmts):
+                    scope = Scope(scope.name, scope)
+            elif role is _FOR:
+                if isinstance(node.init, Declaration):
+                    scope = Scope(scope.name, scope)
+            for name, is_list in reversed(child_fields(type(node))):
+                value = getattr(node, name)
+                if is_list:
+                    for child in reversed(value):
+                        push((child, scope))
+                elif value is not None:
+                    push((value, scope))
+        return pending
+
+    def bind(self, var: Var, symbol, call, nodes):
+        if symbol is None:
+            return
+        bindings = self.resolution.bindings
+        bindings[key(var)] = symbol
+        nodes.append(var)
+        if call is not None:
+            bindings[key(call)] = symbol
+            nodes.append(call)
+
+# how walk treats each node class (ast_arena's views are subclasses)
+_VAR, _CALL, _DECLARATION, _ASSIGNMENT, _STEP, _BLOCK, _FOR, _OTHER = range(8)
+_ROLES = {}
+
+def _role(cls):
+    for base, role in ((Var, _VAR), (Call, _CALL), (Declaration, _DECLARATION),
+                       (Assignment, _ASSIGNMENT), (Unary, _STEP), (Compound, _BLOCK), (For, _FOR)):
+        if issubclass(cls, base):
+            break
+    else:
+        role = _OTHER
+    _ROLES[cls] = role
+    return role
+
+def resolve(node: Node, resolution=None) -> Resolution:
+    # node is a Program or one top level item, added to resolution (a new one
+    # by default)
+    if resolution is None:
+        resolution = Resolution()
+    for item in (node.declarations if isinstance(node, Program) else [node]):
+        resolution.add(item)
+    return resolution
@@ -0,0 +1,86 @@
+import sys
+from array import array
+from lexer import Tokens, KEYWORDS, iter_spans
+
+# every token type the lexer can hand out, as a small int
+TOKEN_TYPES = [name for name, _ in Tokens] + ['UNKNOWN', 'EOF']
+KIND = {name: i for i, name in enumerate(TOKEN_TYPES)}
+
+_INTERNED_KINDS = frozenset(KIND[name] for name in list(KEYWORDS.values()) + ['IDENTIFIER'])
+_KEYWORD_TEXT = {KIND[kind]: sys.intern(text) for text, kind in KEYWORDS.items()}
+_EOF = KIND['EOF']
+
+class TokenBuffer:
+    # struct of arrays token list: kind / start / length per token, 13 bytes each.
+    # indexing still gives back a (type, lexeme, pos) tuple so Parser doesn't care,
+    # the lexeme gets sliced out of the source right then (and interned for names)
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.lengths = array('I')
+        self._decode = not isinstance(source, str)
+        # the parser asks for the same token a few times in a row (peek then advance)
+        self._last_i = -1
+        self._last_tok = None
+
+    @classmethod
+    def from_source(cls, source):
+        buf = cls(source)
+        kinds, starts, lengths = buf.kinds, buf.starts, buf.lengths
+        kind_of = KIND.__getitem__
+        for kind, start, end in iter_spans(source):
+            kinds.append(kind_of(kind))
+            starts.append(start)
+            lengths.append(end - start)
+        return buf
+
+    def append(self, tok):
+        # only really used for the EOF token main tacks on the end
+        kind = KIND[tok[0]]
+        self.kinds.append(kind)
+        self.starts.append(tok[2])
+        self.lengths.append(0 if kind == _EOF else len(tok[1]))
+        self._last_i = -1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def type_at(self, i) -> str:
+        return TOKEN_TYPES[self.kinds[i]]
+
+    def pos_at(self, i) -> int:
+        return self.starts[i]
+
+    def lexeme_at(self, i) -> str:
+        kind = self.kinds[i]
+        if kind in _KEYWORD_TEXT:
+            return _KEYWORD_TEXT[kind]
+        if kind == _EOF:
+            return 'EOF'
+        start = self.starts[i]
+        text = self.source[start:start + self.lengths[i]]
+        if self._decode:
+            text = text.decode('utf-8', 'replace')
+        if kind in _INTERNED_KINDS:
+            text = sys.intern(text)
+        return text
+
+    def __getitem__(self, i):
+        if i == self._last_i:
+            return self._last_tok
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        tok = (TOKEN_TYPES[self.kinds[i]], self.lexeme_at(i), self.starts[i])
+        if i >= 0:
+            self._last_i = i
+            self._last_tok = tok
+        return tok
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self) -> int:
+        # what the token data itself costs, not counting the source
+        return sum(a.itemsize * len(a) for a in (self.kinds, self.starts, self.lengths))
@@ -0,0 +1,164 @@
+from parser import *
+from visitor import child_fields, walk
+import loops
+from loops import INT_ARRAY, INT_TYPES, array_type, int_expr
+
+# lowering that goes by the declared c types, for both backends. each part has
+# its own switch:
+#
+# int division (loops.INT_DIVISION, on unless --no-int-division): a / b with
+# both sides ints (loops.int_expr) is c's division, truncating toward zero,
+# instead of python's float /:
+#     a / 4     (a // 4 if a >= 0 else -(-a // 4))
+#     a / b     (__d0 if (__d0 := a // b) >= 0 or __d0 * b == a else __d0 + 1)
+# python's floor division, one up when that went below an inexact negative
+# quotient (measured faster than testing the signs first). an operand that's
+# more than a variable / literal is worked out once into a __d<n> walrus
+# temporary where it's first evaluated, so a is still evaluated before b. the result is an int again, so loops.int_expr
+# counts / as an int op while it's on (n / 2 can then be a range() bound) and
+# -O folds 7 / 2 to 3 (c_divide). a dividend known not to be negative (a
+# literal, or the variable of a range() loop counting up from 0 or more) over a
+# positive literal is just a // 4. a shift for a power of two divisor measured
+# no faster than // here, so there's none.
+#
+# for that to hold, an int stays an int: with int division on, a variable
+# declared int (local, parameter or global), an element of an int array and
+# what an int function returns are always one. a value not known to be an int
+# (loops.int_expr: a call to something else, a double, ...) is converted like
+# c would, truncating:
+#     int a = half(7);    a = int(half(7))
+#     a[0] = x * 0.5;     a[0] = int(x * 0.5)
+#     return x * 0.5;     return int(x * 0.5)
+# and a global declared without a value starts out as 0 (0.0 for a double), not
+# None. so int_expr can take every int declared name, int arrays' elements and
+# calls to functions returning int: the function's own, and the top level ones
+# declared above it (the runtime's builtins, globals, functions), which is what
+# structure.Resolution gives it whichever way the file is split up.
+#
+# typed arrays (PythonCodeGen.typed_arrays / PythonAstGen.typed_arrays, off
+# unless --typed-arrays): `int a[100];` is array('q', [0]) * 100 (array('d')
+# for float / double) instead of the list [0] * 100. 8 bytes an element, where a
+# list holds a pointer to a boxed int / float, but every read boxes the element
+# again and is slower than a list's. what's stored in an int array is made an
+# int first (above), with --no-int-division something that isn't one raises
+# TypeError (c would convert it). out of int64's range is OverflowError. with
+# --vectorize the arrays a function's element-wise loops use are numpy arrays
+# instead (vectorize.py).
+#
+# bound globals (PythonCodeGen.bind_globals / PythonAstGen.bind_globals, off
+# unless --bind-globals): functions, builtins and global variables a function
+# reads inside a loop are copied into __g_<name> locals when it's entered,
+# and every use in the function reads the local:
+#     __g_printf = printf
+# only names the function never assigns or declares. a global variable only if
+# the function calls nothing but itself and the runtime's builtins (anything
+# else could change it under the copy). a name that isn't defined yet when the
+# function is called raises NameError on entry instead of where it's used.
+
+DIVISION_TEMP = "__d{}"
+BOUND = "__g_{}"
+
+def initial(var_type: str):
+    # what a global declared without a value starts out as, like c's zeroed statics
+    if var_type in INT_TYPES:
+        return 0
+    if var_type in ('float', 'double'):
+        return 0.0
+    return None
+
+def target_name(node):
+    # what an assignment to node stores under in int_expr's names: the variable,
+    # a[] for an element of an array a, None for anything else
+    if isinstance(node, Var):
+        return node.name
+    if isinstance(node, ArrayAccess) and isinstance(node.array, Var):
+        return INT_ARRAY.format(node.array.name)
+    return None
+
+def typecode(element: str):
+    # array module typecode for an element type, None for a plain list
+    if element in INT_TYPES:
+        return 'q'
+    if element in ('float', 'double'):
+        return 'd'
+    return None
+
+def array_zero(element: str):
+    # what an array of element starts out holding
+    return 0.0 if element in ('float', 'double') else 0
+
+def c_division(node: Binary, names) -> bool:
+    # node is a / b to lower as c's int division
+    return loops.INT_DIVISION and node.op == '/' and int_expr(node.left, names) and int_expr(node.right, names)
+
+def coerce(value, names) -> bool:
+    # value, stored in an int variable (one of names) or returned from an int
+    # function, needs int(...) to be what c stores. an assignment's value is
+    # the inner assignment's, that one's converted if its target needs it
+    return loops.INT_DIVISION and not isinstance(value, Assignment) and not int_expr(value, names)
+
+def simple(node) -> bool:
+    # fine to evaluate twice
+    return isinstance(node, (Literal, Var))
+
+def divisor(node) -> bool:
+    # a positive int literal, no sign test needed for it
+    return isinstance(node, Literal) and type(node.value) is int and node.value > 0
+
+def nonnegative(node, names) -> bool:
+    # node is an int literal >= 0 or one of names (range() loop variables that count up from >= 0)
+    if isinstance(node, Literal):
+        return type(node.value) is int and node.value >= 0
+    return isinstance(node, Var) and node.name in names
+
+def counts_up(start, step: int) -> bool:
+    # a range(start, ..., step) loop's variable is never negative
+    return step > 0 and isinstance(start, Literal) and type(start.value) is int and start.value >= 0
+
+def division_temps(node: Binary):
+    # (left needs a temporary, right needs one) for c_division's node, the
+    # quotient of a / b always gets one
+    if divisor(node.right):
+        return not simple(node.left), False
+    right = not simple(node.right)
+    # something with side effects on the right could change a variable on the left
+    left = not simple(node.left) or (right and not isinstance(node.left, Literal))
+    return left, right
+
+def c_divide(a: int, b: int) -> int:
+    # a / b the way c does it, for folding
+    q = abs(a) // abs(b)
+    return q if (a >= 0) == (b > 0) else -q
+
+def bound_globals(function: Function, resolution):
+    # name -> the local it's copied into, for the names function reads in a loop
+    # (sorted, so every compile writes the same text). resolution is the
+    # program's structure.Resolution, function added to it
+    written = resolution.scope(function).writes
+    called = set()
+    variables = True  # global variables can be bound too
+    for n in walk(function.body):
+        if isinstance(n, Call):
+            symbol = resolution.symbol(n)
+            if symbol is None or symbol.kind != 'builtin' and symbol.name != function.name:
+                variables = False
+    found = set()
+    stack = [function.body]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, (While, For)):
+            for name, is_list in child_fields(type(node)):
+                value = getattr(node, name)
+                if is_list:
+                    stack.extend(value)
+                elif value is not None:
+                    stack.append(value)
+            continue
+        # an outermost loop. walk has a Call before its callee Var
+        for n in walk(node):
+            if isinstance(n, Call) and isinstance(n.callee, Var):
+                called.add(n.callee.name)
+            elif isinstance(n, Var) and not resolution.local(n) and n.name not in written \
+                    and (variables or n.name in called):
+                found.add(n.name)
+    return {name: BOUND.format(name) for name in sorted(found)}
@@ -0,0 +1,134 @@
+from parser import *
+from visitor import walk
+from loops import range_loop
+import typed
+
+# element-wise loops as whole-array numpy operations, for both backends:
+#
+#     for (int i = 0; i < n; i++) {        __v = _vectors(0, n, 3, c, a, b, k)
+#         c[i] = a[i] * b[i] + k;          if __v:
+#     }                                        __v[0] = __v[1] * __v[2] + k
+#                                          else:
+#                                              for i in range(n): ...
+#
+# which needs
+#   - a range() loop (loops.py) with step 1
+#   - a body of nothing but x[i] = e; statements, x a variable and i the loop
+#     variable itself (never i + 1, that's a dependence between iterations)
+#   - e built from + - * and unary -, number literals, x[i] reads and variables
+#     that aren't arrays. no / (numpy divides by zero without raising) and no
+#     calls, and the loop variable itself isn't read
+# every statement only touches element i of every array, so running each one
+# over the whole range before the next gives what the loop does, even when two
+# names hold the same array.
+#
+# runtime._vectors checks what's only known when it runs: numpy importable, the
+# range long enough to be worth it and inside every array, the arrays being numpy
+# arrays of numbers that don't overlap and the other variables being numbers. it
+# returns None otherwise and the original loop runs. python lists always take the
+# loop, converting them to arrays and back costs more than it saves.
+#
+# the backends only do this with --vectorize (PythonCodeGen.vector_loops /
+# PythonAstGen.vector_loops, part of the cache key), whether or not numpy is
+# there when compiling, so a source compiles the same everywhere. an int or
+# double array a function declares and uses in one of its element-wise loops
+# (vector_arrays) is a numpy array then (runtime._zeros), or a list when numpy
+# doesn't import where it runs. every other array stays what it was, and a
+# numpy array's element read anywhere but in __v[k] is made a python number
+# again, int(a[i]) / float(a[i]): numpy's scalars don't behave like c's numbers
+# (bool - bool raises, int64 overflows). arrays can't be passed to a function,
+# so nothing else sees a function's numpy arrays.
+
+VECTOR = "__v"
+ELEMENT_OPS = {'+', '-', '*'}
+
+def element(node, name: str) -> bool:
+    # node is x[i] for a variable x and the loop variable i
+    return (isinstance(node, ArrayAccess) and isinstance(node.array, Var)
+            and isinstance(node.index, Var) and node.index.name == name)
+
+def vector_loop(node: For, names):
+    # (__v = _vectors(...) statement, [__v[k] = e, ...]) for node, None if it
+    # isn't an element-wise loop
+    loop = range_loop(node, names)
+    if loop is None:
+        return None
+    name, start, stop, adjust, step = loop
+    if step != 1:
+        return None
+    body = node.body
+    stmts = body.stmts if isinstance(body, Compound) else [body]
+    if not stmts:
+        return None
+    slots = {}  # array -> its index in __v
+    for stmt in stmts:
+        if not (isinstance(stmt, ExprStmt) and isinstance(stmt.expr, Assignment)
+                and element(stmt.expr.target, name)):
+            return None
+        slots.setdefault(stmt.expr.target.array.name, len(slots))
+    scalars = {}
+    out = []
+    for stmt in stmts:
+        value = lower(stmt.expr.value, name, slots, scalars)
+        if value is None:
+            return None
+        target = vector(slots[stmt.expr.target.array.name], stmt.pos)
+        out.append(ExprStmt(Assignment(target, value, pos=stmt.pos), pos=stmt.pos))
+    if set(scalars) & set(slots):
+        # a name used both as an array and not
+        return None
+    if isinstance(stop, Literal):
+        stop = Literal(stop.value + adjust, pos=stop.pos)
+    elif adjust:
+        stop = Binary('+', stop, Literal(adjust, pos=stop.pos), pos=stop.pos)
+    args = [start, stop, Literal(len(slots), pos=node.pos)]
+    args.extend(Var(array, pos=node.pos) for array in slots)
+    args.extend(Var(scalar, pos=node.pos) for scalar in scalars)
+    guard = Assignment(Var(VECTOR, pos=node.pos), Call(Var('_vectors', pos=node.pos), args, pos=node.pos),
+                       pos=node.pos)
+    return ExprStmt(guard, pos=node.pos), out
+
+def vector_arrays(function: Function, names):
+    # name -> int / float for the int and double arrays function declares and
+    # its element-wise loops use, the ones the backends make numpy arrays
+    declared = {}
+    used = set()
+    for n in walk(function.body):
+        if isinstance(n, Declaration):
+            array = typed.array_type(n.var_type)
+            code = None if array is None else typed.typecode(array[0])
+            declared[n.name] = None if code is None or n.name in declared else code
+        elif isinstance(n, For):
+            vector = vector_loop(n, names)
+            if vector is not None:
+                args = vector[0].expr.value.args
+                used.update(var.name for var in args[3:3 + args[2].value])
+    return {name: 'float' if declared[name] == 'd' else 'int'
+            for name in sorted(used) if declared.get(name) is not None}
+
+def vector(slot: int, pos: int):
+    # __v[slot]
+    return ArrayAccess(Var(VECTOR, pos=pos), Literal(slot, pos=pos), pos=pos)
+
+def lower(expr, name: str, slots, scalars):
+    # expr with every x[i] as __v[k] (adding x to slots), None if expr can't be
+    # worked out on whole arrays. scalars gets the other variables read
+    if isinstance(expr, Literal):
+        return expr if type(expr.value) in (int, float) else None
+    if isinstance(expr, Var):
+        if expr.name == name:
+            return None
+        scalars.setdefault(expr.name, None)
+        return expr
+    if element(expr, name):
+        return vector(slots.setdefault(expr.array.name, len(slots)), expr.pos)
+    if isinstance(expr, Binary) and expr.op in ELEMENT_OPS:
+        left = lower(expr.left, name, slots, scalars)
+        right = lower(expr.right, name, slots, scalars)
+        if left is None or right is None:
+            return None
+        return Binary(expr.op, left, right, pos=expr.pos)
+    if isinstance(expr, Unary) and expr.op in ('-', '+') and expr.prefix:
+        operand = lower(expr.operand, name, slots, scalars)
+        return None if operand is None else Unary(expr.op, operand, pos=expr.pos)
+    return None
@@ -0,0 +1,155 @@
+from dataclasses import fields
+from types import GeneratorType
+from typing import List, Optional
+from parser import Node
+
+# shared traversal stuff for passes over the ast.
+#
+# a Visitor subclass defines methods named prefix + node class name, e.g.
+# visit_Binary. which method handles which class is worked out once per
+# (visitor class, prefix, node class) and kept in a table, lookups walk the
+# node class's mro so a visit_Node method is the fallback for everything.
+#
+# a method can just return its result, or be a generator that yields child
+# nodes and gets each child's result sent back:
+#
+#     def visit_Binary(self, node):
+#         left = yield node.left
+#         right = yield node.right
+#         return f"({left} {node.op} {right})"
+#
+# written that way, visit() runs the whole thing off an explicit stack, so
+# deep trees don't run into the recursion limit. iterative = False runs the
+# same methods with plain recursion instead.
+
+class Visitor:
+    prefix = 'visit_'
+    iterative = True
+
+    _methods = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._methods = {}
+
+    @classmethod
+    def dispatch_table(cls, prefix: str):
+        # node class -> method for this visitor class and prefix, filled in as classes show up
+        table = cls._methods.get(prefix)
+        if table is None:
+            table = cls._methods[prefix] = {}
+        return table
+
+    @classmethod
+    def method_for(cls, node_cls, prefix: str):
+        table = cls.dispatch_table(prefix)
+        method = table.get(node_cls)
+        if method is None:
+            for klass in node_cls.__mro__:
+                method = getattr(cls, prefix + klass.__name__, None)
+                if method is not None:
+                    break
+            else:
+                method = cls.generic_visit
+            table[node_cls] = method
+        return method
+
+    def generic_visit(self, node):
+        raise NotImplementedError(f"{type(self).__name__} has no method for {type(node).__name__}")
+
+    def visit(self, node, prefix: Optional[str] = None):
+        if node is None:
+            return None
+        prefix = prefix or self.prefix
+        if self.iterative:
+            return self._visit_iterative(node, prefix)
+        return self._visit_recursive(node, prefix)
+
+    def _visit_recursive(self, node, prefix):
+        result = self.method_for(type(node), prefix)(self, node)
+        if type(result) is not GeneratorType:
+            return result
+        value = None
+        while True:
+            try:
+                child = result.send(value)
+            except StopIteration as stop:
+                return stop.value
+            value = None if child is None else self._visit_recursive(child, prefix)
+
+    def _visit_iterative(self, node, prefix):
+        table = self.dispatch_table(prefix)
+        method = table.get(type(node)) or self.method_for(type(node), prefix)
+        result = method(self, node)
+        if type(result) is not GeneratorType:
+            return result
+        stack = [result]
+        push = stack.append
+        value = None
+        while stack:
+            try:
+                child = stack[-1].send(value)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                continue
+            if child is None:
+                value = None
+                continue
+            method = table.get(type(child)) or self.method_for(type(child), prefix)
+            value = method(self, child)
+            if type(value) is GeneratorType:
+                push(value)
+                value = None
+        return value
+
+class Transformer(Visitor):
+    # visit methods return the node to put in place of the one they got (the
+    # same node is fine, None drops it from a list / clears an optional field).
+    # generic_visit transforms the children in place and keeps the node
+    def generic_visit(self, node):
+        for name, is_list in child_fields(type(node)):
+            value = getattr(node, name)
+            if is_list:
+                new_items = []
+                for item in value:
+                    item = yield item
+                    if item is not None:
+                        new_items.append(item)
+                setattr(node, name, new_items)
+            elif value is not None:
+                setattr(node, name, (yield value))
+        return node
+
+# which fields of a node class hold child nodes: [(name, is_list), ...]
+_CHILD_FIELDS = {}
+
+def child_fields(node_cls):
+    found = _CHILD_FIELDS.get(node_cls)
+    if found is None:
+        found = []
+        for f in fields(node_cls):
+            if f.type is Node or f.type == Optional[Node]:
+                found.append((f.name, False))
+            elif f.type == List[Node]:
+                found.append((f.name, True))
+        _CHILD_FIELDS[node_cls] = found
+    return found
+
+def iter_children(node):
+    for name, is_list in child_fields(type(node)):
+        value = getattr(node, name)
+        if is_list:
+            yield from value
+        elif value is not None:
+            yield value
+
+def walk(node):
+    # every node under (and including) node, parents before children, no recursion
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = list(iter_children(node))
+        children.reverse()
+        stack.extend(children)
@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import select
+import struct
+from driver import decode_source
+from batch import output_path
+from incremental import IncrementalCompiler
+
+# main.py --watch file.ctri: recompile on every save, writing file.py (or under
+# -o DIR). the compiler keeps each top level item's tokens / ast / output
+# between saves and only redoes the items an edit touched (incremental.py).
+# inotify (through libc, no extra packages) on linux, otherwise the file's
+# mtime is polled
+
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+_EVENT = struct.Struct("iIII")
+
+def _inotify(directory: str):
+    # fd with a watch on directory (editors often save by renaming a new file
+    # over the old one, so the file itself can't be watched), None if there's no inotify
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+def _wait(fd, name: str, timeout: float):
+    # until an event for name shows up on fd, or timeout either way
+    if fd is None:
+        time.sleep(timeout)
+        return
+    deadline = time.monotonic() + timeout
+    while True:
+        left = deadline - time.monotonic()
+        if left <= 0 or not select.select([fd], [], [], left)[0]:
+            return
+        data = os.read(fd, 64 * 1024)
+        i = 0
+        hit = False
+        while i < len(data):
+            _, _, _, size = _EVENT.unpack_from(data, i)
+            i += _EVENT.size
+            hit = hit or data[i:i + size].rstrip(b"\0") == name
+            i += size
+        if hit:
+            return
+
+def _stamp(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None  # mid-save, between the unlink and the rename
+    return st.st_mtime_ns, st.st_size
+
+def recompile(path: str, dst: str, compiler: IncrementalCompiler, out) -> bool:
+    with open(path, "rb") as f:
+        source = decode_source(f.read())
+    t = time.perf_counter()
+    try:
+        python_code = compiler.update(source)
+    except Exception as e:  # report and keep watching, the last good output stays
+        print(f"{path}: {type(e).__name__}: {e}", file=out, flush=True)
+        return False
+    elapsed = time.perf_counter() - t
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    with open(dst, "w") as f:
+        f.write(python_code + "\n")
+    if compiler.full:
+        what = "whole file"
+    else:
+        what = f"{compiler.recompiled} of {len(compiler.pieces)} items"
+    print(f"{path}: {what} recompiled in {elapsed * 1e3:.1f} ms -> {dst}", file=out, flush=True)
+    return True
+
+def watch(path: str, out_dir=None, interval: float = 0.25, out=sys.stdout) -> int:
+    dst = output_path(path, out_dir, os.path.dirname(os.path.abspath(path)))
+    compiler = IncrementalCompiler()
+    fd = _inotify(os.path.dirname(os.path.abspath(path)))
+    how = "inotify" if fd is not None else f"polling every {interval:g} s"
+    print(f"watching {path} ({how}), ctrl-c to stop", file=out, flush=True)
+    name = os.fsencode(os.path.basename(path))
+    stamp = None
+    try:
+        while True:
+            new_stamp = _stamp(path)
+            if new_stamp is not None and new_stamp != stamp:
+                stamp = new_stamp
+                recompile(path, dst, compiler, out)
+            # with inotify the timeout is only a fallback, e.g. for the directory
+            # itself being replaced
+            _wait(fd, name, interval if fd is None else 2.0)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if fd is not None:
+            os.close(fd)
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# the compiler's modules import each other by name, like when running src/main.py,
+# and the corpus generator is the benchmarks'
+HERE = os.path.dirname(__file__)
+sys.path[:0] = [os.path.join(HERE, '..', 'src'), os.path.join(HERE, '..', 'bench')]
+
+from driver import apply_settings, settings
+from main import main
+
+@pytest.fixture(autouse=True)
+def codegen_settings():
+    # main() sets the backends' switches on their classes, put them back after
+    before = settings()
+    yield
+    apply_settings(before)
+
+@pytest.fixture
+def run(tmp_path, capsys):
+    # run(source, *flags) -> what main.py --run prints, (out, err)
+    def run(source, *flags):
+        path = tmp_path / "prog.ctri"
+        path.write_text(source)
+        status = main([*flags, "--run", str(path)])
+        assert status == 0
+        return capsys.readouterr()
+    return run
@@ -0,0 +1,132 @@
+import pytest
+
+from lexer import get_tokens
+import parser as parse
+import runtime
+from codegen import PythonCodeGen
+from optimizer import Optimizer
+from pybackend import compile_program
+import loops
+
+# c's int division (typed.py): truncating toward zero, for ints only, in both
+# backends, with and without -O (which folds literal divisions the same way)
+
+SOURCE = """
+int g = -7;
+int h;
+int arr[4];
+double darr[4];
+int divide(int a, int b) { return a / b; }
+int literal(int a) { return a / 4; }
+double real(double a, int b) { return a / b; }
+int global_by(int b) { return g / b; }
+int unset() { return (h + 9) / 2; }
+int folded() { return -7 / 2 + 7 / -2 + -8 / 2; }
+int elements(int x) {
+    arr[0] = x;
+    arr[1] = arr[0] / 2;
+    darr[0] = x;
+    darr[1] = darr[0] / 2 * 2;
+    arr[2] = darr[1];
+    return arr[1] + arr[2];
+}
+int local_array(int x) {
+    int a[3];
+    a[0] = x;
+    a[1] = a[0] / 3;
+    return a[1];
+}
+int stored(double x) {
+    int r = x;
+    r = r / 2;
+    return r;
+}
+int operands(int a) {
+    return (a - 10) / (a + 1);
+}
+"""
+
+def program(optimize):
+    tokens = get_tokens(SOURCE)
+    tokens.append(('EOF', 'EOF', len(SOURCE)))
+    tree = parse.Parser(tokens).parse_program()
+    if optimize:
+        optimizer = Optimizer()
+        return optimizer.optimize(tree), optimizer.resolution
+    return tree, None
+
+def ast_backend(optimize):
+    tree, resolution = program(optimize)
+    namespace = dict(runtime.BUILTINS)
+    exec(compile_program(tree, SOURCE, resolution=resolution), namespace)
+    return namespace
+
+def text_backend(optimize):
+    tree, resolution = program(optimize)
+    namespace = dict(runtime.BUILTINS)
+    exec(PythonCodeGen(resolution).generate(tree), namespace)
+    return namespace
+
+BACKENDS = [
+    pytest.param(ast_backend, False, id="ast"),
+    pytest.param(ast_backend, True, id="ast-O"),
+    pytest.param(text_backend, False, id="text"),
+    pytest.param(text_backend, True, id="text-O"),
+]
+
+@pytest.mark.parametrize("backend,optimize", BACKENDS)
+def test_negative_operands(backend, optimize):
+    ns = backend(optimize)
+    for a in range(-9, 10):
+        for b in (-4, -3, -1, 1, 2, 5):
+            expected = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+            assert ns['divide'](a, b) == expected, (a, b)
+            assert type(ns['divide'](a, b)) is int
+    assert [ns['literal'](a) for a in (-9, -8, -1, 0, 7)] == [-2, -2, 0, 0, 1]
+    assert ns['folded']() == -3 - 3 - 4
+
+@pytest.mark.parametrize("backend,optimize", BACKENDS)
+def test_doubles_divide_exactly(backend, optimize):
+    ns = backend(optimize)
+    assert ns['real'](7.0, 2) == 3.5
+    assert ns['stored'](7.9) == 3
+
+@pytest.mark.parametrize("backend,optimize", BACKENDS)
+def test_globals(backend, optimize):
+    ns = backend(optimize)
+    assert ns['global_by'](2) == -3
+    assert ns['global_by'](-5) == 1
+    # int h; starts out as 0 like c's, not None
+    assert ns['h'] == 0 and ns['darr'][3] == 0.0
+    assert ns['unset']() == 4
+
+@pytest.mark.parametrize("backend,optimize", BACKENDS)
+def test_arrays(backend, optimize):
+    ns = backend(optimize)
+    # 7 / 2 in an int array is 3, the double array's 3.5 * 2 is 7.0 stored back as an int
+    assert ns['elements'](7) == 3 + 7
+    assert ns['arr'][1:3] == [3, 7] and type(ns['arr'][2]) is int
+    assert ns['elements'](-7) == -3 - 7
+    assert ns['local_array'](-10) == -3
+
+@pytest.mark.parametrize("backend,optimize", BACKENDS)
+def test_expression_operands(backend, optimize):
+    ns = backend(optimize)
+    # worked out once each into __d<n> temporaries
+    assert [ns['operands'](a) for a in (4, -4, 1, 10, 20)] == [-1, 4, -4, 0, 0]
+
+@pytest.mark.parametrize("backend", [ast_backend, text_backend])
+def test_typed_arrays(backend, monkeypatch):
+    monkeypatch.setattr(PythonCodeGen, 'typed_arrays', True)
+    from pybackend import PythonAstGen
+    monkeypatch.setattr(PythonAstGen, 'typed_arrays', True)
+    ns = backend(False)
+    assert ns['elements'](7) == 3 + 7
+    assert ns['local_array'](-10) == -3
+
+@pytest.mark.parametrize("backend", [ast_backend, text_backend])
+def test_without_int_division(backend, monkeypatch):
+    monkeypatch.setattr(loops, 'INT_DIVISION', False)
+    ns = backend(False)
+    assert ns['divide'](7, 2) == 3.5
+    assert ns['literal'](-9) == -2.25
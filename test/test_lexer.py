@@ -0,0 +1,45 @@
+import glob
+import os
+
+import pytest
+
+from gen_corpus import SHAPES, generate
+from lexer import get_tokens, get_tokens_mapped
+from tokenbuf import TokenBuffer
+
+# scan_tokens against the old slice-per-token lexer, token for token
+
+SNIPPETS = [
+    "int intx = 1; int _Bool2 = ifx + while_1;",
+    "double d = 1.5 + 2. + .5 + 10;",
+    "a<<=b>>c<=d>=e==f!=g&&h||i++ + --j;",
+    'printf("%d\\n", x); "open',
+    "x = 1; // comment at the end",
+    "/* not closed",
+    "x @ y $ z",
+    "",
+]
+
+def sources():
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.ctri'))):
+        with open(path) as f:
+            yield pytest.param(f.read(), id=os.path.basename(path))
+    for shape in SHAPES:
+        yield pytest.param(generate(8 * 1024, 3, shape), id=shape)
+    for i, snippet in enumerate(SNIPPETS):
+        yield pytest.param(snippet, id=f"snippet{i}")
+
+SOURCES = list(sources())
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_scan_matches_legacy(source):
+    assert get_tokens(source) == get_tokens(source, legacy=True)
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_other_lexers_match_scan(source):
+    tokens = get_tokens(source)
+    assert list(TokenBuffer.from_source(source)) == tokens
+    if not source.isascii():
+        return  # the bytes lexer's positions are byte offsets
+    mapped = get_tokens_mapped(source.encode('latin-1'))
+    assert [(tok[0], tok[1], tok[2]) for tok in mapped] == tokens
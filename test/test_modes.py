@@ -0,0 +1,81 @@
+import io
+
+import pytest
+
+from gen_corpus import SHAPES, generate
+from driver import compile_source
+from incremental import Document, IncrementalCompiler
+from main import stream_compile
+from optimizer import Optimizer
+from lexer import get_tokens
+import parser as parse
+from split import compile_parallel, split_points
+from structure import header
+
+# every way of compiling a file gives the same text as compiling it whole:
+# split.py's workers, --stream and incremental.py, whatever's declared above
+# the item they're working on (structure.py)
+
+HEADER = """
+int g = 7;
+double x = 2.5;
+int arr[8];
+int half(int v);
+int twice(int v) { return v * 2; }
+int use(int v) { return g / v + arr[1] / 2 + half(v) / 3 + twice(v) / 2 + x / 2; }
+"""
+
+def sources():
+    for shape in SHAPES:
+        yield pytest.param(HEADER + generate(32 * 1024, 2, shape) + HEADER.replace("g", "k"), id=shape)
+
+SOURCES = list(sources())
+
+def streamed(source, optimizer=None):
+    out = io.StringIO()
+    stream_compile(source, out, optimizer)
+    return out.getvalue()[len("code generated (python)\n"):-1]
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_split(source):
+    assert compile_parallel(source, 2, min_size=0) == compile_source(source)
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_prescan_headers(source):
+    # what the workers declare for the items above their piece
+    headers = []
+    split_points(source, 8, headers)
+    tokens = get_tokens(source)
+    tokens.append(('EOF', 'EOF', len(source)))
+    decls = parse.Parser(tokens).parse_program().declarations
+    assert [found[1:] for found in headers] == [header(decl) for decl in decls]
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_stream(source):
+    assert streamed(source) == compile_source(source)
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_incremental(source):
+    expected = compile_source(source)
+    assert IncrementalCompiler().update(source) == expected
+    assert Document(source).output() == expected
+
+def test_optimized_stream_shares_the_resolution():
+    source = SOURCES[0].values[0]
+    optimizer = Optimizer()
+    assert streamed(source, optimizer) == streamed(source, Optimizer())
+    assert optimizer.resolution.top.symbols['use'].kind == 'function'
+
+def test_edit_above_regenerates_below():
+    # g going from int to double makes use()'s g / v a float division
+    compiler = IncrementalCompiler()
+    before = compiler.update(HEADER)
+    source = HEADER.replace("int g = 7;", "double g = 7;")
+    after = compiler.update(source)
+    assert after == compile_source(source) != before
+    assert compiler.recompiled == 1
+
+    document = Document(HEADER)
+    at = HEADER.index("int g")
+    document.apply_edit(at, at + 3, "double")
+    assert document.output() == after
@@ -0,0 +1,58 @@
+import pytest
+
+from gen_corpus import SHAPES, generate
+from lexer import get_tokens
+import parser as parse
+from tokenbuf import TokenBuffer
+from visitor import walk
+
+# the precedence climbing expression parser against the old cascade: the same
+# trees, positions included, from a token list, a TokenBuffer and a stream
+
+EXPRESSIONS = [
+    "a || b && c < d > e <= f >= g + h - i * j / k",
+    "a - b - c / d / e * f",
+    "-a * !b + -c - +d",
+    "x = y = z + 1",
+    "f(a, g(b) + 1, c[i + 1]) * h()",
+    "i++ + ++j - k-- - --l",
+    "(a + b) * (c - (d || e))",
+    "a[b[c]] + (1 < 2 && 3 > 4 || !5)",
+]
+
+def program(expr):
+    return f"int main() {{ int r = {expr}; r = {expr}; return {expr}; }}"
+
+SOURCES = [pytest.param(program(expr), id=f"expr{i}") for i, expr in enumerate(EXPRESSIONS)]
+SOURCES += [pytest.param(generate(16 * 1024, 5, shape), id=shape) for shape in SHAPES]
+
+def parse_tokens(tokens, **kwargs):
+    return parse.Parser(tokens, **kwargs).parse_program()
+
+def positions(tree):
+    return [node.pos for node in walk(tree)]
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_pratt_matches_cascade(source):
+    tokens = get_tokens(source)
+    tokens.append(('EOF', 'EOF', len(source)))
+    cascade = parse_tokens(tokens, cascade=True)
+    pratt = parse_tokens(tokens)
+    assert pratt == cascade
+    assert positions(pratt) == positions(cascade)
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_token_sources_agree(source):
+    tokens = get_tokens(source)
+    tokens.append(('EOF', 'EOF', len(source)))
+    expected = parse_tokens(tokens)
+    assert parse_tokens(TokenBuffer.from_source(source)) == expected
+    assert parse_tokens(iter(tokens)) == expected
+
+@pytest.mark.parametrize("source", ["int main() { return 1 + ; }", "int x = (1;", "int f( { }"])
+@pytest.mark.parametrize("cascade", [False, True])
+def test_errors(source, cascade):
+    tokens = get_tokens(source)
+    tokens.append(('EOF', 'EOF', len(source)))
+    with pytest.raises(SyntaxError):
+        parse_tokens(tokens, cascade=cascade)
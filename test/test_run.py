@@ -0,0 +1,120 @@
+import pytest
+
+# main.py --run against the values the programs compute in c, with every
+# combination of the switches that change the generated code
+
+FIB = r"""
+int fib(int n) {
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}
+int main() {
+    int s = 0;
+    for (int i = 0; i < 15; i++) {
+        s = s + fib(i);
+    }
+    printf("%d\n", s);
+    return 0;
+}
+"""
+
+# sq is inlined into the expression, clamp as a statement, n * k + 1 hoisted
+INLINE_HOIST = r"""
+int sq(int x) { return x * x; }
+int clamp(int v) { int r = v; if (r > 9) r = 9; return r; }
+int main() {
+    int n = 20;
+    int k = 3;
+    int t = 0;
+    for (int i = 0; i < n; i++) {
+        t = t + sq(i) + (n * k + 1);
+        t = t + clamp(i);
+    }
+    int c = clamp(t);
+    printf("%d %d\n", t, c);
+    return 0;
+}
+"""
+
+# element-wise loops long enough for numpy, and scalar code reading the same
+# arrays: comparisons of elements subtracted, which numpy's bools can't do
+ARRAYS = r"""
+int main() {
+    int a[100];
+    int b[100];
+    double d[100];
+    for (int i = 0; i < 100; i++) {
+        a[i] = i;
+        d[i] = i * 0.5;
+    }
+    for (int i = 0; i < 100; i++) {
+        b[i] = a[i] * 2 + 1;
+    }
+    for (int i = 0; i < 100; i++) {
+        d[i] = d[i] * 2 - 1;
+    }
+    int s = 0;
+    for (int i = 0; i < 100; i++) {
+        s = s + b[i] / 3;
+    }
+    int flags = (b[3] < 8) - (a[2] > 1) + (a[5] > 4 && b[0] < 2);
+    b[7]++;
+    printf("%d %d %d %d %f\n", s, flags, b[99], b[7], d[99]);
+    return 0;
+}
+"""
+
+# && / || are 0 / 1, globals start at 0, int globals and array elements stay ints
+GLOBALS = r"""
+int g;
+int limit = 7 / 2;
+double h;
+int counts[4];
+int bump(int x) {
+    g = g + x;
+    return g;
+}
+int main() {
+    int a = 3 && 5;
+    int b = 0 || 7;
+    int c = (2 > 1) + (a || 0) + (0 && b);
+    bump(5);
+    bump(2);
+    counts[1] = 7;
+    counts[2] = counts[1] / 2;
+    counts[3] = 2.5 + 1;
+    printf("%d %d %d %d %d %d %d %f\n", a, b, c, g, limit, counts[2], counts[3], h);
+    return 0;
+}
+"""
+
+PROGRAMS = [
+    pytest.param(FIB, "986\n", id="fib"),
+    pytest.param(INLINE_HOIST, "3825 9\n", id="inline-hoist"),
+    pytest.param(ARRAYS, "3300 1 199 16 98.000000\n", id="arrays"),
+    pytest.param(GLOBALS, "1 1 2 7 3 3 3 0.000000\n", id="globals"),
+]
+
+FLAGS = [
+    pytest.param([], id="plain"),
+    pytest.param(["-O"], id="O"),
+    pytest.param(["-O", "--inline-size", "0"], id="O-no-inline"),
+    pytest.param(["-O", "--inline-size", "200"], id="O-inline-200"),
+    pytest.param(["--vectorize"], id="vectorize"),
+    pytest.param(["--typed-arrays"], id="typed-arrays"),
+    pytest.param(["-O", "--vectorize", "--typed-arrays"], id="O-vectorize-typed"),
+    pytest.param(["-O", "--bind-globals"], id="O-bind-globals"),
+    pytest.param(["--no-memoize"], id="no-memoize"),
+    pytest.param(["--ast-arena", "-O"], id="arena-O"),
+]
+
+@pytest.mark.parametrize("flags", FLAGS)
+@pytest.mark.parametrize("source,expected", PROGRAMS)
+def test_run(run, source, expected, flags):
+    assert run(source, *flags).out == expected
+
+def test_optimizer_reports_inlining(run):
+    err = run(INLINE_HOIST, "-O").err
+    assert "inlined sq() into main()" in err
+    assert "inlined clamp() into main()" in err
+    assert "0 loop invariant" not in err